@@ -0,0 +1,92 @@
+"""
+Compare the JSON serializer backends on a realistic list payload.
+
+    python benchmarks/bench_json_serializers.py [rows] [rounds]
+
+The payload is a list of dataclass rows with nested lists, datetime,
+Decimal and Enum fields, like the result of a list endpoint.
+"""
+
+import sys
+import time
+from enum import Enum
+from decimal import Decimal
+from datetime import datetime, date, timedelta
+from dataclasses import dataclass
+from typing import List
+
+from sqlblock.utils import json_dumps
+
+from redbean.web.serializers import get_json_serializer
+
+
+class OrderState(str, Enum):
+    OPEN = "open"
+    CLOSED = "closed"
+
+
+@dataclass
+class OrderLine:
+    sku: str
+    quantity: int
+    price: Decimal
+
+
+@dataclass
+class Order:
+    order_id: int
+    customer: str
+    state: OrderState
+    order_date: date
+    created: datetime
+    amount: Decimal
+    lines: List[OrderLine]
+
+
+def make_payload(rows):
+    created = datetime(2021, 3, 10, 14, 32, 49).astimezone()
+    return [
+        Order(order_id=i,
+              customer=f"customer-{i % 97}",
+              state=OrderState.OPEN if i % 3 else OrderState.CLOSED,
+              order_date=created.date(),
+              created=created + timedelta(seconds=i),
+              amount=Decimal(i) / 100,
+              lines=[OrderLine(sku=f"sku-{j}", quantity=j,
+                               price=Decimal("9.99")) for j in range(3)])
+        for i in range(rows)
+    ]
+
+
+def measure(dumps, payload, rounds):
+    size = len(dumps(payload))
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        dumps(payload)
+    elapsed = time.perf_counter() - started
+
+    return elapsed / rounds * 1000, size
+
+
+def main(rows, rounds):
+    payload = make_payload(rows)
+
+    backends = [("sqlblock json_dumps",
+                 lambda obj: json_dumps(obj).encode("utf-8"))]
+    for name in ("json", "orjson"):
+        try:
+            backends.append((name, get_json_serializer(name).dumps))
+        except ValueError:
+            print(f"skip '{name}': not installed")
+
+    print(f"rows: {rows}, rounds: {rounds}")
+    for name, dumps in backends:
+        ms, size = measure(dumps, payload, rounds)
+        print(f"{name:20s} {ms:8.2f} ms/payload {size:10d} bytes")
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    main(rows, rounds)
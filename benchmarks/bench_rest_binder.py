@@ -0,0 +1,57 @@
+"""
+Per-request overhead of ``rest_method`` compared with a bare aiohttp handler.
+
+    python benchmarks/bench_rest_binder.py [iterations]
+
+The handlers are called directly with mocked requests, so the numbers only
+include argument binding and response building, not HTTP parsing.
+"""
+
+import sys
+import time
+import asyncio
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+from redbean import rest_method
+
+
+async def bare_handler(request):
+    item_id = int(request.match_info["item_id"])
+    q = request.query.get("q")
+    return web.json_response({"item_id": item_id, "q": q})
+
+
+@rest_method
+async def rest_handler(item_id: int, q: str, request):
+    return {"item_id": item_id, "q": q}
+
+
+async def measure(handler, request, iterations):
+    await handler(request)  # warm up
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await handler(request)
+    elapsed = time.perf_counter() - started
+
+    return elapsed / iterations * 1e6
+
+
+async def main(iterations):
+    request = make_mocked_request("GET", "/items/12?q=abc",
+                                  match_info={"item_id": "12"},
+                                  app=web.Application())
+
+    bare = await measure(bare_handler, request, iterations)
+    rest = await measure(rest_handler, request, iterations)
+
+    print(f"iterations:   {iterations}")
+    print(f"bare aiohttp: {bare:8.2f} us/request")
+    print(f"rest_method:  {rest:8.2f} us/request")
+    print(f"overhead:     {rest - bare:8.2f} us/request")
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    asyncio.run(main(iterations))
@@ -0,0 +1,68 @@
+"""
+Dispatch time of aiohttp's UrlDispatcher compared with the compiled
+RouteTrie at 10, 100 and 1000 routes.
+
+    python benchmarks/bench_router.py [iterations]
+
+Each table has one plain and one dynamic route per resource group, and the
+requests hit the last registered routes, the worst case of linear matching.
+"""
+
+import sys
+import time
+import asyncio
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+from redbean.web.router import RouteTrie
+
+
+async def _handler(request):
+    return web.Response()
+
+
+def make_router(route_count):
+    router = web.UrlDispatcher()
+    for i in range(route_count // 2):
+        router.add_get(f"/api/group{i}/items", _handler)
+        router.add_get(f"/api/group{i}/items/{{item_id:\\d+}}", _handler)
+
+    return router
+
+
+async def measure(resolve, requests, iterations):
+    for request in requests:
+        await resolve(request)  # warm up
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for request in requests:
+            await resolve(request)
+    elapsed = time.perf_counter() - started
+
+    return elapsed / (iterations * len(requests)) * 1e6
+
+
+async def main(iterations):
+    print(f"iterations: {iterations}")
+    print(f"{'routes':>8} {'UrlDispatcher':>16} {'RouteTrie':>16}")
+
+    for route_count in (10, 100, 1000):
+        router = make_router(route_count)
+        route_trie = RouteTrie(router.resources())
+
+        last = route_count // 2 - 1
+        requests = [
+            make_mocked_request("GET", f"/api/group{last}/items"),
+            make_mocked_request("GET", f"/api/group{last}/items/12"),
+            make_mocked_request("GET", "/api/unknown"),
+        ]
+
+        linear = await measure(router.resolve, requests, iterations)
+        compiled = await measure(route_trie.resolve, requests, iterations)
+        print(f"{route_count:>8} {linear:>13.2f} us {compiled:>13.2f} us")
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    asyncio.run(main(iterations))
@@ -0,0 +1,90 @@
+"""
+Cookie size and time of issuing and verifying a session cookie, the Fernet
+token of set_secure_cookie/get_secure_cookie compared with the signed token.
+
+    python benchmarks/bench_session_tokens.py [iterations]
+
+The 'verify' column reads a fresh token, missing the decrypted cookie cache,
+and the 'cached' column reads the same token again.
+"""
+
+import sys
+import time
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+from cryptography import fernet
+
+from redbean.web.session import (setup_session, SESSION_COOKIE,
+                                 get_secure_cookie, set_secure_cookie,
+                                 get_signed_cookie, set_signed_cookie)
+
+
+SESSION_ID = "4f6c0c7e-0b7e-4a43-9c4f-51a8d1b4c2aa"
+
+
+def measure(func, iterations):
+    func()  # warm up
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - started
+
+    return elapsed / iterations * 1e6
+
+
+def make_app(algorithm):
+    app = web.Application()
+    setup_session(app, secret=fernet.Fernet.generate_key().decode(),
+                  signing_keys={1: b"s" * 32},
+                  signing_algorithm=algorithm)
+    return app
+
+
+def bench(name, app, set_cookie, get_cookie, iterations):
+    request = make_mocked_request("GET", "/", app=app)
+
+    def _issue():
+        response = web.Response()
+        set_cookie(request, response, SESSION_COOKIE, SESSION_ID)
+        return response.cookies[SESSION_COOKIE].value
+
+    tokens = [_issue() for _ in range(iterations + 1)]
+    requests = iter([
+        make_mocked_request("GET", "/", app=app,
+                            headers={"Cookie": f"{SESSION_COOKIE}={token}"})
+        for token in tokens
+    ])
+
+    def _verify():
+        assert get_cookie(next(requests), SESSION_COOKIE) == SESSION_ID
+
+    cached_request = make_mocked_request(
+        "GET", "/", app=app,
+        headers={"Cookie": f"{SESSION_COOKIE}={tokens[0]}"})
+
+    def _verify_cached():
+        assert get_cookie(cached_request, SESSION_COOKIE) == SESSION_ID
+
+    issue = measure(_issue, iterations)
+    verify = measure(_verify, iterations)
+    cached = measure(_verify_cached, iterations)
+    print(f"{name:>16} {len(tokens[0]):>8} {issue:>9.2f} us "
+          f"{verify:>9.2f} us {cached:>9.2f} us")
+
+
+def main(iterations):
+    print(f"iterations: {iterations}")
+    print(f"{'token':>16} {'bytes':>8} {'issue':>12} "
+          f"{'verify':>12} {'cached':>12}")
+
+    bench("fernet", make_app("blake2b"),
+          set_secure_cookie, get_secure_cookie, iterations)
+    bench("signed-blake2b", make_app("blake2b"),
+          set_signed_cookie, get_signed_cookie, iterations)
+    bench("signed-sha256", make_app("sha256"),
+          set_signed_cookie, get_signed_cookie, iterations)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -1,12 +1,16 @@
 
 import toml
 import sys
+import copy
+import asyncio
+import threading
+from types import MappingProxyType
 from typing import Mapping
 from pathlib import Path
 import logging
 import logging.config
 
-__all__ = ['load', 'setup']
+__all__ = ['load', 'get', 'subscribe', 'watch', 'setup', 'ConfigRegistry']
 
 _logger = logging.getLogger('config')
 _is_production_env = False
@@ -26,6 +30,9 @@ def setup(directory=None, production=None):
     if directory is not None:
         _directory = Path(directory)
 
+    global _registry
+    _registry = ConfigRegistry(_directory, production=_is_production_env)
+
     # if not _directory.is_dir():
     #     print(f"WARNING: cannot find directory: {_directory}", file=sys.stderr)
     #     sys.exit(1)
@@ -43,37 +50,177 @@ def setup_logging(verbose=False):
     logging.config.dictConfig(conf_obj)
 
 def load(name):
+    """
+    The merged configuration as a new dict, which the caller may modify.
+    The files are parsed only when they have been changed.
+    """
+
     if not _directory.is_dir():
         print(f"WARNING: cannot find directory: {_directory}", file=sys.stderr)
         return
 
-    conf_obj = {}
-    config_file = _directory / (name + '.toml')
-    if config_file.is_file():
-        with open(config_file) as f:
-            conf_obj = toml.load(f)
+    return copy.deepcopy(_registry.load_entry(name).data)
+
+
+def get(name):
+    """The merged configuration as an immutable view, shared by the callers"""
+    return _registry.get(name)
+
+
+def subscribe(name, callback):
+    _registry.subscribe(name, callback)
+
+
+async def watch():
+    await _registry.watch()
+
+
+class _ConfigEntry:
+    __slots__ = ("signature", "data", "view")
+
+    def __init__(self, signature, data):
+        self.signature = signature
+        self.data = data
+        self.view = freeze(data)
+
+
+class ConfigRegistry:
+    """
+    The configurations parsed once and cached until their files change.
+
+    A configuration merges three files under the directory, the base
+    ``name.toml``, the ``name.production.toml`` or ``name.development.toml``
+    of the environment, and the secrets ``secrets/name.toml``. The cached
+    result is checked against the mtime and size of the files on every get,
+    which costs the stats of three files but no parsing.
+
+    The views are read-only mappings with the lists as tuples. In the watch
+    mode, the changed configurations are reloaded in the background and the
+    subscribers are called with the new view.
+    """
 
-    if _is_production_env:
-        config_file = _directory / (name + '.production.toml')
-    else:
-        config_file = _directory / (name + '.development.toml')
+    __slots__ = ("directory", "production", "_entries", "_subscribers",
+                 "_lock")
 
-    if config_file.is_file():
-        with open(config_file) as f:
-            conf = toml.load(f)
-            _dict_update_deeply(conf_obj, conf)
+    def __init__(self, directory, *, production=False):
+        self.directory = Path(directory)
+        self.production = production
+        self._entries = {}
+        self._subscribers = {}
+        self._lock = threading.Lock()
 
-    # import json
-    # print(json.dumps(conf_obj, indent=4))
+    def config_files(self, name):
+        env = 'production' if self.production else 'development'
+        return (self.directory / (name + '.toml'),
+                self.directory / (name + '.' + env + '.toml'),
+                self.directory / 'secrets' / (name + '.toml'))
 
-    # 加载敏感配置参数
-    config_file = _directory / 'secrets' / (name + '.toml')
-    if config_file.is_file():
-        with open(config_file) as f:
-            conf = toml.load(f)
-            _dict_update_deeply(conf_obj, conf)
+    def file_signature(self, name):
+        signature = []
+        for config_file in self.config_files(name):
+            try:
+                stat = config_file.stat()
+            except (FileNotFoundError, NotADirectoryError):
+                signature.append(None)
+            else:
+                signature.append((stat.st_mtime_ns, stat.st_size))
 
-    return conf_obj
+        return tuple(signature)
+
+    def load_entry(self, name):
+        signature = self.file_signature(name)
+
+        entry = self._entries.get(name)
+        if entry is not None and entry.signature == signature:
+            return entry
+
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry.signature != signature:
+                entry = _ConfigEntry(signature, self.parse(name))
+                self._entries[name] = entry
+
+        return entry
+
+    def parse(self, name):
+        conf_obj = {}
+        for config_file in self.config_files(name):
+            if config_file.is_file():
+                with open(config_file) as f:
+                    _dict_update_deeply(conf_obj, toml.load(f))
+
+        return conf_obj
+
+    def get(self, name):
+        return self.load_entry(name).view
+
+    def subscribe(self, name, callback):
+        """
+        Call ``callback(name, view)`` when the configuration is reloaded in
+        the watch mode.
+        """
+
+        self._subscribers.setdefault(name, []).append(callback)
+        self.load_entry(name)
+
+    def unsubscribe(self, name, callback):
+        callbacks = self._subscribers.get(name)
+        if callbacks and callback in callbacks:
+            callbacks.remove(callback)
+
+    def reload(self):
+        """Reload the changed configurations and notify their subscribers"""
+
+        changed = self._reload_changed()
+        for name, view in changed:
+            self._notify(name, view)
+
+        return [name for name, _ in changed]
+
+    def _reload_changed(self):
+        changed = []
+        for name, entry in list(self._entries.items()):
+            try:
+                new_entry = self.load_entry(name)
+            except Exception:
+                _logger.exception("Cannot reload configuration '%s'", name)
+                continue
+
+            if new_entry is not entry:
+                changed.append((name, new_entry.view))
+
+        return changed
+
+    def _notify(self, name, view):
+        for callback in list(self._subscribers.get(name, ())):
+            try:
+                callback(name, view)
+            except Exception:
+                _logger.exception("Failed to notify the change of "
+                                  "configuration '%s'", name)
+
+    async def watch(self):
+        """Reload the configurations on the changes of directory"""
+
+        from watchgod import awatch
+
+        loop = asyncio.get_running_loop()
+        async for _ in awatch(self.directory):
+            # 在线程中解析文件，在事件循环中通知订阅者
+            changed = await loop.run_in_executor(None, self._reload_changed)
+            for name, view in changed:
+                _logger.info("Reloaded configuration '%s'", name)
+                self._notify(name, view)
+
+
+def freeze(obj):
+    """The read-only view of the parsed configuration"""
+
+    if isinstance(obj, dict):
+        return MappingProxyType({k: freeze(v) for k, v in obj.items()})
+    if isinstance(obj, list):
+        return tuple(freeze(v) for v in obj)
+    return obj
 
 
 def _dict_update_deeply(d, u):
@@ -83,3 +230,6 @@ def _dict_update_deeply(d, u):
         else:
             d[k] = v
     return d
+
+
+_registry = ConfigRegistry(_directory)
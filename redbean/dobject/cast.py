@@ -1,29 +1,34 @@
 from enum import Enum
-from dataclasses import is_dataclass
-from typing import get_origin, get_args
+from decimal import Decimal
+from datetime import datetime, date, timezone
+from typing import Any, Union, get_origin, get_args, get_type_hints
+from typing import _GenericAlias
+from dataclasses import fields, is_dataclass, MISSING
 
-from cbor2.compat import int2bytes
 from . import IncompliantError
 
-from typing import List, Dict, Union
-from typing import get_origin, get_args, _GenericAlias
-
-from dataclasses import fields, is_dataclass
-
-from dataclasses import dataclass, fields, MISSING
-
 
 def cast_generic_object(ctx, data_struct, data_type, cast_object):
 
     alias_origin = get_origin(data_type)
     if isinstance(alias_origin, type):
         if issubclass(alias_origin, list):  # List[Data]
+            if not isinstance(data_struct, (list, tuple)):
+                raise IncompliantError(f"The payload's type "
+                                       f"'{type(data_struct)}' is "
+                                       f"incomplaint with {data_type}")
+
             item_type = get_args(data_type)[0]
             return [
                 cast_object(ctx, item, item_type) for item in data_struct
             ]
 
         if issubclass(alias_origin, dict):  # Map[Key, Data]
+            if not isinstance(data_struct, dict):
+                raise IncompliantError(f"The payload's type "
+                                       f"'{type(data_struct)}' is "
+                                       f"incomplaint with {data_type}")
+
             key_type, val_type = get_args(data_type)[:2]
             return {
                 cast_object(ctx, k, key_type): cast_object(ctx, v, val_type)
@@ -36,37 +41,175 @@ def cast_generic_object(ctx, data_struct, data_type, cast_object):
     raise ValueError(f"Unsupport '{data_type}'")
 
 
-def cast_dataclass_object(ctx, payload, data_type, as_object):
-    """将字典结构的数据转换为dataclass类型的对象"""
+def cast_object(ctx, payload, data_type):
+    """
+    按照类型注解转换数据结构，每个注解的转换方案只生成一次。
+
+    The plans are strict for the request bodies: the required fields should
+    be present, and null is only allowed if the field defaults to None.
+    """
+
+    cast_plan = _cast_plans.get(data_type)
+    if cast_plan is None:
+        cast_plan = build_cast_plan(data_type)
+        _cast_plans[data_type] = cast_plan
+
+    return cast_plan(ctx, payload)
+
+
+_cast_plans = {}
+
+
+def build_cast_plan(data_type):
+    """build the function casting a payload into the annotated type"""
+
+    if data_type is Any:
+        def _cast_plan(ctx, payload):
+            return payload  # 不做转换
+
+    elif is_dataclass(data_type):
+        field_specs = dataclass_field_specs(data_type)
+
+        def _cast_plan(ctx, payload):
+            return cast_dataclass_object(ctx, payload, data_type, cast_object,
+                                         field_specs, strict=True)
+
+    elif isinstance(data_type, type):
+        def _cast_plan(ctx, payload):
+            return cast_native_object(ctx, payload, data_type, strict=True)
+
+    elif get_origin(data_type) is not None:
+        def _cast_plan(ctx, payload):
+            return cast_generic_object(ctx, payload, data_type, cast_object)
+
+    else:
+        raise ValueError(f"Unsupport '{data_type}'")
+
+    return _cast_plan
+
+
+def cast_native_object(ctx, payload, data_type, strict=False):
+    """
+    Cast the scalar payload into the native type. If ``strict`` is true,
+    null is rejected and only the scalars are converted to str.
+    """
+
+    if issubclass(data_type, date):
+        # note: the datetime is a subclass of date
+        if issubclass(data_type, datetime):
+            if isinstance(payload, datetime):
+                return payload.astimezone()
+            elif isinstance(payload, str):
+                payload = datetime.fromisoformat(payload)
+                return payload.astimezone()
+        else:
+            if isinstance(payload, datetime):
+                return payload.astimezone(timezone.utc).date()
+            elif isinstance(payload, str):
+                return date.fromisoformat(payload)
+
+    if isinstance(payload, data_type):
+        return payload
+
+    if payload is None and strict:
+        raise IncompliantError(f"The null payload is incomplaint with "
+                               f"{data_type}")
+
+    if issubclass(data_type, Enum):
+        return data_type(payload)
+
+    if issubclass(data_type, str):
+        if isinstance(payload, datetime):
+            return payload.astimezone().isoformat()
+        elif isinstance(payload, (int, float, Decimal)) or not strict:
+            return str(payload)
+
+    if isinstance(payload, (int, float)) and not isinstance(payload, bool):
+        # json的数字类型
+        if issubclass(data_type, Decimal):
+            return data_type(str(payload))
+        elif issubclass(data_type, float):
+            return data_type(payload)
+
+    if isinstance(payload, str):
+        # 注意 bool 是 int 的子类，需要先判断
+        if issubclass(data_type, bool):
+            payload = payload.lower()
+            if payload in ("true", "t", "1"):
+                return True
+            elif payload in ("false", "f", "0"):
+                return False
+        elif issubclass(data_type, (int, float, Decimal)):
+            return data_type(payload)
+
+                
+    raise IncompliantError(f"The payload type '{type(payload)}' "
+                           f"is incomplaint with {data_type}")
+
+
+def cast_dataclass_object(ctx, payload, data_type, as_object,
+                          field_specs=None, strict=False):
+    """
+    将字典结构的数据转换为dataclass类型的对象。
+
+    The missing fields without defaults are None, unless ``strict`` is true
+    where they are rejected as well as the null of the fields not defaulting
+    to None.
+    """
 
     if not isinstance(payload, dict):
         raise IncompliantError(f"The payload's type '{type(payload)}' "
                                f"is incomplaint with dataclass {data_type}")
 
-    init_kwargs = {}
-    for field in fields(data_type):
-        if not field.init:
-            # 不需要包含对象初始化里的，跳过
-            continue
+    if field_specs is None:
+        field_specs = dataclass_field_specs(data_type)
 
-        field_name = field.name
-        field_value = payload.get(field.name, MISSING)
+    init_kwargs = {}
+    for field_name, field_type, default, default_factory in field_specs:
+        field_value = payload.get(field_name, MISSING)
         if field_value is MISSING:
             # 处理缺失值
-            if field.default is not MISSING:
-                field_value = field.default
-            elif field.default_factory is not MISSING:
-                field_value = field.default_factory()
+            if default is not MISSING:
+                field_value = default
+            elif default_factory is not MISSING:
+                field_value = default_factory()
+            elif strict:
+                raise IncompliantError(f"The field '{field_name}' of "
+                                       f"{data_type.__name__} is required")
             else:
                 field_value = None
+        elif field_value is None and default is None and strict:
+            pass  # 默认值为None的字段允许为空
         else:
-            field_value = as_object(ctx, field_value, field.type)
+            field_value = as_object(ctx, field_value, field_type)
 
         init_kwargs[field_name] = field_value
 
     return data_type(**init_kwargs)
 
 
+def dataclass_field_specs(data_type):
+    """The name, type and defaults of the init fields, resolved once"""
+
+    field_specs = _field_specs.get(data_type)
+    if field_specs is None:
+        try:
+            hints = get_type_hints(data_type)
+        except (NameError, TypeError):
+            hints = {}  # 无法解析的前向引用，使用原始注解
+
+        field_specs = tuple(
+            (f.name, hints.get(f.name, f.type), f.default, f.default_factory)
+            for f in fields(data_type) if f.init
+        )
+        _field_specs[data_type] = field_specs
+
+    return field_specs
+
+
+_field_specs = {}
+
+
 _DREALM_HINTS = "__drealm_hints__"
 
 
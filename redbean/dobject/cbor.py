@@ -3,6 +3,7 @@ from dataclasses import _is_dataclass_instance, _FIELDS as _DATACLASS_FIELDS
 from dataclasses import dataclass, fields, MISSING
 
 import copy
+from enum import Enum
 from typing import Tuple, List
 from datetime import datetime, date, time as dt_time, timezone, timedelta
 from cbor2 import dumps as cbor_dumps, loads as cbor_loads
@@ -10,7 +11,7 @@ from cbor2 import dumps as cbor_dumps, loads as cbor_loads
 from typing import Any, Mapping
 from decimal import Decimal
 from .cast import cast_dataclass_object, cast_generic_object
-from . import IncompliantError
+from .cast import cast_native_object
 
 class DObjectCBOREncoder:
     def __init__(self):
@@ -82,51 +83,3 @@ def _as_dobj(ctx, payload, data_type):
         return cast_generic_object(ctx, payload, data_type, _as_dobj)
 
     raise ValueError(f"Unsupport '{data_type}'")
-
-
-from enum import Enum
-
-def cast_native_object(ctx, payload, data_type):
-
-    if issubclass(data_type, date):
-        # note: the datetime is a subclass of date
-        if issubclass(data_type, datetime):
-            if isinstance(payload, datetime):
-                return payload.astimezone()
-            elif isinstance(payload, str):
-                payload = datetime.fromisoformat(payload)
-                return payload.astimezone()
-        else:
-            if isinstance(payload, datetime):
-                return payload.astimezone(timezone.utc).date()
-            elif isinstance(payload, str):
-                return date.fromisoformat(payload)
-
-    if isinstance(payload, data_type):
-        return payload
-
-    if issubclass(data_type, Enum):
-        return data_type(payload)
-
-    if issubclass(data_type, str):
-        if isinstance(payload, datetime):
-            return payload.astimezone().isoformat()
-        else:
-            return str(payload)
-
-
-    if isinstance(payload, str):
-        if issubclass(data_type, (int, float, Decimal)):
-            return data_type(payload)
-        elif issubclass(data_type, bool):
-            payload = payload.lower()
-            if payload == "true" or payload == "t":
-                return True
-            elif payload == "false" or payload == "f":
-                return False
-
-                
-    raise IncompliantError(f"The payload type '{type(payload)}' "
-                           f"is incomplaint with {data_type}")
-
-
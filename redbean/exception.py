@@ -16,3 +16,18 @@ class InvalidArgumentError(ActionException):
 class BusinessRuleFailedError(ActionException):
     """ 业务逻辑无法满足继续执行 """
     pass
+
+class DeadlineExceededError(ActionException):
+    """ 请求在截止时间内未能完成 """
+    pass
+
+class OverloadedError(ActionException):
+    """ 服务过载，请求被拒绝 """
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class PayloadTooLargeError(ActionException):
+    """ 请求体超过了路由允许的大小 """
+    pass
@@ -8,6 +8,7 @@ from .config import setup as setup_config
 from .config import setup_logging
 import redbean.dev_tools
 from .logs import setup_log_config
+from .web.errors import setup_error_reporter
 
 
 def cli(app_factory):
@@ -58,7 +59,7 @@ def cli(app_factory):
     setup_log_config(verbose=args.verbose, is_production_mode=args.production)
 
     if args.production:
-        aiohttp.web.run_app(app_factory(),
+        aiohttp.web.run_app(production_app(app_factory),
                             host=args.host,
                             port=args.port,
                             access_log_format=log_format)
@@ -70,3 +71,17 @@ def cli(app_factory):
                                   access_log_format=log_format,
                                   verbose=args.verbose,
                                   is_production_mode=False)
+
+
+def production_app(app_factory):
+    app = app_factory()
+    if not inspect.isawaitable(app):
+        setup_error_reporter(app, production=True)
+        return app
+
+    async def _make_app():
+        created_app = await app
+        setup_error_reporter(created_app, production=True)
+        return created_app
+
+    return _make_app()
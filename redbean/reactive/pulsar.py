@@ -5,7 +5,7 @@ from typing import Tuple, Dict, Callable
 
 import pulsar
 from pulsar import Client as PulsarClient, Consumer, Producer, Message
-from pulsar import ConsumerType
+from pulsar import ConsumerType, MessageId
 
 import inspect
 from ..dobject.cbor import DObjectCBOREncoder
@@ -53,8 +53,11 @@ class PulsarChannel(AbstractChannel):
 
     async def close(self):
         await super().close()
-        for _listener, consumer in self._consumers.items():
-            consumer.unsubscribe()
+        for listener, consumer in self._consumers.items():
+            if listener.durable:
+                consumer.unsubscribe()
+            else:
+                consumer.close()
 
         for _action, producer in self._producers.items():
             producer.flush()
@@ -91,6 +94,19 @@ def subscribe(
         finally:
             ...
 
+    if not listener.durable:
+        # 读取器不创建持久的订阅，从最新的消息开始接收
+        def _reader_listener(reader, msg: Message):
+            try:
+                argvals = get_argvals(msg)
+                _run_coroutine(handler(*argvals), loop)
+            except Exception as ex:
+                print(ex)
+
+        return client.create_reader(topic_path, MessageId.latest,
+                                    reader_listener=_reader_listener,
+                                    reader_name=listener.group_id)
+
     consumer = client.subscribe(topic_path,
                                 subscription_name=listener.group_id,
                                 consumer_type=ConsumerType.Shared,
@@ -5,12 +5,17 @@ from typing import Callable, Awaitable, Any
 HandlerType = Callable[..., Awaitable[Any]]
 
 class ListenerSpec:
-    __slots__ = ("topic_expr", "handler", "group_id")
+    __slots__ = ("topic_expr", "handler", "group_id", "durable")
 
-    def __init__(self, topic_expr: str, handler: HandlerType):
+    def __init__(self, topic_expr: str, handler: HandlerType,
+                 group_id: str = None, durable: bool = True):
         self.topic_expr = topic_expr
         self.handler = handler
-        self.group_id = f"{handler.__module__}.{handler.__qualname__}"
+        if group_id is None:
+            group_id = f"{handler.__module__}.{handler.__qualname__}"
+        self.group_id = group_id
+        # 非持久的监听只接收连接之后的消息，断开后不在服务端保留订阅
+        self.durable = durable
 
 
 from .exceptions import UmountAction
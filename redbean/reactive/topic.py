@@ -21,10 +21,11 @@ class Topic:
     def add_topic(self, topic: Topic):
         self._subtopics.append(topic)
 
-    def listen(self, topic_expr: str) -> Any:
+    def listen(self, topic_expr: str, *, group_id: str = None,
+               durable: bool = True) -> Any:
 
         def _decorator(handler: HandlerType):
-            listener = ListenerSpec(topic_expr, handler)
+            listener = ListenerSpec(topic_expr, handler, group_id, durable)
             self._listeners.append(listener)
 
             async def _wrapped_func(*args, **kwargs):
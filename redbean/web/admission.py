@@ -0,0 +1,180 @@
+import math
+import time
+import asyncio
+import functools
+from collections import deque
+
+from ..exception import ActionException, OverloadedError
+from ..exception import DeadlineExceededError
+
+PRIORITY_CRITICAL = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+
+
+class ConcurrencyLimiter:
+    """
+    Limit the concurrent requests of the routes sharing this limiter.
+
+    The requests over the limit wait in a bounded queue for at most
+    ``queue_timeout`` seconds, the lower priority number first. Once the
+    queue is full, a request sheds the newest queued one of a lower priority,
+    or is shed itself, with OverloadedError (503 with Retry-After).
+
+    With ``adaptive`` true the limit follows AIMD: it grows by 1/limit after
+    each request within ``latency_target`` and is multiplied by ``backoff``
+    after a slower or failed one, between ``min_limit`` and ``max_limit``.
+    The server errors and the exceeded deadlines count as failures.
+    """
+
+    __slots__ = ("limit", "queue_size", "queue_timeout",
+                 "adaptive", "min_limit", "max_limit", "latency_target",
+                 "backoff", "active", "admitted", "queued", "shed",
+                 "_waiters", "_queued_count")
+
+    def __init__(self, max_concurrency, *, queue_size=None, queue_timeout=1.0,
+                 adaptive=False, min_limit=1, max_limit=None,
+                 latency_target=0.1, backoff=0.9):
+
+        self.limit = float(max_concurrency)
+        self.queue_size = (queue_size if queue_size is not None
+                           else max_concurrency)
+        self.queue_timeout = queue_timeout
+
+        self.adaptive = adaptive
+        self.min_limit = min_limit
+        self.max_limit = (max_limit if max_limit is not None
+                          else max_concurrency * 10)
+        self.latency_target = latency_target
+        self.backoff = backoff
+
+        self.active = 0
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+
+        self._waiters = {}  # priority -> deque of futures
+        self._queued_count = 0
+
+    def stats(self):
+        return {
+            "limit": int(self.limit),
+            "active": self.active,
+            "waiting": self._queued_count,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": self.shed,
+        }
+
+    async def acquire(self, priority=PRIORITY_NORMAL):
+        if self.active < int(self.limit) and self._queued_count == 0:
+            self.active += 1
+            self.admitted += 1
+            return
+
+        if self._queued_count >= self.queue_size:
+            if not self._shed_lower(priority):
+                self.shed += 1
+                raise self._overloaded()
+
+        future = asyncio.get_running_loop().create_future()
+        waiters = self._waiters.get(priority)
+        if waiters is None:
+            waiters = self._waiters[priority] = deque()
+        waiters.append(future)
+        self._queued_count += 1
+        self.queued += 1
+
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._remove_waiter(priority, future)
+            self.shed += 1
+            raise self._overloaded() from None
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and \
+                    future.exception() is None:
+                # 已被授予的名额，转交给下一个等待者
+                self.release()
+            else:
+                self._remove_waiter(priority, future)
+            raise
+
+        self.admitted += 1
+
+    def release(self, elapsed=None, failed=False):
+        if self.adaptive and elapsed is not None:
+            if failed or elapsed > self.latency_target:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+        self.active -= 1
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        """Admit the waiters up to the limit, more than one if it is raised"""
+
+        for priority in sorted(self._waiters):
+            waiters = self._waiters[priority]
+            while waiters and self.active < int(self.limit):
+                future = waiters.popleft()
+                self._queued_count -= 1
+                if not future.done():
+                    self.active += 1
+                    future.set_result(None)
+
+            if self.active >= int(self.limit):
+                return
+
+    def wrap(self, handler, priority=PRIORITY_NORMAL):
+        """Wrap the request handler to be admitted by this limiter"""
+
+        async def _admitted_handler(request):
+            await self.acquire(priority)
+            failed = True
+            started = time.perf_counter()
+            try:
+                response = await handler(request)
+                failed = response.status >= 500
+                return response
+            except DeadlineExceededError:
+                failed = True  # 超时是过载的信号
+                raise
+            except ActionException:
+                failed = False  # 预期的业务异常
+                raise
+            finally:
+                self.release(time.perf_counter() - started, failed)
+
+        return functools.update_wrapper(_admitted_handler, handler)
+
+    def _shed_lower(self, priority):
+        """Shed the newest waiter of the lowest priority below the given"""
+
+        for lower in sorted(self._waiters, reverse=True):
+            if lower <= priority:
+                break
+
+            waiters = self._waiters[lower]
+            while waiters:
+                future = waiters.pop()
+                self._queued_count -= 1
+                if not future.done():
+                    self.shed += 1
+                    future.set_exception(self._overloaded())
+                    return True
+
+        return False
+
+    def _remove_waiter(self, priority, future):
+        try:
+            self._waiters[priority].remove(future)
+            self._queued_count -= 1
+        except ValueError:
+            pass
+
+    def _overloaded(self):
+        retry_after = max(math.ceil(self.queue_timeout), 1)
+        return OverloadedError("The service is overloaded, retry later",
+                               retry_after=retry_after)
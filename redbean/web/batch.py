@@ -0,0 +1,224 @@
+import asyncio
+from yarl import URL
+from multidict import CIMultiDict, CIMultiDictProxy
+from aiohttp import web, hdrs
+from aiohttp.http import RawRequestMessage
+from aiohttp.web_urldispatcher import UrlDispatcher
+
+from ..exception import InvalidArgumentError
+from .serializers import default_json_serializer
+from .compression import get_compression_policy
+from .session import install_session_memo
+from .idempotency import IDEMPOTENCY_HEADER
+
+DEFAULT_BATCH_CONCURRENCY = 8
+DEFAULT_BATCH_OPERATIONS = 64
+
+
+class BatchDispatcher:
+    """
+    Run the operations ``{"method", "path", "args", "body"}`` of a batch
+    request against the routes of a RestServiceDef in process.
+
+    Each operation is resolved by a router of the routes, and its handler is
+    called with an OperationRequest made from the batch request, so the
+    operations share the connection, headers and cookies of the batch
+    request. The operations run concurrently with at most ``max_concurrency``
+    at a time, and the results are returned in order as
+    ``[{"status", "body"}]``.
+    """
+
+    __slots__ = ("_route_defs", "_router", "max_concurrency",
+                 "max_operations")
+
+    def __init__(self, route_defs, *, max_concurrency=DEFAULT_BATCH_CONCURRENCY,
+                 max_operations=DEFAULT_BATCH_OPERATIONS):
+        self._route_defs = route_defs
+        self._router = None
+        self.max_concurrency = max_concurrency
+        self.max_operations = max_operations
+
+    @property
+    def router(self):
+        if self._router is None:
+            router = UrlDispatcher()
+            for route_def in self._route_defs:
+                if getattr(route_def.handler, "batchable", False):
+                    route_def.register(router)
+            self._router = router
+
+        return self._router
+
+    async def handle(self, request):
+        # 各操作共享同一个会话，只解析一次
+        install_session_memo(request)
+
+        operations = parse_operations(await request.read(),
+                                      self.max_operations)
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def _run(operation):
+            async with semaphore:
+                return await self.run_operation(request, operation)
+
+        results = await asyncio.gather(*[_run(op) for op in operations])
+
+        # 各操作的响应体已是json，直接拼接而无需重新解析
+        body = b"[" + b",".join(results) + b"]"
+        response = web.Response(body=body, content_type="application/json")
+
+        compression = get_compression_policy(request)
+        if compression is not None:
+            response = await compression.apply(request, response)
+
+        return response
+
+    async def run_operation(self, batch_request, operation):
+        method, path, args, body = operation
+
+        url = URL(path)
+        if args:
+            url = url.update_query(args)
+
+        headers = CIMultiDict(batch_request.headers)
+        headers[hdrs.ACCEPT] = "application/json"
+        headers.popall(hdrs.ACCEPT_ENCODING, None)  # 拼接前的结果不能压缩
+        headers.popall(hdrs.CONTENT_LENGTH, None)
+        headers.popall(hdrs.IF_NONE_MATCH, None)
+        headers.popall(IDEMPOTENCY_HEADER, None)  # 各操作不能共用一个幂等键
+        if body is not None:
+            headers[hdrs.CONTENT_TYPE] = "application/json"
+
+        # 操作没有独立的请求体，以操作的body代替
+        op_request = OperationRequest(
+            batch_request, method, url, headers,
+            default_json_serializer.dumps(body) if body is not None else b"")
+
+        match_info = await self.router.resolve(op_request)
+        http_exception = match_info.http_exception
+        if http_exception is not None:
+            return _result(http_exception.status, None)
+
+        match_info.add_app(batch_request.app)
+        op_request.match_info = match_info
+
+        try:
+            response = await match_info.handler(op_request)
+        except web.HTTPException as exc:
+            return _result(exc.status, None)
+
+        if type(response) is not web.Response:
+            return _result(500, None)
+
+        data = response.body
+        if not data or response.content_type != "application/json":
+            data = None
+
+        return _result(response.status, data)
+
+
+class OperationRequest(web.Request):
+    """
+    The request of a batch operation, made like ``make_mocked_request`` from
+    the batch request whose connection, task and state it shares. Its content
+    is the operation body, and its match_info is resolved by the batch router.
+    """
+
+    ATTRS = web.Request.ATTRS | frozenset(
+        ["_batch_request", "_operation_body", "_operation_match_info"])
+
+    def __init__(self, batch_request, method, url, headers, body):
+        raw_headers = tuple((k.encode("utf-8"), v.encode("utf-8"))
+                            for k, v in headers.items())
+        message = RawRequestMessage(
+            method, str(url), batch_request.version,
+            CIMultiDictProxy(headers), raw_headers,
+            False, None, False, False, url)
+
+        super().__init__(message, batch_request.content,
+                         batch_request.protocol, batch_request.writer,
+                         batch_request.task, asyncio.get_running_loop(),
+                         state=dict(batch_request),
+                         scheme=batch_request.scheme,
+                         host=batch_request.host,
+                         remote=batch_request.remote)
+
+        self._batch_request = batch_request
+        self._operation_body = body
+        self._operation_match_info = None
+
+    async def read(self):
+        return self._operation_body
+
+    @property
+    def match_info(self):
+        return self._operation_match_info
+
+    @match_info.setter
+    def match_info(self, match_info):
+        self._operation_match_info = match_info
+
+    @property
+    def app(self):
+        return self._batch_request.app
+
+    @property
+    def config_dict(self):
+        return self._batch_request.config_dict
+
+
+def _result(status, data):
+    if data is None:
+        data = b"null"
+
+    return b'{"status":' + str(status).encode() + b',"body":' + data + b'}'
+
+
+def _query_value(value):
+    if isinstance(value, (list, tuple)):
+        return [_query_value(v) for v in value]  # 重复的查询参数
+
+    if isinstance(value, bool):
+        return "true" if value else "false"
+
+    return value if isinstance(value, str) else str(value)
+
+
+def parse_operations(data, max_operations):
+    try:
+        operations = default_json_serializer.loads(data)
+    except ValueError as exc:
+        raise InvalidArgumentError(f"Malformed batch request: {exc}") from exc
+
+    if not isinstance(operations, list):
+        raise InvalidArgumentError("The batch request should be a list")
+
+    if len(operations) > max_operations:
+        raise InvalidArgumentError(f"Too many operations in a batch request, "
+                                   f"the maximum is {max_operations}")
+
+    parsed = []
+    for operation in operations:
+        if not isinstance(operation, dict) or \
+                not isinstance(operation.get("path"), str):
+            raise InvalidArgumentError(f"Malformed batch operation: "
+                                       f"{operation!r}")
+
+        method = operation.get("method", hdrs.METH_GET)
+        if not isinstance(method, str):
+            raise InvalidArgumentError(f"The method of batch operation "
+                                       f"should be a str: {operation!r}")
+        method = method.upper()
+
+        args = operation.get("args")
+        if args is not None:
+            if not isinstance(args, dict):
+                raise InvalidArgumentError(f"The args of batch operation "
+                                           f"should be a dict: {operation!r}")
+            args = {k: _query_value(v) for k, v in args.items()}
+
+        parsed.append((method, operation["path"], args,
+                       operation.get("body")))
+
+    return parsed
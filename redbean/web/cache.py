@@ -0,0 +1,222 @@
+import time
+import hashlib
+import functools
+from collections import OrderedDict
+from aiohttp import web
+from .serializers import negotiate_response_serializer
+from .compression import get_compression_policy, add_vary
+from .compression import COMPRESSIBLE_CONTENT_TYPES
+
+
+class CacheEntry:
+    __slots__ = ("body", "content_type", "etag", "expires_at", "variants")
+
+    def __init__(self, body, content_type, etag, expires_at):
+        self.body = body
+        self.content_type = content_type
+        self.etag = etag
+        self.expires_at = expires_at
+        self.variants = None
+
+    async def compressed(self, policy, encoding):
+        """The body compressed once per encoding and its ETag"""
+
+        variants = self.variants
+        if variants is None:
+            variants = self.variants = {}
+
+        variant = variants.get(encoding)
+        if variant is None:
+            etag = self.etag[:-1] + "-" + encoding + '"'
+            variant = (await policy.compress_body(encoding, self.body), etag)
+            variants[encoding] = variant
+
+        return variant
+
+
+class ResponseCache:
+    """
+    The bounded LRU of serialized GET responses of one route.
+
+    The entries are keyed by the bound arguments, the values of the vary
+    headers and the negotiated content type. The hit responses carry a strong
+    ETag and Cache-Control, and requests with a matching If-None-Match are
+    answered with 304 without calling the handler. The compressed bodies are
+    kept in the entry along with the identity one, so the hits are not
+    compressed again.
+    """
+
+    __slots__ = ("ttl", "vary", "maxsize", "key_names",
+                 "hits", "misses", "evictions", "_entries")
+
+    def __init__(self, ttl, *, vary=None, maxsize=1024, key_names=()):
+        self.ttl = ttl
+        self.vary = tuple(vary) if vary else ()
+        self.maxsize = maxsize
+        self.key_names = tuple(key_names)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def make_key(self, request, arg_values):
+        return make_request_key(self.key_names, self.vary, request, arg_values)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, body, content_type):
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        entry = CacheEntry(body, content_type, etag,
+                           time.monotonic() + self.ttl)
+
+        entries = self._entries
+        entries[key] = entry
+        entries.move_to_end(key)
+        while len(entries) > self.maxsize:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+        return entry
+
+    def invalidate(self, **arg_values):
+        """
+        Remove the entries whose bound arguments equal the given ones, or all
+        entries if no argument is given.
+        """
+
+        if not arg_values:
+            self._entries.clear()
+            return
+
+        idxs = []
+        for name, value in arg_values.items():
+            try:
+                idxs.append((self.key_names.index(name),
+                             hashable_key_value(value)))
+            except ValueError:
+                raise ValueError(f"Unknown cache key argument '{name}', "
+                                 f"the key arguments: {self.key_names}")
+
+        stale_keys = [
+            key for key in self._entries
+            if all(key[0][i] == value for i, value in idxs)
+        ]
+        for key in stale_keys:
+            del self._entries[key]
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    async def make_response(self, request, entry):
+        max_age = max(int(entry.expires_at - time.monotonic()), 0)
+        headers = {
+            "ETag": entry.etag,
+            "Cache-Control": f"max-age={max_age}",
+        }
+        if self.vary:
+            headers["Vary"] = ", ".join(self.vary)
+
+        body = entry.body
+        policy = get_compression_policy(request)
+        if policy is not None and len(body) >= policy.min_size and \
+                entry.content_type in COMPRESSIBLE_CONTENT_TYPES:
+            add_vary(headers, "Accept-Encoding")
+            encoding = policy.negotiate(request)
+            if encoding is not None:
+                body, headers["ETag"] = await entry.compressed(policy,
+                                                               encoding)
+                headers["Content-Encoding"] = encoding
+
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match is not None:
+            if etag_matches(if_none_match, headers["ETag"]):
+                headers.pop("Content-Encoding", None)
+                return web.Response(status=304, headers=headers)
+
+        return web.Response(body=body,
+                            content_type=entry.content_type,
+                            headers=headers)
+
+    def wrap(self, invoke):
+        """Wrap the invoking of handler to respond from the cache"""
+
+        async def _cached_invoke(request, arg_values):
+            key = self.make_key(request, arg_values)
+            entry = self.get(key)
+            if entry is None:
+                response = await invoke(request, arg_values)
+                if not is_serialized_response(response) or \
+                        response.status != 200:
+                    return response
+
+                entry = self.put(key, response.body, response.content_type)
+
+            return await self.make_response(request, entry)
+
+        return functools.update_wrapper(_cached_invoke, invoke)
+
+
+def make_request_key(key_names, vary, request, arg_values):
+    """
+    The key of the bound arguments, the values of vary headers and the
+    negotiated content type of response.
+    """
+
+    args_key = tuple(hashable_key_value(arg_values[name])
+                     for name in key_names)
+    headers = request.headers
+    vary_key = tuple(headers.get(name) for name in vary)
+    content_type = negotiate_response_serializer(request).content_type
+    return (args_key, vary_key, content_type)
+
+
+def hashable_key_value(value):
+    """The repeated query arguments are bound as lists, keyed as tuples"""
+
+    if isinstance(value, list):
+        return tuple(value)
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+
+def is_serialized_response(response):
+    # 已完整序列化的响应才能缓存或共享，流式响应不能
+    return (type(response) is web.Response and
+            isinstance(response.body, bytes))
+
+
+def etag_matches(if_none_match, etag):
+    if if_none_match.strip() == "*":
+        return True
+
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+
+    return False
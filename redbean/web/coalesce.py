@@ -0,0 +1,90 @@
+import asyncio
+from aiohttp import web
+from .cache import make_request_key, is_serialized_response
+
+
+class SingleFlight:
+    """
+    Coalesce the concurrent calls of one route with identical bound
+    arguments into one in-flight execution, sharing its serialized result.
+
+    The execution runs in its own task and the callers wait on it through
+    asyncio.shield, so one client disconnecting does not cancel the shared
+    computation for the others.
+    """
+
+    __slots__ = ("vary", "key_names", "executions", "coalesced", "_inflight")
+
+    def __init__(self, *, vary=None, key_names=()):
+        self.vary = tuple(vary) if vary else ()
+        self.key_names = tuple(key_names)
+
+        self.executions = 0
+        self.coalesced = 0
+        self._inflight = {}
+
+    def __len__(self):
+        return len(self._inflight)
+
+    def stats(self):
+        return {
+            "inflight": len(self._inflight),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+        }
+
+    def wrap(self, invoke):
+        """Wrap the invoking of handler to share the in-flight execution"""
+
+        inflight = self._inflight
+
+        async def _coalesced_invoke(request, arg_values):
+            key = make_request_key(self.key_names, self.vary,
+                                   request, arg_values)
+            task = inflight.get(key)
+            if task is None:
+                task = asyncio.ensure_future(invoke(request, arg_values))
+                inflight[key] = task
+                task.add_done_callback(_done_callback(inflight, key))
+                self.executions += 1
+                is_leader = True
+            else:
+                self.coalesced += 1
+                is_leader = False
+
+            response = await asyncio.shield(task)
+            if is_serialized_response(response):
+                return copy_response(response)
+
+            if is_leader:
+                return response
+
+            # 流式等不能共享的响应，由各自的请求重新执行
+            return await invoke(request, arg_values)
+
+        return _coalesced_invoke
+
+
+def _done_callback(inflight, key):
+
+    def _callback(task):
+        if inflight.get(key) is task:
+            del inflight[key]
+
+        if not task.cancelled():
+            # 所有等待者都已断开时，避免出现未获取异常的警告
+            task.exception()
+
+    return _callback
+
+
+def copy_response(response):
+    headers = response.headers.copy()
+    headers.pop("Content-Length", None)
+    headers.pop("Content-Type", None)
+    copied = web.Response(body=response.body,
+                          status=response.status,
+                          content_type=response.content_type,
+                          headers=headers)
+    copied.cookies.update(response.cookies)
+    return copied
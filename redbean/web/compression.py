@@ -0,0 +1,191 @@
+import gzip
+import asyncio
+from aiohttp import web, hdrs
+from aiohttp.web import ContentCoding
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+COMPRESSION_POLICY = "compression_policy"
+
+COMPRESSIBLE_CONTENT_TYPES = frozenset([
+    "application/json",
+    "application/cbor",
+])
+
+# 超过该大小的响应体在线程池里压缩，不阻塞事件循环
+DEFAULT_EXECUTOR_SIZE = 64 * 1024
+
+# aiohttp能够边写边压缩的流式响应编码
+STREAM_ENCODINGS = {
+    "gzip": ContentCoding.gzip,
+}
+
+
+def _gzip_compress(data, level):
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _brotli_compress(data, level):
+    return brotli.compress(data, quality=level)
+
+
+def _zstd_compress(data, level):
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+# encoding -> (compress function, default level), 按服务端偏好的顺序
+_compressors = {}
+if zstandard is not None:
+    _compressors["zstd"] = (_zstd_compress, 3)
+if brotli is not None:
+    _compressors["br"] = (_brotli_compress, 4)
+_compressors["gzip"] = (_gzip_compress, 5)
+
+
+class CompressionPolicy:
+    """
+    Compress the serialized JSON/CBOR responses of at least ``min_size``
+    bytes with the most preferred of ``encodings`` which the client accepts.
+
+    The bodies of at least ``executor_size`` bytes are compressed in the
+    default executor off the event loop. The streaming responses are gzipped
+    by aiohttp chunk by chunk as they are written.
+    """
+
+    __slots__ = ("min_size", "encodings", "levels", "executor_size")
+
+    def __init__(self, *, min_size=1024, level=None, encodings=None,
+                 executor_size=DEFAULT_EXECUTOR_SIZE):
+        if encodings is None:
+            encodings = tuple(_compressors)
+
+        for encoding in encodings:
+            if encoding not in _compressors:
+                raise ValueError(f"Unsupported compression '{encoding}', "
+                                 f"the available: {', '.join(_compressors)}")
+
+        self.min_size = min_size
+        self.encodings = tuple(encodings)
+        self.levels = {
+            encoding: level if level is not None else _compressors[encoding][1]
+            for encoding in self.encodings
+        }
+        self.executor_size = executor_size
+
+    def negotiate(self, request):
+        return negotiate_encoding(request, self.encodings)
+
+    def compress(self, encoding, data):
+        compress, _ = _compressors[encoding]
+        return compress(data, self.levels[encoding])
+
+    async def compress_body(self, encoding, data):
+        """Compress the data, in the executor if it is large"""
+
+        if self.executor_size is None or len(data) < self.executor_size:
+            return self.compress(encoding, data)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.compress, encoding, data)
+
+    def is_compressible(self, response):
+        return (type(response) is web.Response and
+                isinstance(response.body, bytes) and
+                len(response.body) >= self.min_size and
+                response.content_type in COMPRESSIBLE_CONTENT_TYPES and
+                hdrs.CONTENT_ENCODING not in response.headers)
+
+    async def apply(self, request, response):
+        """Compress the body of the response in place if worthwhile"""
+
+        if not self.is_compressible(response):
+            return response
+
+        encoding = self.negotiate(request)
+        if encoding is not None:
+            response.body = await self.compress_body(encoding, response.body)
+            response.headers[hdrs.CONTENT_ENCODING] = encoding
+
+        add_vary(response.headers, hdrs.ACCEPT_ENCODING)
+        return response
+
+    def enable_stream_compression(self, request, response):
+        """Compress the streaming response before it is prepared"""
+
+        encoding = negotiate_encoding(request, [
+            e for e in self.encodings if e in STREAM_ENCODINGS])
+        if encoding is not None:
+            response.enable_compression(STREAM_ENCODINGS[encoding])
+
+        add_vary(response.headers, hdrs.ACCEPT_ENCODING)
+
+
+def parse_accept_encoding(accept_encoding):
+    accepted = {}
+    for item in accept_encoding.split(","):
+        encoding, _, params = item.partition(";")
+        encoding = encoding.strip().lower()
+        if not encoding:
+            continue
+
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+
+        accepted[encoding] = q
+
+    return accepted
+
+
+def negotiate_encoding(request, encodings):
+    """The first of encodings accepted by the client, or None for identity"""
+
+    accept_encoding = request.headers.get(hdrs.ACCEPT_ENCODING)
+    if not accept_encoding:
+        return None
+
+    accepted = parse_accept_encoding(accept_encoding)
+    any_accepted = accepted.get("*", 0) > 0
+    for encoding in encodings:
+        q = accepted.get(encoding)
+        if q is None:
+            if any_accepted:
+                return encoding
+        elif q > 0:
+            return encoding
+
+    return None
+
+
+def add_vary(headers, name):
+    vary = headers.get(hdrs.VARY)
+    if vary is None:
+        headers[hdrs.VARY] = name
+    elif name.lower() not in vary.lower():
+        headers[hdrs.VARY] = f"{vary}, {name}"
+
+
+def setup_compression(app, *, min_size=1024, level=None, encodings=None,
+                      executor_size=DEFAULT_EXECUTOR_SIZE):
+    """Compress the REST responses of the application"""
+    app[COMPRESSION_POLICY] = CompressionPolicy(min_size=min_size,
+                                                level=level,
+                                                encodings=encodings,
+                                                executor_size=executor_size)
+
+
+def get_compression_policy(request):
+    return request.app.get(COMPRESSION_POLICY)
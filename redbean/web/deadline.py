@@ -0,0 +1,91 @@
+import asyncio
+
+from ..exception import DeadlineExceededError
+
+DEADLINE_KEY = "redbean_deadline"
+
+
+class Deadline:
+    """The deadline of a request in the event loop's clock"""
+
+    __slots__ = ("expires_at", "_loop")
+
+    def __init__(self, timeout, loop=None):
+        self._loop = loop or asyncio.get_running_loop()
+        self.expires_at = self._loop.time() + timeout
+
+    def remaining(self):
+        """The remaining budget in seconds, never negative"""
+        return max(self.expires_at - self._loop.time(), 0.0)
+
+    @property
+    def expired(self):
+        return self._loop.time() >= self.expires_at
+
+    def __repr__(self):
+        return f"<Deadline remaining={self.remaining():.3f}s>"
+
+
+class DeadlinePolicy:
+    """
+    The timeout budget of a route, optionally shortened by the budget in
+    seconds which the client sends in the ``header``.
+    """
+
+    __slots__ = ("timeout", "header")
+
+    def __init__(self, timeout=None, header=None):
+        self.timeout = timeout
+        self.header = header
+
+    def start(self, request):
+        timeout = self.timeout
+        if self.header is not None:
+            value = request.headers.get(self.header)
+            if value is not None:
+                try:
+                    budget = float(value)
+                except ValueError:
+                    budget = None
+
+                if budget is not None and budget >= 0:
+                    if timeout is None or budget < timeout:
+                        timeout = budget
+
+        if timeout is None:
+            return None
+
+        deadline = Deadline(timeout)
+        request[DEADLINE_KEY] = deadline
+        return deadline
+
+    def wrap(self, invoke):
+        """Cancel the handler if it does not finish before the deadline"""
+
+        async def _deadline_invoke(request, arg_values):
+            deadline = request.get(DEADLINE_KEY)
+            if deadline is None:
+                return await invoke(request, arg_values)
+
+            remaining = deadline.remaining()
+            if remaining <= 0:
+                raise DeadlineExceededError(
+                    f"Deadline exceeded before handling "
+                    f"{request.method} {request.path}")
+
+            try:
+                return await asyncio.wait_for(invoke(request, arg_values),
+                                              remaining)
+            except asyncio.TimeoutError:
+                if not deadline.expired:
+                    raise  # 处理函数自身的超时
+
+                raise DeadlineExceededError(
+                    f"Deadline exceeded while handling "
+                    f"{request.method} {request.path}") from None
+
+        return _deadline_invoke
+
+
+def get_deadline(request):
+    return request.get(DEADLINE_KEY)
@@ -0,0 +1,126 @@
+import time
+import random
+import logging
+from aiohttp import web
+
+from ..exception import ActionException
+from .serializers import default_json_serializer
+
+redbean_logger = logging.getLogger("redbean")
+
+
+class ErrorReporter:
+    """
+    The production error mode of the REST responses.
+
+    The expected ActionException errors, including the shed and timed out
+    requests, are neither traced nor logged above DEBUG. The tracebacks of
+    the server errors are only formatted if they are logged: each signature,
+    the exception type and the raising line, is logged at most
+    ``rate_limit`` times per ``rate_period`` seconds, and then sampled with
+    ``sample_rate``. The response bodies carry no tracebacks.
+    """
+
+    __slots__ = ("sample_rate", "rate_limit", "rate_period",
+                 "max_signatures", "_signatures")
+
+    def __init__(self, *, sample_rate=0.01, rate_limit=5, rate_period=60.0,
+                 max_signatures=1024):
+        self.sample_rate = sample_rate
+        self.rate_limit = rate_limit
+        self.rate_period = rate_period
+        self.max_signatures = max_signatures
+        self._signatures = {}
+
+    def report(self, exc, status, error_type, error_message):
+        if isinstance(exc, ActionException):
+            if redbean_logger.isEnabledFor(logging.DEBUG):
+                redbean_logger.debug("%s (%d): %s",
+                                     error_type, status, error_message)
+        else:
+            error_message = "Internal server error"
+            self.log_server_error(exc, status, error_type)
+
+        body = default_json_serializer.dumps({
+            "status": status,
+            "error": error_type,
+            "message": error_message,
+        })
+        return web.Response(body=body, status=status,
+                            content_type="application/json")
+
+    def log_server_error(self, exc, status, error_type):
+        signature = exception_signature(exc)
+        suppressed = self.acquire(signature)
+        if suppressed is None:
+            return
+
+        # 由logging在输出时格式化异常栈
+        if suppressed:
+            redbean_logger.error("%s (%d): %s: %s "
+                                 "[%d similar errors suppressed]",
+                                 error_type, status, type(exc).__name__, exc,
+                                 suppressed, exc_info=exc)
+        else:
+            redbean_logger.error("%s (%d): %s: %s",
+                                 error_type, status, type(exc).__name__, exc,
+                                 exc_info=exc)
+
+    def acquire(self, signature):
+        """
+        Return the count of suppressed errors since the last logged one if
+        this error of signature should be logged, otherwise None.
+        """
+
+        now = time.monotonic()
+        state = self._signatures.get(signature)
+        if state is None or now - state[0] >= self.rate_period:
+            if state is None and len(self._signatures) >= self.max_signatures:
+                self._signatures.clear()
+
+            suppressed = 0 if state is None else state[2]
+            self._signatures[signature] = [now, 1, 0]
+            return suppressed
+
+        if state[1] < self.rate_limit or random.random() < self.sample_rate:
+            state[1] += 1
+            suppressed, state[2] = state[2], 0
+            return suppressed
+
+        state[2] += 1
+        return None
+
+
+def exception_signature(exc):
+    tb = exc.__traceback__
+    if tb is None:
+        return (type(exc), None, 0)
+
+    while tb.tb_next is not None:
+        tb = tb.tb_next
+
+    code = tb.tb_frame.f_code
+    return (type(exc), code.co_filename, tb.tb_lineno)
+
+
+ERROR_REPORTER = "error_reporter"
+
+
+def setup_error_reporter(app, production=True, **options):
+    """
+    Switch the REST error responses of the application to the production
+    mode, or back to the development mode which logs and responds with the
+    full tracebacks.
+    """
+
+    if production:
+        app[ERROR_REPORTER] = ErrorReporter(**options)
+    else:
+        app.pop(ERROR_REPORTER, None)
+
+
+def get_error_reporter(request):
+    if request is None:
+        return None
+
+    return request.app.get(ERROR_REPORTER)
@@ -0,0 +1,196 @@
+import asyncio
+import inspect
+import importlib
+import functools
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from ..exception import OverloadedError
+
+EXECUTOR_THREAD = "thread"
+EXECUTOR_PROCESS = "process"
+
+
+class ManagedExecutor:
+    """
+    A thread or process pool running the synchronous or CPU-bound handlers
+    off the event loop.
+
+    The pool is created on the first call with at most ``max_workers``
+    workers. The calls waiting or running in the pool are counted, and
+    beyond ``max_pending`` the new calls are rejected with OverloadedError.
+    The finished calls are counted as ``succeeded`` or ``failed``, a call
+    whose caller stops waiting is still pending until the worker finishes it.
+    """
+
+    __slots__ = ("kind", "max_workers", "max_pending", "_pool",
+                 "pending", "submitted", "succeeded", "failed", "rejected")
+
+    def __init__(self, kind, *, max_workers=None, max_pending=None):
+        if kind not in (EXECUTOR_THREAD, EXECUTOR_PROCESS):
+            raise ValueError(f"Unknown executor '{kind}', "
+                             f"should be 'thread' or 'process'")
+
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._pool = None
+
+        self.pending = 0
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.rejected = 0
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            if self.kind == EXECUTOR_PROCESS:
+                self._pool = ProcessPoolExecutor(self.max_workers)
+            else:
+                self._pool = ThreadPoolExecutor(
+                    self.max_workers, thread_name_prefix="redbean")
+
+        return self._pool
+
+    def stats(self):
+        return {
+            "pending": self.pending,
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+    async def run(self, func, arg_values, *, run_coroutine=True):
+        """
+        Call the function in the pool. A coroutine it returns is run to
+        completion in the worker only if ``run_coroutine`` is true, otherwise
+        it is returned to be awaited by the caller.
+        """
+
+        if self.max_pending is not None and self.pending >= self.max_pending:
+            self.rejected += 1
+            raise OverloadedError(f"The {self.kind} executor is busy, "
+                                  f"retry later")
+
+        loop = asyncio.get_running_loop()
+        if self.kind == EXECUTOR_PROCESS:
+            # 被装饰后的函数不能直接pickle，在工作进程里按名称导入
+            call = functools.partial(_call_by_name, func.__module__,
+                                     func.__qualname__, arg_values)
+        else:
+            call = functools.partial(_call, func, arg_values, run_coroutine)
+
+        self.pending += 1
+        self.submitted += 1
+        pool_future = self.pool.submit(call)
+        pool_future.add_done_callback(
+            functools.partial(self._pool_call_done, loop))
+        try:
+            result = await asyncio.wrap_future(pool_future)
+        except BaseException:
+            self.failed += 1
+            raise
+
+        self.succeeded += 1
+        return result
+
+    def _pool_call_done(self, loop, pool_future):
+        # 在工作线程里回调，回到事件循环再计数
+        try:
+            loop.call_soon_threadsafe(self._finish_pending)
+        except RuntimeError:
+            pass  # 事件循环已关闭
+
+    def _finish_pending(self):
+        self.pending -= 1
+
+    def shutdown(self, wait=True):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
+
+
+def _call(func, arg_values, run_coroutine=True):
+    result = func(**arg_values)
+    if run_coroutine and inspect.iscoroutine(result):
+        # CPU密集的协程函数在工作线程或进程里用独立的事件循环执行
+        result = asyncio.run(result)
+
+    return result
+
+
+def _call_by_name(module_name, qualname, arg_values):
+    obj = importlib.import_module(module_name)
+    for name in qualname.split("."):
+        obj = getattr(obj, name)
+
+    return _call(inspect.unwrap(obj), arg_values)
+
+
+_executors = {
+    EXECUTOR_THREAD: ManagedExecutor(EXECUTOR_THREAD),
+    EXECUTOR_PROCESS: ManagedExecutor(EXECUTOR_PROCESS),
+}
+
+
+def get_executor(executor):
+    if isinstance(executor, ManagedExecutor):
+        return executor
+
+    managed = _executors.get(executor)
+    if managed is None:
+        raise ValueError(f"Unknown executor '{executor}', "
+                         f"should be 'thread' or 'process'")
+    return managed
+
+
+def iter_executors():
+    return iter(_executors.values())
+
+
+def setup_executors(app=None, *, thread_workers=None, process_workers=None,
+                    max_pending=None):
+    """
+    Configure the size limits of the shared thread and process pools, and
+    shut them down with the application.
+    """
+
+    for kind, max_workers in ((EXECUTOR_THREAD, thread_workers),
+                              (EXECUTOR_PROCESS, process_workers)):
+        managed = _executors[kind]
+        managed.shutdown(wait=False)
+        managed.max_workers = max_workers
+        managed.max_pending = max_pending
+
+    if app is not None:
+        async def _shutdown_executors(app):
+            shutdown_executors()
+
+        app.on_cleanup.append(_shutdown_executors)
+
+
+def shutdown_executors(wait=True):
+    for managed in _executors.values():
+        managed.shutdown(wait=wait)
+
+
+def check_executor_arguments(target_func, executor, arg_names):
+    """The handler run in process pool should be importable by name, and its
+    arguments should be picklable values"""
+
+    if executor.kind != EXECUTOR_PROCESS:
+        return
+
+    unpicklable = [name for name in arg_names
+                   if name in ("request", "http_request", "deadline",
+                                "body_stream")]
+    if unpicklable:
+        args = ", ".join([f"'{name}'" for name in unpicklable])
+        raise ValueError(f"The arguments {args} of "
+                         f"'{target_func.__qualname__}' cannot be passed "
+                         f"to process pool")
+
+    if "<locals>" in target_func.__qualname__:
+        raise ValueError(f"The handler '{target_func.__qualname__}' run in "
+                         f"process pool should be defined at module level")
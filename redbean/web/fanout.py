@@ -0,0 +1,264 @@
+import asyncio
+import logging
+from collections import deque
+from aiohttp import web, WSMsgType
+
+from .serializers import default_json_serializer
+
+redbean_logger = logging.getLogger("redbean")
+
+SSE_CONTENT_TYPE = "text/event-stream"
+
+OVERFLOW_DROP = "drop"
+OVERFLOW_CONFLATE = "conflate"
+
+DEFAULT_CLIENT_QUEUE_SIZE = 64
+DEFAULT_HEARTBEAT = 15.0
+
+
+class BroadcastMessage:
+    """A message encoded once and shared by the queues of all clients"""
+
+    __slots__ = ("payload", "_sse_frame", "_text")
+
+    def __init__(self, payload):
+        self.payload = payload
+        self._sse_frame = None
+        self._text = None
+
+    @property
+    def sse_frame(self):
+        if self._sse_frame is None:
+            self._sse_frame = b"data: " + self.payload + b"\n\n"
+        return self._sse_frame
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = self.payload.decode("utf-8")
+        return self._text
+
+
+class ClientQueue:
+    """The bounded queue of messages pending for one connected client"""
+
+    __slots__ = ("_messages", "_ready", "maxsize", "closed")
+
+    def __init__(self, maxsize):
+        self._messages = deque()
+        self._ready = asyncio.Event()
+        self.maxsize = maxsize
+        self.closed = False
+
+    def __len__(self):
+        return len(self._messages)
+
+    def put(self, message, overflow):
+        """
+        Put the message without waiting, return False if the queue is full
+        and the client should be dropped.
+        """
+
+        messages = self._messages
+        if len(messages) >= self.maxsize:
+            if overflow != OVERFLOW_CONFLATE:
+                return False
+            messages.popleft()  # 只保留最新的消息
+
+        messages.append(message)
+        self._ready.set()
+        return True
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+    async def get_all(self, timeout=None):
+        """
+        Wait for and take all the pending messages. Return an empty list on
+        timeout, or None if the queue is closed.
+        """
+
+        if not self._messages and not self.closed:
+            self._ready.clear()
+            if timeout is None:
+                await self._ready.wait()
+            else:
+                try:
+                    await asyncio.wait_for(self._ready.wait(), timeout)
+                except asyncio.TimeoutError:
+                    return []
+
+        if self.closed:
+            return None
+
+        messages = list(self._messages)
+        self._messages.clear()
+        return messages
+
+
+class TopicBroadcast:
+    """
+    Fan the messages of a reactive topic out to the connected SSE or
+    WebSocket clients.
+
+    The broadcast listens to ``topic_expr`` of the topic with one
+    non-durable listener, so the channel holds one subscription per process
+    however many clients are connected, and none is left on the broker
+    after the process exits. Each message is decoded into ``data_type`` and
+    encoded as JSON once, then put into the bounded queue of every client
+    without waiting. A client whose queue is full is dropped, or with the
+    'conflate' overflow loses its oldest pending messages, so a slow client
+    never holds back the others.
+    """
+
+    __slots__ = ("overflow", "queue_size", "_clients", "dumps",
+                 "published", "dropped", "conflated")
+
+    def __init__(self, topic=None, topic_expr=None, data_type=None, *,
+                 queue_size=DEFAULT_CLIENT_QUEUE_SIZE,
+                 overflow=OVERFLOW_DROP,
+                 dumps=default_json_serializer.dumps):
+        if overflow not in (OVERFLOW_DROP, OVERFLOW_CONFLATE):
+            raise ValueError(f"Unknown overflow '{overflow}', "
+                             f"should be 'drop' or 'conflate'")
+
+        self.overflow = overflow
+        self.queue_size = queue_size
+        self.dumps = dumps
+        self._clients = set()
+
+        self.published = 0
+        self.dropped = 0
+        self.conflated = 0
+
+        if topic is not None:
+            self.listen(topic, topic_expr, data_type)
+
+    def __len__(self):
+        return len(self._clients)
+
+    def listen(self, topic, topic_expr, data_type=None):
+        """Register the listener of the broadcast on the topic"""
+
+        async def _broadcast_listener(message_data):
+            self.publish(message_data)
+
+        if data_type is not None:
+            _broadcast_listener.__annotations__ = {"message_data": data_type}
+
+        # 每个进程都要收到全部消息，用非持久的订阅，进程退出后不留积压
+        group_id = f"{__name__}.{topic.topic_name}.{topic_expr}"
+        topic.listen(topic_expr, group_id=group_id,
+                     durable=False)(_broadcast_listener)
+
+    def stats(self):
+        return {
+            "clients": len(self._clients),
+            "published": self.published,
+            "dropped": self.dropped,
+            "conflated": self.conflated,
+        }
+
+    def publish(self, data):
+        """Put the data into the queues of all the connected clients"""
+
+        message = BroadcastMessage(self.dumps(data))
+        self.published += 1
+
+        overflow = self.overflow
+        slow_clients = None
+        for client in self._clients:
+            if overflow == OVERFLOW_CONFLATE and len(client) >= client.maxsize:
+                self.conflated += 1
+
+            if not client.put(message, overflow):
+                if slow_clients is None:
+                    slow_clients = []
+                slow_clients.append(client)
+
+        if slow_clients:
+            for client in slow_clients:
+                self.unsubscribe(client)
+                client.close()
+                self.dropped += 1
+
+    def subscribe(self):
+        client = ClientQueue(self.queue_size)
+        self._clients.add(client)
+        return client
+
+    def unsubscribe(self, client):
+        self._clients.discard(client)
+
+    def sse_handler(self, *, heartbeat=DEFAULT_HEARTBEAT):
+        """The handler streaming the messages as Server-Sent Events"""
+
+        async def _sse_handler(request):
+            response = web.StreamResponse(headers={
+                "Content-Type": SSE_CONTENT_TYPE,
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no",
+            })
+            await response.prepare(request)
+
+            client = self.subscribe()
+            try:
+                while True:
+                    messages = await client.get_all(heartbeat)
+                    if messages is None:
+                        break  # 过慢的客户端被断开，由浏览器重新连接
+
+                    if messages:
+                        data = b"".join([m.sse_frame for m in messages])
+                    else:
+                        data = b": ping\n\n"
+
+                    # 停止读取的客户端不能一直占用处理器
+                    await asyncio.wait_for(response.write(data), heartbeat)
+
+            except (ConnectionResetError, asyncio.TimeoutError):
+                pass
+            finally:
+                self.unsubscribe(client)
+
+            return response
+
+        return _sse_handler
+
+    def websocket_handler(self, *, heartbeat=DEFAULT_HEARTBEAT):
+        """The handler sending the messages as WebSocket text frames"""
+
+        async def _websocket_handler(request):
+            ws = web.WebSocketResponse(heartbeat=heartbeat)
+            await ws.prepare(request)
+
+            client = self.subscribe()
+
+            async def _read_until_closed():
+                async for msg in ws:
+                    if msg.type == WSMsgType.ERROR:
+                        break
+                client.close()
+
+            reader = asyncio.ensure_future(_read_until_closed())
+            try:
+                while True:
+                    messages = await client.get_all()
+                    if messages is None or ws.closed:
+                        break
+
+                    for message in messages:
+                        await asyncio.wait_for(ws.send_str(message.text),
+                                               heartbeat)
+
+            except (ConnectionResetError, asyncio.TimeoutError):
+                pass
+            finally:
+                self.unsubscribe(client)
+                reader.cancel()
+                await ws.close()
+
+            return ws
+
+        return _websocket_handler
@@ -0,0 +1,256 @@
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from aiohttp import web, hdrs
+from multidict import CIMultiDict
+
+from ..exception import InvalidArgumentError
+from .cache import is_serialized_response
+from .coalesce import copy_response
+from .session import SESSION_COOKIE
+
+IDEMPOTENCY_STORE = "idempotency_store"
+IDEMPOTENCY_SCOPE = "idempotency_scope"
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+DEFAULT_IDEMPOTENCY_TTL = 24 * 3600
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+# 不随响应重放的头部
+UNSTORED_HEADERS = frozenset(h.lower() for h in [
+    hdrs.CONNECTION, hdrs.KEEP_ALIVE, hdrs.PROXY_AUTHENTICATE,
+    hdrs.PROXY_AUTHORIZATION, hdrs.TE, hdrs.TRAILER, hdrs.TRANSFER_ENCODING,
+    hdrs.UPGRADE, hdrs.DATE, hdrs.CONTENT_LENGTH, hdrs.CONTENT_TYPE,
+])
+
+
+class StoredResponse:
+    """The serialized response of an idempotent request"""
+
+    __slots__ = ("status", "body", "content_type", "headers", "fingerprint")
+
+    def __init__(self, status, body, content_type, fingerprint, headers=()):
+        self.status = status
+        self.body = body
+        self.content_type = content_type
+        self.headers = tuple(headers)
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def from_response(cls, response, fingerprint):
+        headers = [(name, value) for name, value in response.headers.items()
+                   if name.lower() not in UNSTORED_HEADERS]
+        for morsel in response.cookies.values():
+            headers.append((hdrs.SET_COOKIE, morsel.OutputString()))
+
+        return cls(response.status, response.body, response.content_type,
+                   fingerprint, headers)
+
+    def make_response(self):
+        headers = CIMultiDict(self.headers)
+        headers[REPLAYED_HEADER] = "true"
+        return web.Response(body=self.body, status=self.status,
+                            content_type=self.content_type,
+                            headers=headers)
+
+
+class MemoryIdempotencyStore:
+    """
+    The bounded LRU of stored responses expiring after ``ttl`` seconds.
+
+    The other backends, like a store shared by the processes, implement the
+    same ``async get(key)`` and ``async put(key, stored)``.
+    """
+
+    __slots__ = ("ttl", "maxsize", "_entries")
+
+    def __init__(self, *, ttl=DEFAULT_IDEMPOTENCY_TTL, maxsize=10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def get(self, key):
+        item = self._entries.get(key)
+        if item is None:
+            return None
+
+        expires_at, stored = item
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+
+        return stored
+
+    async def put(self, key, stored):
+        entries = self._entries
+        entries[key] = (time.monotonic() + self.ttl, stored)
+        entries.move_to_end(key)
+        while len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+
+class Idempotency:
+    """
+    Replay the stored response of a route for the retried requests carrying
+    the same ``Idempotency-Key`` header, instead of executing the handler
+    again. The keys are scoped to the caller, by default identified by the
+    Authorization header and the session cookie.
+
+    The concurrent duplicates wait for the in-flight execution, which runs
+    in its own task so that it is completed even if the first client
+    disconnects. Only the successful serialized responses are stored; the
+    failed requests can be retried. The key reused with a different request
+    body is rejected.
+    """
+
+    __slots__ = ("header", "executions", "replays", "_inflight")
+
+    def __init__(self, *, header=IDEMPOTENCY_HEADER):
+        self.header = header
+
+        self.executions = 0
+        self.replays = 0
+        self._inflight = {}
+
+    def stats(self):
+        return {
+            "inflight": len(self._inflight),
+            "executions": self.executions,
+            "replays": self.replays,
+        }
+
+    def wrap(self, invoke):
+        """Wrap the invoking of handler to replay the stored responses"""
+
+        inflight = self._inflight
+
+        async def _execute(store, key, fingerprint, request, arg_values):
+            response = await invoke(request, arg_values)
+            if is_serialized_response(response) and response.status < 400:
+                await store.put(key, StoredResponse.from_response(
+                    response, fingerprint))
+            return response
+
+        async def _idempotent_invoke(request, arg_values):
+            idempotency_key = request.headers.get(self.header)
+            if not idempotency_key:
+                return await invoke(request, arg_values)
+
+            if len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+                raise InvalidArgumentError(f"The {self.header} is too long")
+
+            scope = get_idempotency_scope(request)(request)
+            key = (f"{scope} {request.method} {request.path} "
+                   f"{idempotency_key}")
+            fingerprint = await request_fingerprint(request)
+
+            item = inflight.get(key)
+            if item is None:
+                store = get_idempotency_store(request)
+                stored = await store.get(key)
+                if stored is not None:
+                    check_fingerprint(self.header, stored.fingerprint,
+                                      fingerprint)
+                    self.replays += 1
+                    return stored.make_response()
+
+                item = inflight.get(key)  # 等待存储期间可能已有请求开始执行
+
+            if item is None:
+                task = asyncio.ensure_future(
+                    _execute(store, key, fingerprint, request, arg_values))
+                inflight[key] = (fingerprint, task)
+                task.add_done_callback(_done_callback(inflight, key))
+                self.executions += 1
+                response = await asyncio.shield(task)
+                if is_serialized_response(response):
+                    # 共享的响应由各请求复制后再压缩等修改
+                    return copy_response(response)
+                return response
+
+            leader_fingerprint, task = item
+            check_fingerprint(self.header, leader_fingerprint, fingerprint)
+            response = await asyncio.shield(task)
+            self.replays += 1
+            if is_serialized_response(response):
+                response = copy_response(response)
+                response.headers[REPLAYED_HEADER] = "true"
+                return response
+
+            # 不能共享的响应，重新执行
+            return await invoke(request, arg_values)
+
+        return _idempotent_invoke
+
+
+def _done_callback(inflight, key):
+
+    def _callback(task):
+        item = inflight.get(key)
+        if item is not None and item[1] is task:
+            del inflight[key]
+
+        if not task.cancelled():
+            task.exception()
+
+    return _callback
+
+
+async def request_fingerprint(request):
+    digest = hashlib.blake2b(request.query_string.encode(), digest_size=16)
+    digest.update(await request.read())
+
+    return digest.hexdigest()
+
+
+def check_fingerprint(header, stored_fingerprint, fingerprint):
+    if stored_fingerprint != fingerprint:
+        raise InvalidArgumentError(f"The {header} has been used by a "
+                                   f"different request")
+
+
+_default_store = MemoryIdempotencyStore()
+
+
+def default_idempotency_scope(request):
+    """The digest of the credentials identifying the caller"""
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(request.headers.get(hdrs.AUTHORIZATION, "").encode())
+    digest.update(b"\0")
+    digest.update(request.cookies.get(SESSION_COOKIE, "").encode())
+
+    return digest.hexdigest()
+
+
+def setup_idempotency_store(app, store=None, *, scope=None, **options):
+    """
+    Store the responses of the idempotent routes of the application in the
+    given store, or a MemoryIdempotencyStore of the options. The ``scope``
+    is the function of request identifying the caller, like the principal
+    of the session, which the stored keys are scoped to.
+    """
+
+    if store is None:
+        store = MemoryIdempotencyStore(**options)
+
+    app[IDEMPOTENCY_STORE] = store
+    if scope is not None:
+        app[IDEMPOTENCY_SCOPE] = scope
+
+
+def get_idempotency_store(request):
+    store = request.app.get(IDEMPOTENCY_STORE)
+    if store is None:
+        return _default_store
+
+    return store
+
+
+def get_idempotency_scope(request):
+    return request.app.get(IDEMPOTENCY_SCOPE, default_idempotency_scope)
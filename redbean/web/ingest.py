@@ -0,0 +1,290 @@
+import re
+import tempfile
+import collections.abc
+from typing import get_origin, get_args
+
+from ..exception import InvalidArgumentError, PayloadTooLargeError
+from ..dobject import IncompliantError
+from ..dobject.cast import cast_object
+from .serializers import request_json_serializer
+from .streaming import NDJSON_CONTENT_TYPE, STREAM_CHUNK_SIZE
+
+MAX_BODY_SIZE_KEY = "redbean_max_body_size"
+
+NDJSON_CONTENT_TYPES = frozenset([
+    NDJSON_CONTENT_TYPE,
+    "application/jsonl",
+    "application/jsonlines",
+])
+
+# 超过该大小后转存到磁盘上的临时文件
+DEFAULT_SPOOL_MEMORY_SIZE = 1024 * 1024
+
+_TOKEN_RE = re.compile(rb'["\[\]{},]')
+_STRING_END_RE = re.compile(rb'["\\]')
+_WHITESPACE = b" \t\r\n"
+
+
+class BodyStream:
+    """
+    The request body read incrementally by the handler with a ``body_stream``
+    argument, instead of being buffered before the handler runs.
+
+    The body is read as the handler consumes it, so a slow consumer holds
+    back the client through the transport's flow control. The bytes beyond
+    the route's ``max_body_size`` are rejected with PayloadTooLargeError.
+    The body can be read only once.
+    """
+
+    __slots__ = ("_request", "max_size", "received", "_consumed")
+
+    def __init__(self, request, max_size=None):
+        self._request = request
+        self.max_size = max_size
+        self.received = 0
+        self._consumed = False
+
+    async def chunks(self, chunk_size=STREAM_CHUNK_SIZE):
+        """Iterate over the chunks of raw bytes of the body"""
+
+        if self._consumed:
+            raise RuntimeError("The request body has been consumed")
+        self._consumed = True
+
+        max_size = self.max_size
+        if max_size is not None:
+            content_length = self._request.content_length
+            if content_length is not None and content_length > max_size:
+                raise_too_large(max_size)
+
+        async for chunk in self._request.content.iter_chunked(chunk_size):
+            self.received += len(chunk)
+            if max_size is not None and self.received > max_size:
+                raise_too_large(max_size)
+            yield chunk
+
+    async def items(self, data_type=None):
+        """
+        Iterate over the items of a JSON array, or the lines of NDJSON if the
+        Content-Type is 'application/x-ndjson', decoded one by one and cast
+        into data_type if given.
+        """
+
+        if self._request.content_type in NDJSON_CONTENT_TYPES:
+            splitter = NDJSONSplitter()
+        else:
+            splitter = JSONArraySplitter()
+
+        loads = request_json_serializer(self._request).loads
+        index = 0
+        try:
+            async for chunk in self.chunks():
+                for data in splitter.feed(chunk):
+                    yield decode_item(loads, data, data_type, index)
+                    index += 1
+
+            for data in splitter.finish():
+                yield decode_item(loads, data, data_type, index)
+                index += 1
+
+        except ValueError as exc:
+            raise InvalidArgumentError(
+                f"Malformed request body: {exc}") from exc
+
+    async def spool(self, max_memory_size=DEFAULT_SPOOL_MEMORY_SIZE):
+        """
+        Read the whole body into a temporary file, kept in memory until it
+        exceeds max_memory_size, and return the file rewound.
+        """
+
+        spooled = tempfile.SpooledTemporaryFile(max_size=max_memory_size)
+        try:
+            async for chunk in self.chunks():
+                spooled.write(chunk)  # 写入系统页缓存，不等待落盘
+        except BaseException:
+            spooled.close()
+            raise
+
+        spooled.seek(0)
+        return spooled
+
+
+def raise_too_large(max_size):
+    raise PayloadTooLargeError(f"The request body is larger than "
+                               f"{max_size} bytes")
+
+
+def decode_item(loads, data, data_type, index):
+    try:
+        payload = loads(data)
+        if data_type is None:
+            return payload
+        return cast_object(None, payload, data_type)
+
+    except (ValueError, TypeError, IncompliantError) as exc:
+        raise InvalidArgumentError(
+            f"Malformed item {index} of request body: {exc}") from exc
+
+
+class JSONArraySplitter:
+    """
+    Split a JSON array fed in chunks into the bytes of its items.
+
+    Only the structure of the array is scanned, by searching the brackets,
+    commas and quotes, and each item is decoded by the JSON serializer.
+    """
+
+    __slots__ = ("_buffer", "_pos", "_start", "_depth", "_in_string",
+                 "_started", "_finished")
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._pos = 0
+        self._start = 0
+        self._depth = 0
+        self._in_string = False
+        self._started = False
+        self._finished = False
+
+    def feed(self, data):
+        buffer = self._buffer
+        buffer += data
+
+        items = []
+        pos = self._pos
+        while True:
+            if self._finished:
+                if buffer[pos:].strip(_WHITESPACE):
+                    raise ValueError("Extra data after the JSON array")
+                pos = len(buffer)
+                break
+
+            if self._in_string:
+                matched = _STRING_END_RE.search(buffer, pos)
+                if matched is None:
+                    pos = len(buffer)
+                    break
+
+                end = matched.start()
+                if buffer[end] == 0x5c:  # 转义字符
+                    if end + 1 >= len(buffer):
+                        pos = end
+                        break
+                    pos = end + 2
+                    continue
+
+                self._in_string = False
+                pos = end + 1
+                continue
+
+            matched = _TOKEN_RE.search(buffer, pos)
+            if matched is None:
+                pos = len(buffer)
+                break
+
+            end = matched.start()
+            token = buffer[end]
+            pos = end + 1
+            if token == 0x22:  # "
+                self._in_string = True
+
+            elif token == 0x5b or token == 0x7b:  # [ {
+                if not self._started:
+                    if token != 0x5b or buffer[:end].strip(_WHITESPACE):
+                        raise ValueError("The body should be a JSON array")
+                    self._started = True
+                    self._start = pos
+                self._depth += 1
+
+            elif token == 0x5d or token == 0x7d:  # ] }
+                self._depth -= 1
+                if self._depth < 0:
+                    raise ValueError("Unbalanced brackets")
+                if self._depth == 0:
+                    item = bytes(buffer[self._start:end]).strip(_WHITESPACE)
+                    if item:
+                        items.append(item)
+                    self._finished = True
+
+            elif token == 0x2c and self._depth == 1:  # ,
+                item = bytes(buffer[self._start:end]).strip(_WHITESPACE)
+                if not item:
+                    raise ValueError("Empty item in the JSON array")
+                items.append(item)
+                self._start = pos
+
+        # 丢弃已经切分出去的数据
+        consumed = min(self._start, pos) if self._started else 0
+        if consumed:
+            del buffer[:consumed]
+            self._start -= consumed
+            pos -= consumed
+        self._pos = pos
+
+        return items
+
+    def finish(self):
+        if not self._finished:
+            raise ValueError("Incomplete JSON array")
+        return []
+
+
+class NDJSONSplitter:
+    """Split the NDJSON fed in chunks into the bytes of its lines"""
+
+    __slots__ = ("_buffer",)
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        buffer = self._buffer
+        buffer += data
+
+        end = buffer.rfind(b"\n")
+        if end < 0:
+            return []
+
+        lines = bytes(buffer[:end]).split(b"\n")
+        del buffer[:end + 1]
+        return [line for line in lines if line.strip(_WHITESPACE)]
+
+    def finish(self):
+        line = bytes(self._buffer).strip(_WHITESPACE)
+        self._buffer.clear()
+        return [line] if line else []
+
+
+def check_content_length(request, max_size):
+    """Reject the body declared larger than max_size before reading it"""
+
+    content_length = request.content_length
+    if content_length is not None and content_length > max_size:
+        raise_too_large(max_size)
+
+
+async def check_body_size(request, max_size):
+    """
+    Reject the buffered body larger than max_size, whose Content-Length may
+    be absent like a chunked upload.
+    """
+
+    if len(await request.read()) > max_size:
+        raise_too_large(max_size)
+
+
+def get_body_stream(request):
+    return BodyStream(request, request.get(MAX_BODY_SIZE_KEY))
+
+
+def body_item_type(annotation):
+    """The item type of ``AsyncIterator[Item]`` or ``AsyncIterable[Item]``"""
+
+    if get_origin(annotation) in (collections.abc.AsyncIterator,
+                                  collections.abc.AsyncIterable):
+        args = get_args(annotation)
+        if args:
+            return args[0]
+
+    return None
+
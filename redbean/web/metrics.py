@@ -0,0 +1,169 @@
+import time
+import functools
+from bisect import bisect_left
+from aiohttp import web
+from .executors import iter_executors
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                           1.0, 2.5, 5.0, 10.0)
+
+# 以状态码的百位数为下标，0 表示被取消或中断的请求
+_STATUS_CLASSES = ("aborted", "1xx", "2xx", "3xx", "4xx", "5xx")
+
+
+class RouteMetrics:
+    """
+    The request counts by status class, the in-flight gauge and the latency
+    histogram of one route.
+
+    The bucket arrays are preallocated and only updated in the event loop
+    thread, so recording is a bisect and a few integer increments.
+    """
+
+    __slots__ = ("method", "path", "bounds", "in_flight", "status_counts",
+                 "bucket_counts", "latency_sum")
+
+    def __init__(self, method, path, *, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.method = method
+        self.path = path
+        self.bounds = tuple(sorted(buckets))
+
+        self.in_flight = 0
+        self.status_counts = [0] * len(_STATUS_CLASSES)
+        self.bucket_counts = [0] * (len(self.bounds) + 1)  # 最后一个为+Inf
+        self.latency_sum = 0.0
+
+    @property
+    def count(self):
+        return sum(self.bucket_counts)
+
+    def observe(self, elapsed, status):
+        self.bucket_counts[bisect_left(self.bounds, elapsed)] += 1
+        self.latency_sum += elapsed
+
+        status_class = status // 100
+        if 0 < status_class < len(_STATUS_CLASSES):
+            self.status_counts[status_class] += 1
+        else:
+            self.status_counts[0] += 1
+
+    def wrap(self, handler):
+        """Wrap the request handler to record its metrics"""
+
+        async def _measured_handler(request):
+            self.in_flight += 1
+            status = 0
+            started = time.perf_counter()
+            try:
+                response = await handler(request)
+                status = response.status
+                return response
+            except web.HTTPException as exc:
+                status = exc.status
+                raise
+            finally:
+                self.in_flight -= 1
+                self.observe(time.perf_counter() - started, status)
+
+        functools.update_wrapper(_measured_handler, handler)
+        _measured_handler.route_metrics = self
+        return _measured_handler
+
+
+def iter_route_metrics(app):
+    seen = set()
+    for route in app.router.routes():
+        metrics = getattr(route.handler, "route_metrics", None)
+        if metrics is not None and id(metrics) not in seen:
+            seen.add(id(metrics))
+            yield metrics
+
+
+def format_prometheus_metrics(route_metrics):
+    """Format the route metrics in the Prometheus text exposition format"""
+
+    requests = [
+        "# HELP redbean_http_requests_total "
+        "The count of requests by status class.",
+        "# TYPE redbean_http_requests_total counter",
+    ]
+    in_flight = [
+        "# HELP redbean_http_requests_in_flight "
+        "The count of requests in handling.",
+        "# TYPE redbean_http_requests_in_flight gauge",
+    ]
+    latency = [
+        "# HELP redbean_http_request_duration_seconds "
+        "The latency of requests.",
+        "# TYPE redbean_http_request_duration_seconds histogram",
+    ]
+
+    for metrics in route_metrics:
+        labels = (f'method="{_escape(metrics.method)}",'
+                  f'route="{_escape(metrics.path)}"')
+
+        for status_class, count in zip(_STATUS_CLASSES,
+                                       metrics.status_counts):
+            if count:
+                requests.append(f'redbean_http_requests_total'
+                                f'{{{labels},status="{status_class}"}} {count}')
+
+        in_flight.append(f"redbean_http_requests_in_flight"
+                         f"{{{labels}}} {metrics.in_flight}")
+
+        cumulative = 0
+        bucket_counts = metrics.bucket_counts
+        for bound, count in zip(metrics.bounds, bucket_counts):
+            cumulative += count
+            latency.append(f'redbean_http_request_duration_seconds_bucket'
+                           f'{{{labels},le="{bound}"}} {cumulative}')
+        cumulative += bucket_counts[-1]
+        latency.append(f'redbean_http_request_duration_seconds_bucket'
+                       f'{{{labels},le="+Inf"}} {cumulative}')
+        latency.append(f'redbean_http_request_duration_seconds_sum'
+                       f'{{{labels}}} {metrics.latency_sum}')
+        latency.append(f'redbean_http_request_duration_seconds_count'
+                       f'{{{labels}}} {cumulative}')
+
+    return "\n".join(requests + in_flight + latency) + "\n"
+
+
+def _escape(value):
+    return (value.replace("\\", "\\\\")
+                 .replace('"', '\\"')
+                 .replace("\n", "\\n"))
+
+
+def format_executor_metrics(executors):
+    executors = list(executors)
+    lines = [
+        "# HELP redbean_executor_pending "
+        "The count of calls waiting or running in the pool.",
+        "# TYPE redbean_executor_pending gauge",
+    ]
+    for managed in executors:
+        lines.append(f'redbean_executor_pending{{executor="{managed.kind}"}} '
+                     f'{managed.pending}')
+
+    for name in ("submitted", "succeeded", "failed", "rejected"):
+        lines.append(f"# TYPE redbean_executor_{name}_total counter")
+        for managed in executors:
+            lines.append(f'redbean_executor_{name}_total'
+                         f'{{executor="{managed.kind}"}} '
+                         f'{getattr(managed, name)}')
+
+    return "\n".join(lines) + "\n"
+
+
+def setup_metrics(app, path="/metrics"):
+    """Expose the metrics of the REST routes in the Prometheus text format"""
+
+    async def _metrics_handler(request):
+        text = (format_prometheus_metrics(iter_route_metrics(request.app)) +
+                format_executor_metrics(iter_executors()))
+        return web.Response(body=text.encode("utf-8"), headers={
+            "Content-Type": PROMETHEUS_CONTENT_TYPE})
+
+    app.router.add_get(path, _metrics_handler)
@@ -1,7 +1,36 @@
+import os
+import re
+import copy
+import asyncio
+import hashlib
+import logging
+import mimetypes
 from yarl import URL
 from pathlib import Path
-from aiohttp.web import FileResponse
+from collections import OrderedDict
+from aiohttp import hdrs
+from aiohttp.web import Response, FileResponse
 from aiohttp.web import HTTPForbidden, HTTPNotFound
+from watchgod import awatch
+
+from .cache import etag_matches
+from .compression import negotiate_encoding
+
+redbean_logger = logging.getLogger("redbean")
+
+# 预压缩的旁路文件，按服务端偏好的顺序
+PRECOMPRESSED_SUFFIXES = {
+    "br": ".br",
+    "gzip": ".gz",
+}
+
+# 带内容哈希的文件名，如 app.3f2a9b1c.js 或 app-3f2a9b1c.js，第一组为哈希
+FINGERPRINT_PATTERN = re.compile(r"[.-]([0-9a-f]{8,})\.[^.]+$")
+
+# 清单生成的带哈希URL所用的哈希长度
+HASHED_NAME_LENGTH = 12
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
 
 
 def redirect_not_found(app, path=None, prefix=None):
@@ -14,11 +43,429 @@ def redirect_not_found(app, path=None, prefix=None):
     resource.add_route('HEAD', _redirect_not_found_handler)
 
 
+class StaticFile:
+    """
+    The metadata of a static file and its precompressed sidecars.
+
+    ``variants`` maps the content encoding, None for identity, to
+    ``(filepath, etag, body)``, where body is None if the file is too
+    large to be kept in memory. The ``signature`` is of the file and all
+    its possible sidecars, see ``file_signature``. The immutable files are
+    fingerprinted by their content and can be cached by clients indefinitely.
+    """
+
+    __slots__ = ("filepath", "signature", "content_type", "last_modified",
+                 "variants", "nbytes", "content_hash", "immutable")
+
+    def __init__(self, filepath, signature, last_modified, content_type,
+                 variants, *, content_hash=None, immutable=False):
+        self.filepath = filepath
+        self.signature = signature
+        self.content_type = content_type
+        self.last_modified = last_modified
+        self.variants = variants
+        self.nbytes = sum(len(body) for _, _, body in variants.values()
+                          if body is not None)
+        self.content_hash = content_hash
+        self.immutable = immutable
+
+    def is_modified(self):
+        return file_signature(self.filepath) != self.signature
+
+    def make_response(self, request, chunk_size):
+        encoding = None
+        if len(self.variants) > 1:
+            encoding = negotiate_encoding(request, [
+                e for e in PRECOMPRESSED_SUFFIXES if e in self.variants])
+
+        filepath, etag, body = self.variants[encoding]
+
+        headers = {hdrs.CONTENT_TYPE: self.content_type}
+        if len(self.variants) > 1:
+            headers[hdrs.VARY] = hdrs.ACCEPT_ENCODING
+        if encoding is not None:
+            headers[hdrs.CONTENT_ENCODING] = encoding
+        if self.immutable:
+            headers[hdrs.CACHE_CONTROL] = IMMUTABLE_CACHE_CONTROL
+
+        if body is None and self.content_hash is None:
+            # 大文件仍由FileResponse以sendfile发送，并处理条件及范围请求
+            return FileResponse(filepath, chunk_size=chunk_size,
+                                headers=headers)
+
+        headers[hdrs.ETAG] = etag
+        if_match = request.headers.get(hdrs.IF_MATCH)
+        if if_match is not None and not etag_matches(if_match, etag):
+            return Response(status=412)
+
+        if_none_match = request.headers.get(hdrs.IF_NONE_MATCH)
+        if if_none_match is not None:
+            not_modified = etag_matches(if_none_match, etag)
+        else:
+            modified_since = request.if_modified_since
+            not_modified = (modified_since is not None and
+                            self.last_modified <= modified_since.timestamp())
+
+        if not_modified:
+            headers.pop(hdrs.CONTENT_TYPE)
+            headers.pop(hdrs.CONTENT_ENCODING, None)
+            response = Response(status=304, headers=headers)
+        elif body is None:
+            return ContentHashFileResponse(filepath, etag,
+                                           chunk_size=chunk_size,
+                                           headers=headers)
+        else:
+            response = Response(body=body, headers=headers)
+
+        response.last_modified = self.last_modified
+        return response
+
+
+class ContentHashFileResponse(FileResponse):
+    """
+    The FileResponse of a large file with its content hash as ETag.
+
+    The conditional requests on ETag are evaluated by StaticFile, the range
+    request is only served if its If-Range matches the content hash.
+    """
+
+    def __init__(self, path, etag, **kwargs):
+        super().__init__(path, **kwargs)
+        self._content_etag = etag
+
+    def _keep_content_etag(self, value):
+        pass  # 忽略FileResponse按mtime生成的ETag
+
+    etag = property(FileResponse.etag.fget, _keep_content_etag)
+
+    async def prepare(self, request):
+        headers = request.headers.copy()
+        for name in (hdrs.IF_MATCH, hdrs.IF_NONE_MATCH,
+                     hdrs.IF_MODIFIED_SINCE):
+            headers.popall(name, None)
+
+        if_range = headers.get(hdrs.IF_RANGE, "")
+        if if_range.startswith(('"', 'W/')):
+            headers.popall(hdrs.IF_RANGE)
+            if not etag_matches(if_range, self._content_etag):
+                headers.popall(hdrs.RANGE, None)
+
+        return await super().prepare(request.clone(headers=headers))
+
+
+class StaticFileCache:
+    """
+    The bounded LRU of the static files by their URL paths.
+
+    A hit stats the file and its sidecars to check that they are not
+    modified, instead of resolving the path again. The files no larger than
+    ``max_file_size`` are kept in memory with their precompressed ``.br`` and
+    ``.gz`` sidecars, at most ``max_bytes`` of them in total.
+    """
+
+    __slots__ = ("maxsize", "max_file_size", "max_bytes", "nbytes",
+                 "_entries")
+
+    def __init__(self, *, maxsize=256, max_file_size=256 * 1024,
+                 max_bytes=16 * 1024 * 1024):
+        self.maxsize = maxsize
+        self.max_file_size = max_file_size
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, filename):
+        static_file = self._entries.get(filename)
+        if static_file is None:
+            return None
+
+        if static_file.is_modified():
+            del self._entries[filename]
+            self.nbytes -= static_file.nbytes
+            return None
+
+        self._entries.move_to_end(filename)
+        return static_file
+
+    async def load(self, filename, filepath):
+        loop = asyncio.get_running_loop()
+        static_file = await loop.run_in_executor(None, self.load_file,
+                                                 filepath)
+
+        entries = self._entries
+        replaced = entries.pop(filename, None)
+        if replaced is not None:
+            self.nbytes -= replaced.nbytes
+
+        entries[filename] = static_file
+        self.nbytes += static_file.nbytes
+        while len(entries) > self.maxsize or self.nbytes > self.max_bytes:
+            _, evicted = entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+        return static_file
+
+    def load_file(self, filepath, *, hashed=False, max_bytes=None):
+        """
+        Load the file and its sidecars, whose bodies kept in memory are at
+        most ``max_bytes`` in total if given.
+        """
+
+        stat = filepath.stat()
+        signature = [(stat.st_mtime_ns, stat.st_size)]
+        body = self.read_body(filepath, stat, max_bytes)
+
+        content_hash = None
+        if hashed:
+            # 已读入内存的文件不必再读一次
+            content_hash = (bytes_hash(body) if body is not None
+                            else file_hash(filepath))
+
+        variants = {None: (filepath, make_etag(stat, content_hash), body)}
+        if max_bytes is not None and body is not None:
+            max_bytes -= len(body)
+
+        for encoding, suffix in PRECOMPRESSED_SUFFIXES.items():
+            sidecar = filepath.with_name(filepath.name + suffix)
+            try:
+                sidecar_stat = sidecar.stat()
+            except OSError:
+                signature.append(None)
+                continue
+
+            signature.append((sidecar_stat.st_mtime_ns, sidecar_stat.st_size))
+            # 过期的旁路文件不再使用
+            if sidecar_stat.st_mtime_ns >= stat.st_mtime_ns:
+                variant_hash = (content_hash + "-" + encoding
+                                if hashed else None)
+                sidecar_body = self.read_body(sidecar, sidecar_stat,
+                                              max_bytes)
+                if max_bytes is not None and sidecar_body is not None:
+                    max_bytes -= len(sidecar_body)
+
+                variants[encoding] = (sidecar,
+                                      make_etag(sidecar_stat, variant_hash),
+                                      sidecar_body)
+
+        content_type, _ = mimetypes.guess_type(filepath.name)
+        if not content_type:
+            content_type = "application/octet-stream"
+
+        return StaticFile(filepath, tuple(signature), stat.st_mtime,
+                          content_type, variants, content_hash=content_hash)
+
+    def read_body(self, filepath, stat, max_bytes=None):
+        if stat.st_size > self.max_file_size or \
+                (max_bytes is not None and stat.st_size > max_bytes):
+            return None
+
+        return filepath.read_bytes()
+
+
+def make_etag(stat, content_hash=None):
+    if content_hash is not None:
+        return f'"{content_hash}"'
+
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def file_signature(filepath):
+    """The mtimes and sizes of the file and its sidecars, None if missing"""
+
+    signature = []
+    for suffix in ("",) + tuple(PRECOMPRESSED_SUFFIXES.values()):
+        try:
+            stat = os.stat(filepath.with_name(filepath.name + suffix))
+        except OSError:
+            signature.append(None)
+        else:
+            signature.append((stat.st_mtime_ns, stat.st_size))
+
+    return tuple(signature)
+
+
+def bytes_hash(body):
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def file_hash(filepath, chunk_size=256 * 1024):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filepath, "rb") as f:
+        chunk = f.read(chunk_size)
+        while chunk:
+            digest.update(chunk)
+            chunk = f.read(chunk_size)
+
+    return digest.hexdigest()
+
+
+class StaticManifest:
+    """
+    The static files scanned once from the directory, by their URL paths.
+
+    A lookup is a dict hit without resolving the path or stat-ing the file:
+    the files outside the directory are excluded while scanning, and the
+    manifest is only rebuilt on reload.
+
+    Each file is also served as immutable under its hashed URL from
+    ``url_for``, like ``app.<hash>.js``. A file is served as immutable under
+    its own name only if the hex matched by ``immutable_pattern`` in its name
+    is a prefix of its content hash, not merely a date or a serial number.
+
+    The bodies kept in memory are at most ``max_bytes`` in total, the others
+    are sent from the files. The files are hashed in chunks, and only again
+    on reload if they are modified.
+    """
+
+    __slots__ = ("directory", "loader", "prefix", "immutable_pattern",
+                 "max_bytes", "nbytes", "files", "hashed_files",
+                 "hashed_names")
+
+    def __init__(self, directory, loader, *, prefix="/",
+                 immutable_pattern=FINGERPRINT_PATTERN,
+                 max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.loader = loader
+        self.prefix = prefix
+        self.immutable_pattern = immutable_pattern
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.files = {}
+        self.hashed_files = {}
+        self.hashed_names = {}
+
+    def __len__(self):
+        return len(self.files)
+
+    def get(self, filename):
+        if filename[:1] == '/':
+            filename = filename[1:]
+
+        static_file = self.files.get(filename)
+        if static_file is None:
+            static_file = self.hashed_files.get(filename)
+
+        return static_file
+
+    def url_for(self, filename):
+        """The URL of the file with its content hash, to be cached forever"""
+
+        if filename[:1] == '/':
+            filename = filename[1:]
+
+        return self.prefix + self.hashed_names.get(filename, filename)
+
+    def build(self):
+        directory = self.directory
+        files = {}
+        nbytes = 0
+        for filepath in directory.rglob("*"):
+            if not filepath.is_file() or is_sidecar(filepath):
+                continue
+
+            try:
+                filepath.resolve().relative_to(directory)
+            except ValueError:
+                continue  # 链接到目录以外的文件
+
+            filename = filepath.relative_to(directory).as_posix()
+            static_file = self.files.get(filename)
+            if static_file is None or \
+                    static_file.nbytes > self.max_bytes - nbytes or \
+                    static_file.is_modified():
+                static_file = self.loader.load_file(
+                    filepath, hashed=True, max_bytes=self.max_bytes - nbytes)
+
+            static_file.immutable = self.is_fingerprinted(
+                filepath.name, static_file.content_hash)
+
+            files[filename] = static_file
+            nbytes += static_file.nbytes
+
+        hashed_files = {}
+        hashed_names = {}
+        for filename, static_file in files.items():
+            hashed_name = make_hashed_name(filename, static_file.content_hash)
+            if hashed_name in files:
+                continue
+
+            hashed_file = copy.copy(static_file)
+            hashed_file.immutable = True
+            hashed_files[hashed_name] = hashed_file
+            hashed_names[filename] = hashed_name
+
+        self.files = files
+        self.hashed_files = hashed_files
+        self.hashed_names = hashed_names
+        self.nbytes = nbytes
+        return self
+
+    def is_fingerprinted(self, name, content_hash):
+        if self.immutable_pattern is None:
+            return False
+
+        matched = self.immutable_pattern.search(name)
+        return matched is not None and \
+            content_hash.startswith(matched.group(1))
+
+    async def watch(self):
+        """Rebuild the manifest on the changes of directory"""
+
+        loop = asyncio.get_running_loop()
+        async for _ in awatch(self.directory):
+            await loop.run_in_executor(None, self.build)
+            redbean_logger.info("Reloaded %d static files in '%s'",
+                                len(self.files), self.directory)
+
+
+def make_hashed_name(filename, content_hash):
+    """Insert the content hash before the extension, as app.<hash>.js"""
+
+    directory, _, name = filename.rpartition("/")
+    stem, dot, ext = name.rpartition(".")
+    if not stem:
+        stem, dot, ext = name, "", ""  # 没有扩展名或以点开头的文件名
+
+    name = stem + "." + content_hash[:HASHED_NAME_LENGTH] + dot + ext
+    return directory + "/" + name if directory else name
+
+
+def is_sidecar(filepath):
+    for suffix in PRECOMPRESSED_SUFFIXES.values():
+        if filepath.name.endswith(suffix) and \
+                filepath.with_name(filepath.name[:-len(suffix)]).is_file():
+            return True
+
+    return False
+
+
 def webapp_static_reources(app, prefix, directory, *,
                            index_file='index.html',
-                           chunk_size: int = 256 * 1024):
+                           chunk_size: int = 256 * 1024,
+                           cache_size: int = 256,
+                           max_cached_file_size: int = 256 * 1024,
+                           max_cached_bytes: int = 16 * 1024 * 1024,
+                           manifest: bool = False,
+                           max_manifest_bytes: int = 64 * 1024 * 1024,
+                           reload: bool = False,
+                           immutable_pattern=FINGERPRINT_PATTERN):
+    """
+    Serve the static files of a single page application under the prefix.
+
+    The files are cached by their URL paths when they are requested. If
+    ``manifest`` is true, the directory is instead scanned once at startup,
+    and rescanned on its changes if ``reload`` is also true in development.
+    The StaticManifest is returned then, whose ``url_for`` gives the hashed
+    URLs of the files.
+    """
 
     directory = directory.resolve()
+    file_cache = StaticFileCache(maxsize=cache_size,
+                                 max_file_size=max_cached_file_size,
+                                 max_bytes=max_cached_bytes)
 
     def get_filepath(filename, request):
         if filename[0] == '/':
@@ -40,24 +487,61 @@ def webapp_static_reources(app, prefix, directory, *,
             request.app.logger.exception(error)
             raise HTTPNotFound() from error
 
-    async def _handler(request):
-        filepath = request.match_info['path']
-        if filepath:
-            filepath = URL.build(path=filepath, encoded=True).path
-            filepath = get_filepath(filepath, request)
-        else:
-            filepath = get_filepath(index_file, request)
+    async def get_cached_file(filename, request):
+        static_file = file_cache.get(filename)
+        if static_file is not None:
+            return static_file
 
+        filepath = get_filepath(filename, request)
         if filepath.is_dir():
             raise HTTPForbidden()
         elif not filepath.is_file():
-            filepath = get_filepath(index_file, request)
-            if not filepath.is_file():
+            return None
+
+        return await file_cache.load(filename, filepath)
+
+    if manifest:
+        static_manifest = StaticManifest(directory, file_cache, prefix=prefix,
+                                         immutable_pattern=immutable_pattern,
+                                         max_bytes=max_manifest_bytes)
+
+        async def get_static_file(filename, request):
+            return static_manifest.get(filename)
+
+        async def _build_manifest(app):
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, static_manifest.build)
+            if reload:
+                watcher = asyncio.ensure_future(static_manifest.watch())
+
+                async def _stop_watching(app):
+                    watcher.cancel()
+
+                app.on_cleanup.append(_stop_watching)
+
+        app.on_startup.append(_build_manifest)
+    else:
+        get_static_file = get_cached_file
+
+    async def _handler(request):
+        filename = request.match_info['path']
+        if filename:
+            filename = URL.build(path=filename, encoded=True).path
+        else:
+            filename = index_file
+
+        static_file = await get_static_file(filename, request)
+        if static_file is None:
+            # 单页应用的前端路由，以索引文件响应
+            static_file = await get_static_file(index_file, request)
+            if static_file is None:
                 raise HTTPNotFound()
 
-        return FileResponse(filepath, chunk_size=chunk_size)
+        return static_file.make_response(request, chunk_size)
 
     path = prefix + '{path:.*}'
     resource = app.router.add_resource(path)
     resource.add_route('GET', _handler)
     resource.add_route('HEAD', _handler)
+
+    return static_manifest if manifest else None
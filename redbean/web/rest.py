@@ -1,108 +1,556 @@
 from ..exception import BusinessRuleFailedError
 from ..exception import NotFoundError, UnauthorizedError, ForbidenError
+from ..exception import InvalidArgumentError, DeadlineExceededError
+from ..exception import OverloadedError, PayloadTooLargeError
+from ..dobject import IncompliantError
+from ..dobject.cast import cast_object, cast_native_object
 from .session import get_http_session
+from .streaming import is_async_iterable, stream_json_response
+from .streaming import StreamAbortedError
+from .serializers import negotiate_body_serializer
+from .serializers import negotiate_response_serializer
+from .cache import ResponseCache
+from .coalesce import SingleFlight
+from .errors import get_error_reporter
+from .deadline import DeadlinePolicy, get_deadline
+from .admission import ConcurrencyLimiter, PRIORITY_NORMAL
+from .executors import get_executor, check_executor_arguments
+from .executors import EXECUTOR_THREAD
+from .compression import get_compression_policy
+from .idempotency import Idempotency
+from .ingest import get_body_stream, body_item_type, check_content_length
+from .ingest import check_body_size
+from .ingest import MAX_BODY_SIZE_KEY
+import re
 import traceback
-from sqlblock.utils import json_dumps, json_loads
+from sqlblock.utils import json_dumps
 import logging
 import inspect
 import functools
-from os import stat
+from enum import Enum
+from decimal import Decimal
+from datetime import date, datetime
+from typing import Union, get_args, get_origin
+from dataclasses import is_dataclass, MISSING
 from aiohttp import web
 
 redbean_logger = logging.getLogger("redbean")
 
+DEFAULT_CACHE_SIZE = 1024
 
-def cast_value(arg_spec, raw_value):
-    if arg_spec.annotation == str and raw_value is not None:
-        return raw_value
-    elif arg_spec.annotation == int and raw_value is not None:
-        return int(raw_value)
-    else:
-        # if arg_spec.annotation != arg_spec._empty():
-        #     arg_values[arg_name] = arg_spec.annotation(arg_val)
-        # else:
-        return raw_value
+
+def build_value_caster(annotation):
+    """
+    Build the caster of the raw string values of a path or query argument
+    from its annotation, with the semantics of cast_native_object.
+
+    Return ``(caster, repeated)``, where caster is None if the raw string is
+    passed as it is, and repeated is true for the list of repeated query
+    keys like ``List[int]``.
+    """
+
+    origin = get_origin(annotation)
+    if origin is Union:  # Optional[int]
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return build_value_caster(args[0])
+        return None, False
+
+    if isinstance(origin, type) and issubclass(origin, (list, tuple, set)):
+        args = get_args(annotation)
+        caster, _ = build_value_caster(args[0] if args else str)
+        return caster, True
+
+    if annotation in (list, tuple, set):
+        return None, True
+
+    if not isinstance(annotation, type) or issubclass(annotation, str):
+        return None, False
+
+    if annotation in (int, float, Decimal):
+        return annotation, False
+
+    if issubclass(annotation, Enum):
+        members = {str(member.value): member for member in annotation}
+
+        def _cast_enum(raw_value):
+            member = members.get(raw_value)
+            if member is None:
+                raise ValueError(f"'{raw_value}' is not a valid "
+                                 f"{annotation.__name__}")
+            return member
+
+        return _cast_enum, False
+
+    if issubclass(annotation, (bool, int, float, Decimal, date)):
+        def _cast_native(raw_value):
+            return cast_native_object(None, raw_value, annotation)
+
+        return _cast_native, False
+
+    return None, False
 
 
 def _default_arg_getter(arg_name, arg_spec):
+    caster, repeated = build_value_caster(arg_spec.annotation)
+    if arg_spec.default is arg_spec.empty:
+        default = None
+    else:
+        default = arg_spec.default
 
-    async def _getter(request):
-        if arg_name in request.match_info:
-            arg_val = request.match_info.get(arg_name, None)
-        elif arg_name in request.query:
-            arg_val = request.query.get(arg_name, None)
-        else:
-            return None
+    def _cast(raw_value):
+        try:
+            return caster(raw_value)
+        except (ValueError, TypeError, ArithmeticError,
+                IncompliantError) as exc:
+            raise InvalidArgumentError(
+                f"Invalid value of argument '{arg_name}': {raw_value!r}"
+            ) from exc
+
+    if repeated:
+        def _getter(request):
+            raw_values = request.query.getall(arg_name, None)
+            if raw_values is None:
+                return default
+
+            if caster is None:
+                return raw_values
+
+            return [_cast(raw_value) for raw_value in raw_values if raw_value]
+
+        return _getter
+
+    def _getter(request):
+        arg_val = request.match_info.get(arg_name)
+        if arg_val is None:
+            arg_val = request.query.get(arg_name)
+            if arg_val is None:
+                return default
 
-        return cast_value(arg_spec, arg_val)
+        if caster is None:
+            return arg_val
+
+        if not arg_val:
+            return default  # 空的查询参数视为缺失
+
+        return _cast(arg_val)
 
     return _getter
 
 
+# 路径参数的类型约束，路由直接拒绝格式错误的参数
+_PATH_PARAM_RE = re.compile(r"\{([_a-zA-Z][_a-zA-Z0-9]*)\}")
+
+
+def path_param_pattern(annotation):
+    """The route regex of a path argument of annotation, or None"""
+
+    origin = get_origin(annotation)
+    if origin is Union:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            return path_param_pattern(args[0])
+        return None
+
+    if not isinstance(annotation, type):
+        return None
+
+    if issubclass(annotation, Enum):
+        values = [str(member.value) for member in annotation]
+        return "(?:" + "|".join(re.escape(value) for value in values) + ")"
+
+    if issubclass(annotation, bool):
+        return None
+
+    if issubclass(annotation, int):
+        return r"-?\d+"
+
+    if issubclass(annotation, (float, Decimal)):
+        return r"-?\d+(?:\.\d+)?"
+
+    if issubclass(annotation, datetime):
+        return None
+
+    if issubclass(annotation, date):
+        return r"\d{4}-\d{2}-\d{2}"
+
+    return None
+
+
+def typed_route_path(path, target_func):
+    """
+    Constrain the ``{name}`` parameters of the route path by the annotations
+    of the handler's arguments, like ``{item_id:-?\\d+}`` for ``int``.
+    """
+
+    parameters = inspect.signature(target_func).parameters
+
+    def _constrain(matched):
+        arg_spec = parameters.get(matched.group(1))
+        if arg_spec is None:
+            return matched.group(0)
+
+        pattern = path_param_pattern(arg_spec.annotation)
+        if pattern is None:
+            return matched.group(0)
+
+        return "{" + matched.group(1) + ":" + pattern + "}"
+
+    return _PATH_PARAM_RE.sub(_constrain, path)
+
+
 def _json_request_getter(arg_name, arg_spec):
     async def _getter(request):
-        json_text = await request.text()
-        if len(json_text) > 0:
-            return json_loads(json_text)
+        data = await request.read()
+        if len(data) > 0:
+            return negotiate_body_serializer(request).loads(data)
 
     return _getter
 
 
-def build_argument_getters(arguments):
-    setters = []
-    for arg_name, arg_spec in arguments.items():
-        if arg_name == 'user_session' or arg_name == 'session':
-            async def _setter(request):
-                return await get_http_session(request)
+def _typed_body_getter(arg_name, arg_spec):
+    data_type = arg_spec.annotation
+    if arg_spec.default is not arg_spec.empty:
+        empty_value = arg_spec.default
+    elif get_origin(data_type) is Union and type(None) in get_args(data_type):
+        empty_value = None
+    else:
+        empty_value = MISSING  # 必须提供请求体
+
+    async def _getter(request):
+        data = await request.read()
+        if len(data) == 0:
+            if empty_value is MISSING:
+                raise InvalidArgumentError(
+                    f"The request body of argument '{arg_name}' is required")
+            return empty_value
+
+        try:
+            payload = negotiate_body_serializer(request).loads(data)
+            return cast_object(None, payload, data_type)
+        except (ValueError, TypeError, IncompliantError) as exc:
+            raise InvalidArgumentError(
+                f"Malformed request body of argument '{arg_name}': {exc}"
+            ) from exc
+
+    return _getter
+
+
+def is_body_annotation(annotation):
+    """The dataclass or generic types containing dataclass, like
+    List[Data] or Union[A, B], are decoded from the request body.
+    """
+    if is_dataclass(annotation):
+        return True
+
+    return any(is_body_annotation(arg) for arg in get_args(annotation))
+
+
+def _session_getter(arg_name, arg_spec):
+    return get_http_session
+
+
+def _request_getter(arg_name, arg_spec):
+    return _identity
 
-            setters.append((arg_name, _setter))
-            continue
 
-        if arg_name == 'json_request':
-            arg_value = _json_request_getter(arg_name, arg_spec)
-            setters.append((arg_name, arg_value))
+def _identity(request):
+    return request
+
+
+def _deadline_getter(arg_name, arg_spec):
+    return get_deadline
+
+
+def _body_stream_getter(arg_name, arg_spec):
+    item_type = body_item_type(arg_spec.annotation)
+    if item_type is None:
+        return get_body_stream
+
+    def _getter(request):
+        return get_body_stream(request).items(item_type)
+
+    return _getter
+
+
+# 同步取值的参数，直接从请求对象中获得，无需创建协程
+_sync_getter_factories = {
+    "request": _request_getter,
+    "http_request": _request_getter,
+    "deadline": _deadline_getter,
+}
+
+# 需要IO等待的参数
+_async_getter_factories = {
+    "session": _session_getter,
+    "user_session": _session_getter,
+    "json_request": _json_request_getter,
+}
+
+
+def build_argument_binder(arguments):
+    """
+    Compile the handler's arguments into getters once at decoration time.
+
+    Return a pair of tuples ``(sync_getters, async_getters)`` of
+    ``(arg_name, getter)``. The sync getters are plain functions of request,
+    only the async getters which really need I/O are awaited per request.
+    The argument annotated with dataclass is decoded from the request body.
+    """
+
+    sync_getters = []
+    async_getters = []
+    body_args = []
+    for arg_name, arg_spec in arguments.items():
+        if arg_name == 'body_stream':
+            # 流式读取的请求体，由处理函数逐步消费
+            body_args.append(arg_name)
+            sync_getters.append((arg_name,
+                                 _body_stream_getter(arg_name, arg_spec)))
             continue
 
-        if arg_name == 'http_request' or arg_name == 'request':
-            async def _setter(request):
-                return request
+        if (is_body_annotation(arg_spec.annotation) or
+                (arg_name == 'json_request' and
+                 arg_spec.annotation is not arg_spec.empty)):
+            body_args.append(arg_name)
+            async_getters.append((arg_name,
+                                  _typed_body_getter(arg_name, arg_spec)))
+            continue
 
-            setters.append((arg_name, _setter))
+        getter_factory = _async_getter_factories.get(arg_name)
+        if getter_factory is not None:
+            async_getters.append((arg_name, getter_factory(arg_name, arg_spec)))
             continue
 
-        setters.append((arg_name, _default_arg_getter(arg_name, arg_spec)))
+        getter_factory = _sync_getter_factories.get(arg_name,
+                                                    _default_arg_getter)
+        sync_getters.append((arg_name, getter_factory(arg_name, arg_spec)))
+
+    if len(body_args) > 1:
+        args = ", ".join([f"'{arg_name}'" for arg_name in body_args])
+        raise ValueError(f"Ambiguous request body arguments: {args}. "
+                        f"The request body argument should be unique.")
 
-    return setters
+    return tuple(sync_getters), tuple(async_getters)
 
 
-def rest_method(target_func):
+def rest_method(target_func=None, *, ttl=None, vary=None,
+                cache_size=DEFAULT_CACHE_SIZE, coalesce=False,
+                timeout=None, deadline_header=None,
+                max_concurrency=None, limiter=None,
+                priority=PRIORITY_NORMAL, executor=None,
+                idempotent=False, max_body_size=None):
     """
 
     @rest
     def hi(session, ...):
         pass
 
+    The serialized responses are cached for ``ttl`` seconds if given, keyed
+    by the path and query arguments and the values of the ``vary`` headers.
+    If ``coalesce`` is true, the concurrent calls with the same key share
+    one in-flight execution.
+
+    The handler is cancelled with 504 after ``timeout`` seconds, or the
+    shorter budget sent in the ``deadline_header``. The handler can take
+    the remaining budget with a ``deadline`` argument.
+
+    The concurrent requests are limited by a ConcurrencyLimiter of
+    ``max_concurrency``, or by the given ``limiter`` shared with other
+    routes, admitting the requests of lower ``priority`` number first.
+
+    The plain ``def`` handlers run in the thread pool, and the CPU-bound
+    handlers can be run in the ``executor`` 'thread' or 'process' pool.
+
+    If ``idempotent`` is true, the retried requests with the same
+    Idempotency-Key header are answered with the stored response.
+
+    The handler with a ``body_stream`` argument reads the request body
+    incrementally, as a BodyStream or as the decoded items of an
+    ``AsyncIterator[Item]`` annotation. The bodies larger than
+    ``max_body_size`` are rejected with 413.
+
+    The serialized responses are compressed as the application is set up
+    with setup_compression.
+
     """
+    if target_func is None:
+        return functools.partial(rest_method, ttl=ttl, vary=vary,
+                                 cache_size=cache_size, coalesce=coalesce,
+                                 timeout=timeout,
+                                 deadline_header=deadline_header,
+                                 max_concurrency=max_concurrency,
+                                 limiter=limiter, priority=priority,
+                                 executor=executor, idempotent=idempotent,
+                                 max_body_size=max_body_size)
+
     func_sig = inspect.signature(target_func)
-    arg_getters = build_argument_getters(func_sig.parameters)
+    sync_getters, async_getters = build_argument_binder(func_sig.parameters)
+    reads_body_stream = 'body_stream' in func_sig.parameters
+    # 被functools.wraps装饰的协程函数仍在事件循环上执行
+    unwrapped_func = inspect.unwrap(target_func)
+    is_async_gen = inspect.isasyncgenfunction(unwrapped_func)
+
+    # 只有指定了executor，才在工作线程或进程里执行协程函数
+    run_coroutine = executor is not None
+    if executor is None and not is_async_gen and \
+            not inspect.iscoroutinefunction(unwrapped_func):
+        executor = EXECUTOR_THREAD
+
+    if executor is not None:
+        if is_async_gen:
+            raise ValueError(f"The streaming handler "
+                             f"'{target_func.__qualname__}' cannot "
+                             f"run in executor")
+        managed_executor = get_executor(executor)
+        check_executor_arguments(target_func, managed_executor,
+                                 func_sig.parameters)
+    else:
+        managed_executor = None
+
+    if ttl is not None or coalesce:
+        key_names = shared_key_names(target_func, sync_getters, async_getters)
+
+    if ttl is not None:
+        response_cache = ResponseCache(ttl, vary=vary, maxsize=cache_size,
+                                       key_names=key_names)
+    else:
+        response_cache = None
+
+    if coalesce:
+        single_flight = SingleFlight(vary=vary, key_names=key_names)
+    else:
+        single_flight = None
+
+    if timeout is not None or deadline_header is not None:
+        if is_async_gen:
+            raise ValueError(f"The streaming handler "
+                             f"'{target_func.__qualname__}' cannot "
+                             f"have a timeout")
+        deadline_policy = DeadlinePolicy(timeout, deadline_header)
+    else:
+        deadline_policy = None
+
+    if idempotent:
+        if is_async_gen:
+            raise ValueError(f"The streaming handler "
+                             f"'{target_func.__qualname__}' cannot "
+                             f"be idempotent")
+        if any(arg_name == 'body_stream' for arg_name, _ in sync_getters):
+            # 请求指纹需要读取整个请求体，与流式读取冲突
+            raise ValueError(f"The handler '{target_func.__qualname__}' "
+                             f"reading the body stream cannot be idempotent")
+        idempotency = Idempotency()
+    else:
+        idempotency = None
+
+    async def _invoke(request, arg_values):
+        if is_async_gen:
+            return await stream_json_response(request,
+                                              target_func(**arg_values))
+
+        if managed_executor is not None:
+            res = await managed_executor.run(target_func, arg_values,
+                                             run_coroutine=run_coroutine)
+            if inspect.iscoroutine(res):
+                res = await res
+        else:
+            res = await target_func(**arg_values)
+
+        if isinstance(res, web.StreamResponse):
+            return res
+
+        if is_async_iterable(res):
+            return await stream_json_response(request, res)
+
+        serializer = negotiate_response_serializer(request)
+        return web.Response(body=serializer.dumps(res),
+                            content_type=serializer.content_type)
+
+    invoke = _invoke
+    if single_flight is not None:
+        invoke = single_flight.wrap(invoke)
+
+    if response_cache is not None:
+        invoke = response_cache.wrap(invoke)
+
+    if deadline_policy is not None:
+        invoke = deadline_policy.wrap(invoke)
+
+    if idempotency is not None:
+        invoke = idempotency.wrap(invoke)
+
+    async def _handle(request):
+        if max_body_size is not None:
+            check_content_length(request, max_body_size)
+            if reads_body_stream:
+                request[MAX_BODY_SIZE_KEY] = max_body_size
+            else:
+                await check_body_size(request, max_body_size)
+
+        arg_values = {arg_name: arg_getter(request)
+                      for arg_name, arg_getter in sync_getters}
+        for arg_name, arg_getter in async_getters:
+            arg_values[arg_name] = await arg_getter(request)
+
+        return await invoke(request, arg_values)
+
+    if limiter is None and max_concurrency is not None:
+        limiter = ConcurrencyLimiter(max_concurrency)
+
+    handle = _handle
+    if limiter is not None:
+        handle = limiter.wrap(handle, priority)
 
     async def _wrapper_func(request):
         try:
-            arg_values = dict([(arg_name, await arg_getter(request))
-                               for arg_name, arg_getter in arg_getters])
-            res = await target_func(**arg_values)
-            if isinstance(res, web.StreamResponse):
-                return res
+            if deadline_policy is not None:
+                deadline_policy.start(request)
 
-            return web.json_response(res, dumps=json_dumps)
+            response = await handle(request)
+
+            compression = get_compression_policy(request)
+            if compression is not None:
+                response = await compression.apply(request, response)
+
+            return response
+
+        except StreamAbortedError:
+            raise
 
         except Exception as exc:
-            return make_json_error_response(exc)
+            return make_json_error_response(exc, request)
+
+    functools.update_wrapper(_wrapper_func, target_func)
+    _wrapper_func.response_cache = response_cache
+    _wrapper_func.single_flight = single_flight
+    _wrapper_func.limiter = limiter
+    _wrapper_func.idempotency = idempotency
+    # 批量请求的内容已被读取，流式读取请求体的路由不能批量调用
+    _wrapper_func.batchable = not is_async_gen and not reads_body_stream
+    return _wrapper_func
+
+
+def shared_key_names(target_func, sync_getters, async_getters):
+    """
+    The path and query arguments identifying the responses which can be
+    shared between requests.
+    """
 
-    return functools.update_wrapper(_wrapper_func, target_func)
+    unshared = [arg_name for arg_name, _ in async_getters]
+    unshared += [arg_name for arg_name, _ in sync_getters
+                 if arg_name == 'body_stream']
+    if unshared:
+        args = ", ".join([f"'{arg_name}'" for arg_name in unshared])
+        raise ValueError(f"Cannot share the responses of "
+                         f"'{target_func.__qualname__}' depending on the "
+                         f"session or request body arguments: {args}")
 
+    return [arg_name for arg_name, _ in sync_getters
+            if arg_name not in _sync_getter_factories]
 
-def make_json_error_response(exc):
+
+def make_json_error_response(exc, request=None):
     error_message = str(exc)
     if isinstance(exc, NotFoundError):
         status = 404
@@ -116,6 +564,22 @@ def make_json_error_response(exc):
         status = 403
         error_type = "ForbidenError"
 
+    elif isinstance(exc, InvalidArgumentError):
+        status = 400
+        error_type = "InvalidArgument"
+
+    elif isinstance(exc, DeadlineExceededError):
+        status = 504
+        error_type = "DeadlineExceeded"
+
+    elif isinstance(exc, OverloadedError):
+        status = 503
+        error_type = "Overloaded"
+
+    elif isinstance(exc, PayloadTooLargeError):
+        status = 413
+        error_type = "PayloadTooLarge"
+
     elif isinstance(exc, BusinessRuleFailedError):
         status = 409
         error_type = ""
@@ -125,17 +589,28 @@ def make_json_error_response(exc):
         error_type = "ServerError"
         error_message = f"Server {type(exc).__name__}: {error_message}"
 
-    details = traceback.format_exc()
-
-    log_message = f"{error_type} ({status}): {error_message}\n{details}\n"
-    if status >= 400 and status < 500:
-        redbean_logger.warning(log_message)
-    elif status >= 500:
-        redbean_logger.error(log_message)
-
-    return web.json_response({
-        "status": status,
-        "error": error_type,
-        "message": error_message,
-        "details": details,
-    }, status=status, dumps=json_dumps)
+    error_reporter = get_error_reporter(request)
+    if error_reporter is not None:
+        response = error_reporter.report(exc, status, error_type,
+                                         error_message)
+    else:
+        details = traceback.format_exc()
+
+        log_message = (f"{error_type} ({status}): "
+                       f"{error_message}\n{details}\n")
+        if status >= 400 and status < 500:
+            redbean_logger.warning(log_message)
+        elif status >= 500:
+            redbean_logger.error(log_message)
+
+        response = web.json_response({
+            "status": status,
+            "error": error_type,
+            "message": error_message,
+            "details": details,
+        }, status=status, dumps=json_dumps)
+
+    if isinstance(exc, OverloadedError):
+        response.headers["Retry-After"] = str(exc.retry_after)
+
+    return response
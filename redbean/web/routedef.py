@@ -7,7 +7,13 @@ from aiohttp.web_request import Request
 from aiohttp.web_response import StreamResponse
 from aiohttp.web_urldispatcher import AbstractRoute, UrlDispatcher
 from aiohttp import hdrs
-from .rest import rest_method
+from .rest import rest_method, make_json_error_response, DEFAULT_CACHE_SIZE
+from .rest import typed_route_path
+from .batch import BatchDispatcher
+from .batch import DEFAULT_BATCH_CONCURRENCY, DEFAULT_BATCH_OPERATIONS
+from .metrics import RouteMetrics
+from .admission import ConcurrencyLimiter, PRIORITY_NORMAL
+from .fanout import TopicBroadcast, DEFAULT_HEARTBEAT
 
 PathLike = Union[str, "os.PathLike[str]"]
 HandlerType = Callable[[Request], Awaitable[StreamResponse]]
@@ -73,16 +79,123 @@ class RestServiceDef(Sequence[RouteDef]):
     def __contains__(self, item: object) -> bool:
         return item in self._items
 
-    def route(self, method: str, path: str, **kwargs: Dict[str, Any]) -> _Deco:
+    def route(self, method: str, path: str, *,
+              ttl: float = None,
+              vary: Sequence[str] = None,
+              cache_size: int = DEFAULT_CACHE_SIZE,
+              coalesce: bool = False,
+              metrics: bool = True,
+              timeout: float = None,
+              deadline_header: str = None,
+              max_concurrency: int = None,
+              limiter: ConcurrencyLimiter = None,
+              priority: int = PRIORITY_NORMAL,
+              executor: str = None,
+              idempotent: bool = False,
+              max_body_size: int = None,
+              **kwargs: Dict[str, Any]) -> _Deco:
+        """
+        :param ttl: cache the serialized GET responses for ttl seconds
+        :param vary: the request headers which vary the cached responses
+        :param cache_size: the maximum entries of the response cache
+        :param coalesce: share one in-flight execution between the
+                         concurrent identical calls
+        :param metrics: record the request counts and latency histogram
+        :param timeout: cancel the handler with 504 after timeout seconds
+        :param deadline_header: the request header carrying a shorter
+                                budget in seconds, like 'X-Request-Timeout'
+        :param max_concurrency: the limit of concurrent requests
+        :param limiter: the ConcurrencyLimiter shared with other routes
+        :param priority: the admission priority, PRIORITY_CRITICAL first
+        :param executor: run the handler in the 'thread' or 'process' pool,
+                         the plain def handlers run in the thread pool
+        :param idempotent: replay the stored response for the retried
+                           requests with the same Idempotency-Key header
+        :param max_body_size: reject the larger request bodies with 413
+        """
+
+        if ttl is not None and method not in (hdrs.METH_GET, hdrs.METH_HEAD):
+            raise ValueError(f"Only GET routes can be cached, not {method}")
+
+        if idempotent and method in (hdrs.METH_GET, hdrs.METH_HEAD):
+            raise ValueError(f"The {method} routes are idempotent already")
+
         path = self._prefix + path
         def inner(handler: Any) -> Any:
             # print(3333, handler.__doc__)
-            handler = rest_method(handler)
-            self._items.append(RouteDef(method, path, handler, handler.__doc__, kwargs))
+            route_path = typed_route_path(path, handler)
+            handler = rest_method(handler, ttl=ttl, vary=vary,
+                                  cache_size=cache_size, coalesce=coalesce,
+                                  timeout=timeout,
+                                  deadline_header=deadline_header,
+                                  max_concurrency=max_concurrency,
+                                  limiter=limiter, priority=priority,
+                                  executor=executor, idempotent=idempotent,
+                                  max_body_size=max_body_size)
+            if metrics:
+                handler = RouteMetrics(method, path).wrap(handler)
+            self._items.append(RouteDef(method, route_path, handler,
+                                        handler.__doc__, kwargs))
             return handler
 
         return inner
 
+    def add_batch_route(self, path: str = "/batch", *,
+                        max_concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+                        max_operations: int = DEFAULT_BATCH_OPERATIONS,
+                        **kwargs: Dict[str, Any]) -> HandlerType:
+        """
+        Add a POST route running a list of operations
+        ``{"method", "path", "args", "body"}`` against the routes of this
+        table in one request, responding ``[{"status", "body"}]`` in order.
+        """
+
+        dispatcher = BatchDispatcher(self._items,
+                                     max_concurrency=max_concurrency,
+                                     max_operations=max_operations)
+
+        async def batch(request):
+            """Run a batch of REST operations"""
+            try:
+                return await dispatcher.handle(request)
+            except Exception as exc:
+                return make_json_error_response(exc, request)
+
+        path = self._prefix + path
+        self._items.append(RouteDef(hdrs.METH_POST, path, batch,
+                                    batch.__doc__, kwargs))
+        return batch
+
+    def add_sse_route(self, path: str, broadcast: TopicBroadcast, *,
+                      heartbeat: float = DEFAULT_HEARTBEAT,
+                      **kwargs: Dict[str, Any]) -> HandlerType:
+        """
+        Add a GET route streaming the messages of a TopicBroadcast as
+        Server-Sent Events, with a comment line every heartbeat seconds.
+        """
+
+        handler = broadcast.sse_handler(heartbeat=heartbeat)
+        path = self._prefix + path
+        self._items.append(RouteDef(hdrs.METH_GET, path, handler,
+                                    "Stream the topic messages as SSE",
+                                    kwargs))
+        return handler
+
+    def add_websocket_route(self, path: str, broadcast: TopicBroadcast, *,
+                            heartbeat: float = DEFAULT_HEARTBEAT,
+                            **kwargs: Dict[str, Any]) -> HandlerType:
+        """
+        Add a GET route sending the messages of a TopicBroadcast over
+        WebSocket as text frames.
+        """
+
+        handler = broadcast.websocket_handler(heartbeat=heartbeat)
+        path = self._prefix + path
+        self._items.append(RouteDef(hdrs.METH_GET, path, handler,
+                                    "Send the topic messages over WebSocket",
+                                    kwargs))
+        return handler
+
     def head(self, path: str, **kwargs: Dict[str, Any]) -> _Deco:
         return self.route(hdrs.METH_HEAD, path, **kwargs)
 
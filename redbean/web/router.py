@@ -0,0 +1,216 @@
+import re
+from aiohttp.web import HTTPNotFound, HTTPMethodNotAllowed
+from aiohttp.web_urldispatcher import PlainResource, DynamicResource
+from aiohttp.web_urldispatcher import MatchInfoError
+
+_DEFAULT_SEGMENT_PATTERN = "[^{}/]+"
+
+_PARAM_SEGMENT_RE = re.compile(r"^\{([_a-zA-Z][_a-zA-Z0-9]*)\}$")
+
+_NAMED_GROUP_RE = re.compile(r"\(\?P<([_a-zA-Z][_a-zA-Z0-9]*)>")
+
+# 只能匹配单个路径段的正则，如 -?\d+、[a-z0-9-]{2,8}，不能匹配 '/'
+_SEGMENT_SAFE_RE = re.compile(
+    r"(?:\\[dw.\-_]|\[(?!\^)(?:\\[dw.\-_]|[^\]\\/])*\]|[\w\-]|[+*?|)]"
+    r"|\(\?:|\{\d+(?:,\d*)?\})+")
+
+
+class _TrieNode:
+    __slots__ = ("literals", "params", "resources")
+
+    def __init__(self):
+        self.literals = {}
+        self.params = {}  # 正则 -> (fullmatch, node)
+        self.resources = []
+
+
+class RouteTrie:
+    """
+    The resources of a router compiled into a trie of path segments.
+
+    The literal segments are dict lookups and the ``{name}`` or
+    ``{name:regex}`` segments are matched by their own segment regex, so the
+    lookup cost grows with the path depth rather than the count of routes.
+    The resources which cannot be split by segment, like the static,
+    sub-application or ``{path:.*}`` resources, are still checked linearly.
+    The candidates are resolved in the order of registration, so the result
+    is the same as the UrlDispatcher.
+    """
+
+    __slots__ = ("root", "fallbacks", "_matchers")
+
+    def __init__(self, resources=()):
+        self.root = _TrieNode()
+        self.fallbacks = []
+        self._matchers = {}
+
+        for index, resource in enumerate(resources):
+            self.add(index, resource)
+
+    def add(self, index, resource):
+        segments = resource_segments(resource)
+        if segments is None:
+            self.fallbacks.append((index, resource))
+            return
+
+        node = self.root
+        for literal, pattern in segments:
+            if pattern is None:
+                child = node.literals.get(literal)
+                if child is None:
+                    child = node.literals[literal] = _TrieNode()
+            else:
+                param = node.params.get(pattern)
+                if param is None:
+                    param = node.params[pattern] = (
+                        self.segment_matcher(pattern), _TrieNode())
+                child = param[1]
+            node = child
+
+        node.resources.append((index, resource))
+
+    def segment_matcher(self, pattern):
+        matcher = self._matchers.get(pattern)
+        if matcher is None:
+            matcher = self._matchers[pattern] = re.compile(pattern).fullmatch
+
+        return matcher
+
+    def candidates(self, path):
+        """The resources matching the path in the order of registration"""
+
+        found = []
+        if path[:1] == "/":
+            segments = path[1:].split("/")
+            depth = len(segments)
+            stack = [(self.root, 0)]
+            while stack:
+                node, i = stack.pop()
+                if i == depth:
+                    found.extend(node.resources)
+                    continue
+
+                segment = segments[i]
+                child = node.literals.get(segment)
+                if child is not None:
+                    stack.append((child, i + 1))
+
+                for fullmatch, child in node.params.values():
+                    if fullmatch(segment) is not None:
+                        stack.append((child, i + 1))
+
+        if self.fallbacks:
+            found.extend(self.fallbacks)
+
+        if len(found) > 1:
+            found.sort(key=_candidate_index)
+
+        return found
+
+    async def resolve(self, request):
+        allowed_methods = set()
+        for _, resource in self.candidates(request.rel_url.raw_path):
+            match_dict, allowed = await resource.resolve(request)
+            if match_dict is not None:
+                return match_dict
+
+            allowed_methods |= allowed
+
+        if allowed_methods:
+            return MatchInfoError(HTTPMethodNotAllowed(request.method,
+                                                       allowed_methods))
+
+        return MatchInfoError(HTTPNotFound())
+
+
+def _candidate_index(candidate):
+    return candidate[0]
+
+
+def resource_segments(resource):
+    """
+    Split the path of resource into ``(literal, pattern)`` segments, or None
+    if it cannot be matched segment by segment.
+    """
+
+    if type(resource) is PlainResource:
+        path = resource.get_info()["path"]
+        if path[:1] != "/":
+            return None
+
+        return [(segment, None) for segment in path[1:].split("/")]
+
+    if type(resource) is not DynamicResource:
+        return None
+
+    info = resource.get_info()
+    formatter = info["formatter"]
+    groups = named_groups(info["pattern"].pattern)
+
+    segments = []
+    for segment in formatter[1:].split("/"):
+        if "{" not in segment and "}" not in segment:
+            segments.append((segment, None))
+            continue
+
+        matched = _PARAM_SEGMENT_RE.match(segment)
+        if matched is None:
+            return None  # 一个路径段内混合了常量和参数
+
+        pattern = groups.get(matched.group(1))
+        if pattern is None or not is_segment_pattern(pattern):
+            return None
+
+        segments.append((None, pattern))
+
+    return segments
+
+
+def is_segment_pattern(pattern):
+    return (pattern == _DEFAULT_SEGMENT_PATTERN or
+            _SEGMENT_SAFE_RE.fullmatch(pattern) is not None)
+
+
+def named_groups(source):
+    """The regex of each named group in the pattern of a DynamicResource"""
+
+    groups = {}
+    for matched in _NAMED_GROUP_RE.finditer(source):
+        start = i = matched.end()
+        depth = 1
+        in_class = False
+        while depth and i < len(source):
+            c = source[i]
+            if c == "\\":
+                i += 2
+                continue
+
+            if in_class:
+                if c == "]":
+                    in_class = False
+            elif c == "[":
+                in_class = True
+            elif c == "(":
+                depth += 1
+            elif c == ")":
+                depth -= 1
+            i += 1
+
+        groups[matched.group(1)] = source[start:i - 1]
+
+    return groups
+
+
+def setup_compiled_router(app):
+    """
+    Dispatch the requests of the application by a RouteTrie compiled from
+    all of its routes at startup.
+    """
+
+    async def _compile_router(app):
+        router = app.router
+        route_trie = RouteTrie(router.resources())
+        # 启动后路由表已冻结，以编译的前缀树代替逐个资源的线性匹配
+        router.resolve = route_trie.resolve
+
+    app.on_startup.append(_compile_router)
@@ -0,0 +1,207 @@
+import json
+import base64
+from enum import Enum
+from decimal import Decimal
+from datetime import datetime, date
+from dataclasses import fields, is_dataclass
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from cbor2 import loads as cbor_loads
+    from ..dobject.cbor import DObjectCBOREncoder
+except ImportError:
+    DObjectCBOREncoder = None
+
+
+JSON_SERIALIZER = "json_serializer"
+
+CBOR_CONTENT_TYPE = "application/cbor"
+
+
+class JSONSerializer:
+    """
+    The stdlib json backend, the output is compatible with json.dumps.
+
+    The naive datetimes are output as they are, or with the offset of the
+    server's local timezone if ``local_timezone`` is true.
+    """
+
+    content_type = "application/json"
+
+    def __init__(self, *, local_timezone=False):
+        default = _as_json_native_local if local_timezone else _as_json_native
+        self._encoder = json.JSONEncoder(default=default, ensure_ascii=False)
+
+    def dumps(self, obj) -> bytes:
+        return self._encoder.encode(obj).encode("utf-8")
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonSerializer:
+    """
+    The orjson backend, encoding into bytes without an intermediate str.
+    The datetimes are encoded natively unless ``local_timezone`` is true.
+    """
+
+    content_type = "application/json"
+
+    def __init__(self, *, local_timezone=False):
+        self._option = orjson.OPT_NON_STR_KEYS
+        self._default = _as_json_native
+        if local_timezone:
+            # 只有需要转换无时区的datetime时，才放弃orjson的原生编码
+            self._option |= orjson.OPT_PASSTHROUGH_DATETIME
+            self._default = _as_json_native_local
+
+    def dumps(self, obj) -> bytes:
+        return orjson.dumps(obj, default=self._default, option=self._option)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+class CBORSerializer:
+    """The CBOR backend with the dataclass codec of DObjectCBOREncoder"""
+
+    content_type = CBOR_CONTENT_TYPE
+
+    def __init__(self):
+        self._encoder = DObjectCBOREncoder()
+
+    def dumps(self, obj) -> bytes:
+        return self._encoder.encode(obj)
+
+    def loads(self, data):
+        return cbor_loads(data)
+
+
+def _as_json_native(obj):
+    """
+    The fast paths of the types which DObjectCBOREncoder supports but json
+    cannot encode natively.
+    """
+
+    if is_dataclass(obj) and not isinstance(obj, type):
+        return {f.name: getattr(obj, f.name) for f in fields(obj)}
+
+    if isinstance(obj, date):
+        return obj.isoformat()
+
+    if isinstance(obj, Decimal):
+        return str(obj)
+
+    if isinstance(obj, Enum):
+        return obj.value
+
+    if isinstance(obj, (bytes, bytearray)):
+        return base64.b64encode(obj).decode("ascii")
+
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+
+    raise TypeError(f"Unsupport type '{type(obj)}'")
+
+
+def _as_json_native_local(obj):
+    """Output the naive datetimes with the offset of local timezone"""
+
+    if isinstance(obj, datetime) and obj.tzinfo is None:
+        return obj.astimezone().isoformat()
+
+    return _as_json_native(obj)
+
+
+_serializer_factories = {
+    "json": JSONSerializer,
+}
+
+if orjson is not None:
+    _serializer_factories["orjson"] = OrjsonSerializer
+
+
+def register_json_serializer(name, factory):
+    """Register a serializer backend factory under the name"""
+    _serializer_factories[name] = factory
+
+
+def get_json_serializer(name, **options):
+    factory = _serializer_factories.get(name)
+    if factory is None:
+        raise ValueError(f"Unknown json serializer '{name}', "
+                         f"the available: {', '.join(_serializer_factories)}")
+    return factory(**options)
+
+
+def setup_json_serializer(app, serializer="json", **options):
+    """
+    Install the serializer by name, with the options of its factory, or
+    instance for the REST responses.
+    """
+
+    if isinstance(serializer, str):
+        serializer = get_json_serializer(serializer, **options)
+
+    app[JSON_SERIALIZER] = serializer
+
+
+def request_json_serializer(request):
+    serializer = request.app.get(JSON_SERIALIZER)
+    if serializer is None:
+        return default_json_serializer
+
+    return serializer
+
+
+def negotiate_body_serializer(request):
+    """Choose the serializer decoding the body by the request Content-Type"""
+
+    if cbor_serializer is not None:
+        if request.content_type == CBOR_CONTENT_TYPE:
+            return cbor_serializer
+
+    return request_json_serializer(request)
+
+
+def negotiate_response_serializer(request):
+    """Choose the serializer encoding the response by the Accept header"""
+
+    if cbor_serializer is not None:
+        accept = request.headers.get("Accept")
+        if accept is not None and CBOR_CONTENT_TYPE in accept:
+            if _accepts_media_type(accept, CBOR_CONTENT_TYPE):
+                return cbor_serializer
+
+    return request_json_serializer(request)
+
+
+def _accepts_media_type(accept, media_type):
+    for item in accept.split(","):
+        media_range, *params = item.split(";")
+        if media_range.strip() != media_type:
+            continue
+
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    return float(value) > 0  # q=0 表示不可接受
+                except ValueError:
+                    return False
+
+        return True
+
+    return False
+
+
+default_json_serializer = JSONSerializer()
+
+if DObjectCBOREncoder is not None:
+    cbor_serializer = CBORSerializer()
+else:
+    cbor_serializer = None
@@ -1,7 +1,20 @@
 import time
+import base64
+import struct
+import asyncio
+import hashlib
+import hmac
+import weakref
+from collections import OrderedDict
 from cryptography.fernet import InvalidToken
 from cryptography import fernet
 
+try:
+    from cbor2 import dumps as cbor_dumps, loads as cbor_loads
+    from ..dobject.cbor import DObjectCBOREncoder
+except ImportError:
+    DObjectCBOREncoder = None
+
 from ..exception import UnauthorizedError
 
 import logging
@@ -13,15 +26,26 @@ CONTEXT_COOKIE = "tgu-context"
 
 SESSION_FERNET = "session_fernet"
 SESSION_FATORY = 'session_factory'
+SESSION_SIGNER = "session_signer"
+
+SESSION_MEMO_KEY = "redbean_session"
 
 
-def setup_session(app, factory=None, secret=None):
+def setup_session(app, factory=None, secret=None, *,
+                  cookie_cache_size=4096, cookie_cache_ttl=300.0,
+                  signing_keys=None, signing_algorithm="blake2b"):
     
     if secret is not None:
         assert isinstance(secret, str)
 
         from cryptography import fernet
         app[SESSION_FERNET] = fernet.Fernet(secret)
+        _cookie_caches[app[SESSION_FERNET]] = DecryptedCookieCache(
+            maxsize=cookie_cache_size, ttl=cookie_cache_ttl)
+
+    if signing_keys is not None:
+        app[SESSION_SIGNER] = SignedTokenCodec(signing_keys,
+                                               algorithm=signing_algorithm)
 
     if factory is not None:
         app[SESSION_FATORY] = factory
@@ -31,6 +55,63 @@ def secret_factory(secret_key):
     return fernet.Fernet(secret_key)
 
 
+class SessionMemo:
+    """
+    The session resolved once for a request. The concurrent callers, like
+    the operations of a batch request sharing the memo, wait for the first
+    resolving.
+    """
+
+    __slots__ = ("_future",)
+
+    def __init__(self):
+        self._future = None
+
+    async def resolve(self, request, factory):
+        future = self._future
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._future = future
+            try:
+                future.set_result(await factory(request))
+            except BaseException as exc:
+                self._future = None  # 失败的不缓存，下次重新获取
+                if isinstance(exc, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(exc)
+                    future.exception()
+                raise
+
+            return future.result()
+
+        return await asyncio.shield(future)
+
+    def result(self):
+        """The session resolved successfully, or None without waiting"""
+
+        future = self._future
+        if future is None or not future.done() or future.cancelled():
+            return None
+        if future.exception() is not None:
+            return None
+
+        return future.result()
+
+
+def install_session_memo(request):
+    """
+    Install the session memo on the request, which is shared by its clones
+    created later.
+    """
+
+    memo = request.get(SESSION_MEMO_KEY)
+    if memo is None:
+        memo = request[SESSION_MEMO_KEY] = SessionMemo()
+
+    return memo
+
+
 async def get_http_session(request):
 
     # principal = get_secure_cookie(request, SESSION_COOKIE)
@@ -43,7 +124,8 @@ async def get_http_session(request):
             "Install user session factory "
             "in your aiohttp.web.Application")
 
-    user_session = await factory(request)
+    user_session = await install_session_memo(request).resolve(request,
+                                                                factory)
     if user_session is None:
         raise UnauthorizedError(f"Unauthorized user session")
 
@@ -108,7 +190,73 @@ async def get_validation_in_cookie(request):
 #         await super().prepare(request)
 
 
-def get_secure_cookie(request, name):
+class DecryptedCookieCache:
+    """
+    The bounded LRU of decrypted cookie values of one Fernet key, keyed by
+    the digest of the token.
+
+    An entry expires after ``ttl`` seconds. The creation time of the token
+    is kept with the value, so a hit is rejected like by Fernet when the
+    token is older than the ttl passed to decrypt. The invalid tokens are
+    not cached.
+    """
+
+    __slots__ = ("maxsize", "ttl", "hits", "misses", "_entries")
+
+    def __init__(self, *, maxsize=4096, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def decrypt(self, fernet, token, ttl=None):
+        digest = hashlib.blake2b(token, digest_size=16).digest()
+        now = time.time()
+
+        entry = self._entries.get(digest)
+        if entry is not None:
+            expires_at, timestamp, value = entry
+            if expires_at > now:
+                if ttl is not None and timestamp + ttl < now:
+                    raise InvalidToken
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                return value
+            del self._entries[digest]
+
+        self.misses += 1
+        value = fernet.decrypt(token, ttl=ttl)
+
+        entries = self._entries
+        entries[digest] = (now + self.ttl, token_timestamp(token), value)
+        while len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+        return value
+
+
+def token_timestamp(token):
+    """The creation time of a verified Fernet token"""
+    data = base64.urlsafe_b64decode(token)
+    return struct.unpack(">Q", data[1:9])[0]
+
+
+_cookie_caches = weakref.WeakKeyDictionary()
+
+
+def get_cookie_cache(fernet):
+    cache = _cookie_caches.get(fernet)
+    if cache is None:
+        cache = _cookie_caches[fernet] = DecryptedCookieCache()
+
+    return cache
+
+
+def get_secure_cookie(request, name, ttl=None):
     value = request.cookies.get(name)
     if value is None:
         return None
@@ -118,8 +266,9 @@ def get_secure_cookie(request, name):
         raise RuntimeError("fernet is required in application")
 
     try:
-        value = fernet.decrypt(value.encode('utf-8')).decode('utf-8')
-        return value
+        cache = get_cookie_cache(fernet)
+        value = cache.decrypt(fernet, value.encode('utf-8'), ttl)
+        return value.decode('utf-8')
     except InvalidToken:
         logger.warning("Cannot decrypt cookie value")
         return None
@@ -149,3 +298,155 @@ def set_secure_cookie(request, response, name, value, *,
                         max_age=max_age,
                         expires=expires,
                         httponly=httponly)
+
+
+TOKEN_VERSION = 1
+DEFAULT_TOKEN_MAX_AGE = 30 * 24 * 3600
+
+# 版本(1)、密钥编号(1)、过期时间(4)
+_TOKEN_HEADER = struct.Struct(">BBI")
+
+_SIGNATURE_SIZES = {"blake2b": 16, "sha256": 32}
+
+_CBOR_NATIVE_TYPES = (str, bytes, int)
+
+
+class SignedTokenCodec:
+    """
+    The compact signed token, an alternative of the Fernet token when the
+    value, like a session identifier, needs no encryption.
+
+    The token is the base64url of a 6-byte header of version, key id and
+    expiry, the CBOR payload and the signature of them, a keyed BLAKE2b or
+    an HMAC-SHA256. The expiry is checked before the signature is verified.
+
+    The ``keys`` maps the key ids (0-255) to the secrets. The new tokens are
+    signed by the ``active`` key, the greatest id by default, and the tokens
+    signed by any key of the ring are accepted, so a key can be rotated by
+    adding the new key before retiring the old one.
+    """
+
+    __slots__ = ("_keys", "active", "algorithm", "_signature_size",
+                 "_encoder")
+
+    def __init__(self, keys, *, active=None, algorithm="blake2b"):
+        if DObjectCBOREncoder is None:
+            raise RuntimeError("The signed token requires 'cbor2' installed")
+
+        if algorithm not in _SIGNATURE_SIZES:
+            raise ValueError(f"Unknown algorithm '{algorithm}', "
+                             f"should be 'blake2b' or 'sha256'")
+
+        if not keys:
+            raise ValueError("The key ring should have at least one key")
+
+        self._keys = {}
+        for key_id, secret in keys.items():
+            if not 0 <= key_id <= 255:
+                raise ValueError(f"The key id {key_id} is out of 0-255")
+            if isinstance(secret, str):
+                secret = secret.encode("utf-8")
+            if len(secret) < 16:
+                raise ValueError(f"The key {key_id} is shorter than 16 bytes")
+            self._keys[key_id] = secret
+
+        self.active = max(self._keys) if active is None else active
+        if self.active not in self._keys:
+            raise ValueError(f"The active key {self.active} is not in the ring")
+
+        self.algorithm = algorithm
+        self._signature_size = _SIGNATURE_SIZES[algorithm]
+        self._encoder = DObjectCBOREncoder()
+
+    def _sign(self, secret, data):
+        if self.algorithm == "blake2b":
+            return hashlib.blake2b(data, key=secret[:64],
+                                   digest_size=16).digest()
+        return hmac.new(secret, data, hashlib.sha256).digest()
+
+    def dumps(self, value, max_age=DEFAULT_TOKEN_MAX_AGE) -> str:
+        if type(value) in _CBOR_NATIVE_TYPES:
+            payload = cbor_dumps(value)  # 标量无需数据对象的转换
+        else:
+            payload = self._encoder.encode(value)
+
+        expires_at = int(time.time() + max_age)
+        data = (_TOKEN_HEADER.pack(TOKEN_VERSION, self.active, expires_at) +
+                payload)
+        data += self._sign(self._keys[self.active], data)
+
+        return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+    def loads(self, token, data_type=None):
+        """
+        The value of the token, or None if the token is malformed, expired
+        or not signed by a key of the ring.
+        """
+
+        try:
+            data = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        except (ValueError, TypeError):
+            return None
+
+        size = len(data) - self._signature_size
+        if size < _TOKEN_HEADER.size:
+            return None
+
+        version, key_id, expires_at = _TOKEN_HEADER.unpack_from(data)
+        if version != TOKEN_VERSION or expires_at <= time.time():
+            return None
+
+        secret = self._keys.get(key_id)
+        if secret is None:
+            return None  # 已经撤销的密钥
+
+        if not hmac.compare_digest(self._sign(secret, data[:size]),
+                                   data[size:]):
+            return None
+
+        payload = data[_TOKEN_HEADER.size:size]
+        if data_type is None:
+            return cbor_loads(payload)
+        return self._encoder.decode(payload, data_type)
+
+
+def get_signed_cookie(request, name, data_type=None):
+    value = request.cookies.get(name)
+    if value is None:
+        return None
+
+    signer = request.app.get(SESSION_SIGNER)
+    if signer is None:
+        raise RuntimeError("signing keys are required in application")
+
+    value = signer.loads(value, data_type)
+    if value is None:
+        logger.warning("Cannot verify cookie value")
+
+    return value
+
+
+def set_signed_cookie(request, response, name, value, *,
+                      domain=None,
+                      max_age=None,
+                      path='/',
+                      httponly=True):
+
+    if value is None:
+        response.del_cookie(name, domain=domain, path=path)
+        return
+
+    signer = request.app[SESSION_SIGNER]
+    if max_age is not None:
+        token = signer.dumps(value, max_age)
+        expires = time.gmtime(time.time() + max_age)
+        expires = time.strftime("%a, %d-%b-%Y %T GMT", expires)
+    else:
+        token = signer.dumps(value)  # 浏览器会话结束前有效，但令牌仍有期限
+        expires = None
+
+    response.set_cookie(name, token,
+                        domain=domain, path=path,
+                        max_age=max_age,
+                        expires=expires,
+                        httponly=httponly)
@@ -0,0 +1,331 @@
+import time
+import asyncio
+import secrets
+import logging
+from http.cookies import SimpleCookie
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from aiohttp import hdrs
+
+from .session import SESSION_COOKIE, SESSION_FATORY, SESSION_MEMO_KEY
+
+logger = logging.getLogger(__name__)
+
+SESSION_STORE = "session_store"
+
+DEFAULT_SESSION_TTL = 7 * 24 * 3600
+DEFAULT_FLUSH_INTERVAL = 0.05
+
+_MISSING = object()
+
+
+class ServerSession(MutableMapping):
+    """
+    The session state stored at the server side, identified by the sid in
+    the cookie.
+
+    Setting or deleting the items marks the session dirty, and only the
+    dirty sessions are written back. Call mark_dirty() after mutating a
+    nested value in place.
+    """
+
+    __slots__ = ("sid", "_data", "dirty", "new", "invalidated",
+                 "replaced_sid")
+
+    def __init__(self, sid, data=None, *, new=False):
+        self.sid = sid
+        self._data = {} if data is None else data
+        self.dirty = False
+        self.new = new
+        self.invalidated = False
+        self.replaced_sid = None
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+        self.dirty = True
+
+    def __delitem__(self, key):
+        del self._data[key]
+        self.dirty = True
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return f"<ServerSession {self.sid[:8]}... {self._data!r}>"
+
+    def mark_dirty(self):
+        self.dirty = True
+
+    def invalidate(self):
+        """Delete the session from the store and the cookie of client"""
+        self._data = {}
+        self.invalidated = True
+
+    def regenerate(self):
+        """
+        Move the data to a new sid and delete the old one, like after the
+        login, so that a sid fixed before authentication cannot be used.
+        """
+
+        if not self.new and self.replaced_sid is None:
+            self.replaced_sid = self.sid
+        self.sid = new_session_id()
+        self.dirty = True
+
+
+class MemorySessionBackend:
+    """
+    The bounded LRU of session data expiring after ``ttl`` seconds since
+    the last access, so a session in use does not expire even if it is
+    only read.
+
+    The other backends, like a KV store shared by the processes, implement
+    the same ``async load(sid)``, ``async save_many(items)`` with a dict of
+    sid to data, and ``async delete_many(sids)``.
+    """
+
+    __slots__ = ("ttl", "maxsize", "_entries")
+
+    def __init__(self, *, ttl=DEFAULT_SESSION_TTL, maxsize=100000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def load(self, sid):
+        item = self._entries.get(sid)
+        if item is None:
+            return None
+
+        expires_at, data = item
+        if expires_at <= time.monotonic():
+            del self._entries[sid]
+            return None
+
+        self._entries[sid] = (time.monotonic() + self.ttl, data)
+        self._entries.move_to_end(sid)
+        return dict(data)
+
+    async def save_many(self, items):
+        entries = self._entries
+        expires_at = time.monotonic() + self.ttl
+        for sid, data in items.items():
+            entries[sid] = (expires_at, data)
+            entries.move_to_end(sid)
+
+        while len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+    async def delete_many(self, sids):
+        for sid in sids:
+            self._entries.pop(sid, None)
+
+
+class SessionStore:
+    """
+    The session factory loading the session state from the backend by the
+    sid in the cookie.
+
+    The session is loaded only when a handler declares a ``session``
+    argument, and once per request. The dirty sessions are written behind:
+    they are queued when the response is prepared and the writes within
+    ``flush_interval`` are coalesced into one batch to the backend, or
+    flushed at once when ``batch_size`` sessions are pending. The queued
+    data is read back before it reaches the backend.
+    """
+
+    __slots__ = ("backend", "cookie_name", "max_age", "flush_interval",
+                 "batch_size", "_pending", "_flushing", "_ready", "_flusher",
+                 "loads", "writes", "flushes")
+
+    def __init__(self, backend=None, *, cookie_name=SESSION_COOKIE,
+                 max_age=None, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 batch_size=500):
+        self.backend = MemorySessionBackend() if backend is None else backend
+        self.cookie_name = cookie_name
+        self.max_age = max_age
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self._pending = {}  # sid -> 会话数据，None表示删除
+        self._flushing = {}
+        self._ready = None
+        self._flusher = None
+
+        self.loads = 0
+        self.writes = 0
+        self.flushes = 0
+
+    def stats(self):
+        return {
+            "pending": len(self._pending),
+            "loads": self.loads,
+            "writes": self.writes,
+            "flushes": self.flushes,
+        }
+
+    async def __call__(self, request):
+        sid = request.cookies.get(self.cookie_name)
+        if sid:
+            data = self._pending.get(sid, _MISSING)
+            if data is _MISSING:
+                data = self._flushing.get(sid, _MISSING)
+            if data is _MISSING:
+                self.loads += 1
+                data = await self.backend.load(sid)
+            elif data is not None:
+                data = dict(data)
+
+            if data is not None:
+                return ServerSession(sid, data)
+
+        return ServerSession(new_session_id(), new=True)
+
+    def save(self, session):
+        """Queue the dirty or invalidated session to write behind"""
+
+        if session.replaced_sid is not None:
+            self._pending[session.replaced_sid] = None
+            session.replaced_sid = None
+
+        if session.invalidated:
+            if session.new:
+                return
+            self._pending[session.sid] = None
+
+        elif session.dirty:
+            self._pending[session.sid] = dict(session._data)
+            session.dirty = False
+
+        else:
+            return
+
+        self.writes += 1
+        if self._ready is not None:
+            self._ready.set()
+            if len(self._pending) >= self.batch_size:
+                asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        """Write the queued sessions to the backend in one batch"""
+
+        pending = self._pending
+        if not pending:
+            return
+
+        self._pending = {}
+        self._flushing.update(pending)
+
+        saved = {sid: data for sid, data in pending.items()
+                 if data is not None}
+        deleted = [sid for sid, data in pending.items() if data is None]
+        try:
+            if saved:
+                await self.backend.save_many(saved)
+            if deleted:
+                await self.backend.delete_many(deleted)
+            self.flushes += 1
+
+        except Exception:
+            logger.exception("Failed to write %d sessions", len(pending))
+            for sid, data in pending.items():
+                self._pending.setdefault(sid, data)  # 下次重试，新写入的优先
+            if self._ready is not None:
+                self._ready.set()
+
+        finally:
+            for sid, data in pending.items():
+                if self._flushing.get(sid, _MISSING) is data:
+                    del self._flushing[sid]
+
+    async def _run_flusher(self):
+        ready = self._ready
+        while True:
+            await ready.wait()
+            await asyncio.sleep(self.flush_interval)  # 合并这段时间内的写入
+            ready.clear()
+            await self.flush()
+
+    async def start(self, app=None):
+        if self._flusher is None:
+            self._ready = asyncio.Event()
+            if self._pending:
+                self._ready.set()
+            self._flusher = asyncio.ensure_future(self._run_flusher())
+
+    async def close(self, app=None):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+            self._ready = None
+
+        await self.flush()
+
+    async def on_response_prepare(self, request, response):
+        memo = request.get(SESSION_MEMO_KEY)
+        if memo is None:
+            return
+
+        session = memo.result()
+        if not isinstance(session, ServerSession):
+            return
+
+        if session.invalidated:
+            if not session.new:
+                add_cookie_header(response, self.cookie_name, "", max_age=0)
+        elif session.dirty and (session.new or session.replaced_sid):
+            add_cookie_header(response, self.cookie_name, session.sid,
+                              max_age=self.max_age)
+
+        self.save(session)
+
+
+def new_session_id():
+    return secrets.token_urlsafe(24)
+
+
+def add_cookie_header(response, name, value, *, max_age=None, path="/"):
+    """
+    Add the Set-Cookie header to the response being prepared, whose cookies
+    have already been turned into the headers.
+    """
+
+    cookie = SimpleCookie()
+    cookie[name] = value
+    morsel = cookie[name]
+    morsel["path"] = path
+    morsel["httponly"] = True
+    if max_age is not None:
+        morsel["max-age"] = str(max_age)
+        if max_age == 0:
+            morsel["expires"] = "Thu, 01 Jan 1970 00:00:00 GMT"
+
+    response.headers.add(hdrs.SET_COOKIE, morsel.OutputString())
+
+
+def setup_session_store(app, store=None, **options):
+    """
+    Install the server-side SessionStore, or one of the options with a
+    MemorySessionBackend, as the session factory of the application.
+    """
+
+    if store is None:
+        store = SessionStore(**options)
+
+    app[SESSION_FATORY] = store
+    app[SESSION_STORE] = store
+
+    app.on_startup.append(store.start)
+    app.on_cleanup.append(store.close)
+    app.on_response_prepare.append(store.on_response_prepare)
+
+    return store
@@ -0,0 +1,116 @@
+import logging
+from aiohttp import web
+from .serializers import request_json_serializer
+from .compression import get_compression_policy
+
+redbean_logger = logging.getLogger("redbean")
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+# 累积到该大小后再写入，减少小行数据的写调用次数
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def is_async_iterable(obj):
+    return hasattr(obj, "__aiter__")
+
+
+def accepts_ndjson(request):
+    accept = request.headers.get("Accept", "")
+    return NDJSON_CONTENT_TYPE in accept
+
+
+async def stream_json_response(request, items, *,
+                               chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Stream the rows of an async iterable as NDJSON if the client accepts
+    'application/x-ndjson', otherwise as an incrementally written JSON array.
+
+    The rows are encoded one by one and written in chunks. Each write waits
+    for the transport to drain, so a slow client holds back the generator.
+    If the client disconnects, the handler task is cancelled or the write
+    fails, and the generator is closed. Errors raised before the first row
+    propagate normally; later ones raise StreamAbortedError, which aborts
+    the connection so the client sees an incomplete payload. The stream is
+    gzipped if the application is set up with setup_compression.
+    """
+
+    dumps = request_json_serializer(request).dumps
+    iterator = items.__aiter__()
+    try:
+        # 在发送响应头之前取得首行，以便生成器的早期异常仍能返回错误响应
+        try:
+            first_item = await iterator.__anext__()
+        except StopAsyncIteration:
+            first_item = _EMPTY
+
+        if accepts_ndjson(request):
+            content_type = NDJSON_CONTENT_TYPE
+            head, separator, tail = b"", b"\n", b"\n"
+        else:
+            content_type = "application/json"
+            head, separator, tail = b"[", b",\n", b"]"
+
+        response = web.StreamResponse()
+        response.content_type = content_type
+        response.enable_chunked_encoding()
+
+        compression = get_compression_policy(request)
+        if compression is not None:
+            compression.enable_stream_compression(request, response)
+
+        await response.prepare(request)
+
+    except BaseException:
+        await _close_iterator(iterator)
+        raise
+
+    try:
+        if first_item is _EMPTY:
+            await response.write(b"[]" if head else b"")
+            await response.write_eof()
+            return response
+
+        buffer = [head, dumps(first_item)]
+        buffered = len(buffer[1])
+        async for item in iterator:
+            data = dumps(item)
+            buffer.append(separator)
+            buffer.append(data)
+            buffered += len(data)
+            if buffered >= chunk_size:
+                await response.write(b"".join(buffer))
+                buffer.clear()
+                buffered = 0
+
+        buffer.append(tail)
+        await response.write(b"".join(buffer))
+        await response.write_eof()
+        return response
+
+    except ConnectionResetError:
+        redbean_logger.info(f"Client disconnected while streaming "
+                            f"{request.method} {request.path}")
+        return response
+
+    except Exception as exc:
+        # 响应头已经发出，无法再返回错误响应，只能中断连接
+        raise StreamAbortedError(
+            f"Streaming {request.method} {request.path} aborted: {exc}"
+        ) from exc
+
+    finally:
+        await _close_iterator(iterator)
+
+
+class StreamAbortedError(Exception):
+    """The streaming response was interrupted after its headers were sent"""
+
+
+async def _close_iterator(iterator):
+    aclose = getattr(iterator, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+
+_EMPTY = object()
@@ -19,6 +19,12 @@ setuptools.setup(
         "cryptography>=3.3",
         "watchgod>=0.6",
     ],
+    extras_require={
+        "orjson": ["orjson>=3.5"],
+        "brotli": ["brotli"],
+        "zstd": ["zstandard"],
+        "cbor": ["cbor2>=5"],
+    },
     classifiers=[
         "Development Status :: 2 - Pre-Alpha",
         "Intended Audience :: Developers",
@@ -173,6 +173,22 @@ def test_dataclass():
 
     assert_encode(E([D("A"), D("B")], {"c": D("c")}), E)
 
+def test_dataclass_missing_optional_field():
+    encoder = DObjectCBOREncoder()
+
+    @dataclass
+    class F:
+        name: str
+        note: Optional[str]
+
+    # 旧版本生产的消息没有新增的字段
+    decoded = encoder.decode(encoder.encode({"name": "a"}), F)
+    assert decoded == F("a", None)
+
+    with pytest.raises(IncompliantError):
+        encoder.decode(encoder.encode({"name": "abc"}), List[str])
+
+
 def test_enum():
 
     class State1(Enum):
@@ -0,0 +1,117 @@
+import asyncio
+import pytest
+from aiohttp import web
+
+from redbean.exception import OverloadedError, DeadlineExceededError
+from redbean.web.routedef import RestServiceDef
+from redbean.web.admission import ConcurrencyLimiter
+from redbean.web.admission import PRIORITY_CRITICAL, PRIORITY_BULK
+
+
+async def test_limiter_queue_and_shed():
+    limiter = ConcurrencyLimiter(1, queue_size=1, queue_timeout=1)
+
+    await limiter.acquire()
+    waiter = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    assert limiter.stats()["waiting"] == 1
+
+    with pytest.raises(OverloadedError):
+        await limiter.acquire()
+
+    limiter.release()
+    await waiter
+    assert limiter.active == 1
+    limiter.release()
+    assert limiter.active == 0
+    assert limiter.shed == 1
+
+
+async def test_limiter_queue_timeout():
+    limiter = ConcurrencyLimiter(1, queue_timeout=0.01)
+    await limiter.acquire()
+    with pytest.raises(OverloadedError) as exc_info:
+        await limiter.acquire()
+    assert exc_info.value.retry_after == 1
+    assert limiter.stats()["waiting"] == 0
+
+
+async def test_limiter_priority():
+    limiter = ConcurrencyLimiter(1, queue_size=1, queue_timeout=1)
+    await limiter.acquire()
+
+    bulk = asyncio.ensure_future(limiter.acquire(PRIORITY_BULK))
+    await asyncio.sleep(0)
+    critical = asyncio.ensure_future(limiter.acquire(PRIORITY_CRITICAL))
+    await asyncio.sleep(0)
+
+    with pytest.raises(OverloadedError):
+        await bulk  # 被高优先级的请求挤出队列
+
+    limiter.release()
+    await critical
+    assert limiter.active == 1
+
+
+async def test_limiter_aimd():
+    limiter = ConcurrencyLimiter(10, adaptive=True, latency_target=0.1)
+    await limiter.acquire()
+    limiter.release(0.5)
+    assert int(limiter.limit) == 9
+
+    await limiter.acquire()
+    limiter.release(0.01)
+    assert limiter.limit > 9
+
+
+async def test_limiter_raise_admits_waiters():
+    limiter = ConcurrencyLimiter(2, queue_size=4, adaptive=True,
+                                 latency_target=1)
+    await limiter.acquire()
+    await limiter.acquire()
+    waiters = [asyncio.ensure_future(limiter.acquire()) for _ in range(3)]
+    await asyncio.sleep(0)
+
+    limiter.limit = 4.0
+    limiter.release(0.01)  # 限额提高后，一次唤醒多个等待者
+    await asyncio.wait_for(asyncio.gather(*waiters), 0.5)
+    assert limiter.active == 4
+
+
+async def test_limiter_timeout_is_failure():
+    limiter = ConcurrencyLimiter(10, adaptive=True, latency_target=1)
+
+    async def _handler(request):
+        raise DeadlineExceededError("timeout")
+
+    with pytest.raises(DeadlineExceededError):
+        await limiter.wrap(_handler)(None)
+    assert int(limiter.limit) == 9
+
+
+services = RestServiceDef(prefix="/api")
+
+
+@services.get("/export", max_concurrency=1)
+async def export():
+    await asyncio.sleep(0.2)
+    return {}
+
+
+def create_app(loop):
+    app = web.Application()
+    app.add_routes(services)
+    return app
+
+
+async def test_route_sheds_with_retry_after(aiohttp_client):
+    export.limiter.queue_size = 0
+    client = await aiohttp_client(create_app)
+
+    first = asyncio.ensure_future(client.get('/api/export'))
+    await asyncio.sleep(0.05)
+    resp = await client.get('/api/export')
+    assert resp.status == 503
+    assert resp.headers["Retry-After"] == "1"
+
+    assert (await first).status == 200
@@ -0,0 +1,98 @@
+from dataclasses import dataclass
+from aiohttp import web
+
+from redbean.exception import NotFoundError
+from redbean.web.routedef import RestServiceDef
+from redbean.web.idempotency import setup_idempotency_store
+
+services = RestServiceDef(prefix="/api")
+
+
+@dataclass
+class Note:
+    text: str
+
+
+@services.get("/users/{uid}")
+async def get_user(uid: int, detail: bool):
+    if uid == 0:
+        raise NotFoundError("no user")
+    return {"uid": uid, "detail": detail}
+
+
+@services.post("/notes")
+async def post_note(note: Note):
+    return {"text": note.text}
+
+
+counters = []
+
+
+@services.post("/counters", idempotent=True)
+async def post_counter(name: str):
+    counters.append(name)
+    return {"name": name, "count": len(counters)}
+
+
+@services.get("/rows")
+async def get_rows():
+    yield {}
+
+
+services.add_batch_route(max_operations=5)
+
+
+def create_app(loop):
+    app = web.Application()
+    app.add_routes(services)
+    setup_idempotency_store(app)
+    return app
+
+
+async def test_batch_operations(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    resp = await client.post('/api/batch', json=[
+        {"path": "/api/users/1", "args": {"detail": "t"}},
+        {"method": "GET", "path": "/api/users/0"},
+        {"method": "POST", "path": "/api/notes", "body": {"text": "hi"}},
+        {"path": "/api/missing"},
+        {"path": "/api/rows"},
+    ])
+    assert resp.status == 200
+    results = await resp.json()
+    assert results[0] == {"status": 200,
+                          "body": {"uid": 1, "detail": True}}
+    assert results[1]["status"] == 404
+    assert results[1]["body"]["error"] == "NotFound"
+    assert results[2] == {"status": 200, "body": {"text": "hi"}}
+    assert results[3] == {"status": 404, "body": None}
+    assert results[4]["status"] == 404  # 流式路由不能批量调用
+
+
+async def test_batch_rejects_malformed(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    resp = await client.post('/api/batch', json={"path": "/api/users/1"})
+    assert resp.status == 400
+
+    resp = await client.post('/api/batch',
+                             json=[{"path": "/api/users/1"}] * 6)
+    assert resp.status == 400
+
+    resp = await client.post('/api/batch',
+                             json=[{"method": 1, "path": "/api/users/1"}])
+    assert resp.status == 400
+
+
+async def test_batch_idempotency_key_per_operation(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    counters.clear()
+    operations = [
+        {"method": "POST", "path": "/api/counters", "args": {"name": "a"}},
+        {"method": "POST", "path": "/api/counters", "args": {"name": "b"}},
+    ]
+    resp = await client.post('/api/batch', json=operations,
+                             headers={"Idempotency-Key": "k1"})
+    results = await resp.json()
+    assert [r["status"] for r in results] == [200, 200]
+    assert sorted(r["body"]["name"] for r in results) == ["a", "b"]
+    assert sorted(counters) == ["a", "b"]
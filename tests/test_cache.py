@@ -0,0 +1,145 @@
+import asyncio
+from typing import List
+from aiohttp import web
+
+from redbean.web.routedef import RestServiceDef
+
+services = RestServiceDef(prefix="/api")
+
+calls = []
+
+
+@services.get("/refs/{kind}", ttl=60, vary=["Accept-Language"], cache_size=2)
+async def get_refs(kind: str, page: int):
+    calls.append((kind, page))
+    return {"kind": kind, "page": page}
+
+
+def create_app(loop):
+    app = web.Application()
+    app.add_routes(services)
+    return app
+
+
+async def test_cache_hit_and_etag(aiohttp_client):
+    calls.clear()
+    get_refs.response_cache.invalidate()
+    client = await aiohttp_client(create_app)
+
+    resp = await client.get('/api/refs/color?page=1')
+    assert resp.status == 200
+    assert await resp.json() == {"kind": "color", "page": 1}
+    etag = resp.headers["ETag"]
+    assert resp.headers["Cache-Control"].startswith("max-age=")
+
+    resp = await client.get('/api/refs/color?page=1')
+    assert resp.headers["ETag"] == etag
+    assert calls == [("color", 1)]
+
+    resp = await client.get('/api/refs/color?page=1',
+                            headers={"If-None-Match": etag})
+    assert resp.status == 304
+    assert calls == [("color", 1)]
+
+    resp = await client.get('/api/refs/color?page=1',
+                            headers={"Accept-Language": "zh"})
+    assert calls == [("color", 1), ("color", 1)]
+
+    stats = get_refs.response_cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+
+
+async def test_cache_eviction_and_invalidation(aiohttp_client):
+    calls.clear()
+    cache = get_refs.response_cache
+    cache.invalidate()
+    client = await aiohttp_client(create_app)
+
+    for page in (1, 2, 3):
+        await client.get(f'/api/refs/color?page={page}')
+    assert len(cache) == 2
+    assert cache.evictions >= 1
+
+    cache.invalidate(page=3)
+    await client.get('/api/refs/color?page=3')
+    assert calls[-1] == ("color", 3)
+    assert len(calls) == 4
+
+
+@services.get("/colors", ttl=60)
+async def get_colors(ids: List[int]):
+    calls.append(("colors", ids))
+    return {"ids": ids}
+
+
+async def test_cache_list_argument(aiohttp_client):
+    calls.clear()
+    client = await aiohttp_client(create_app)
+
+    for _ in range(2):
+        resp = await client.get('/api/colors?ids=1&ids=2')
+        assert resp.status == 200
+        assert await resp.json() == {"ids": [1, 2]}
+    assert calls == [("colors", [1, 2])]
+
+    get_colors.response_cache.invalidate(ids=[1, 2])
+    assert len(get_colors.response_cache) == 0
+
+
+slow_calls = []
+
+
+@services.get("/reports/{year}", coalesce=True)
+async def get_report(year: int):
+    slow_calls.append(year)
+    await asyncio.sleep(0.1)
+    return {"year": year}
+
+
+async def test_coalesce_identical_calls(aiohttp_client):
+    slow_calls.clear()
+    client = await aiohttp_client(create_app)
+
+    responses = await asyncio.gather(*[
+        client.get('/api/reports/2021') for _ in range(5)])
+    assert [r.status for r in responses] == [200] * 5
+    for resp in responses:
+        assert await resp.json() == {"year": 2021}
+
+    assert slow_calls == [2021]
+    assert get_report.single_flight.coalesced == 4
+    assert len(get_report.single_flight) == 0
+
+
+async def test_coalesce_survives_cancelled_caller(aiohttp_client):
+    slow_calls.clear()
+    client = await aiohttp_client(create_app)
+
+    first = asyncio.ensure_future(client.get('/api/reports/2022'))
+    await asyncio.sleep(0.02)
+    second = asyncio.ensure_future(client.get('/api/reports/2022'))
+    await asyncio.sleep(0.02)
+    first.cancel()
+
+    resp = await second
+    assert await resp.json() == {"year": 2022}
+    assert slow_calls == [2022]
+
+
+@services.get("/summaries", coalesce=True)
+async def get_summaries(years: List[int]):
+    slow_calls.append(years)
+    await asyncio.sleep(0.05)
+    return {"years": years}
+
+
+async def test_coalesce_list_argument(aiohttp_client):
+    slow_calls.clear()
+    client = await aiohttp_client(create_app)
+
+    responses = await asyncio.gather(*[
+        client.get('/api/summaries?years=2020&years=2021') for _ in range(3)])
+    for resp in responses:
+        assert await resp.json() == {"years": [2020, 2021]}
+    assert slow_calls == [[2020, 2021]]
@@ -0,0 +1,126 @@
+import gzip
+from aiohttp import web
+
+from redbean.web.routedef import RestServiceDef
+from redbean.web.compression import setup_compression, parse_accept_encoding
+from redbean.web.compression import CompressionPolicy
+
+services = RestServiceDef(prefix="/api")
+
+calls = []
+
+
+@services.get("/items")
+async def list_items(n: int):
+    return [{"sn": i, "name": f"item-{i}"} for i in range(n)]
+
+
+@services.get("/export")
+async def export_items(n: int):
+    for i in range(n):
+        yield {"sn": i, "name": f"item-{i}"}
+
+
+@services.get("/cached/{n}", ttl=60)
+async def cached_items(n: int):
+    calls.append(n)
+    return [{"sn": i, "name": f"item-{i}"} for i in range(n)]
+
+
+def create_app(loop):
+    app = web.Application()
+    app.add_routes(services)
+    setup_compression(app, min_size=256, encodings=["gzip"])
+    return app
+
+
+async def test_compress_large_response(aiohttp_client):
+    client = await aiohttp_client(create_app)
+
+    resp = await client.get('/api/items?n=100',
+                            headers={"Accept-Encoding": "gzip"})
+    assert resp.status == 200
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in resp.headers["Vary"]
+    assert len(await resp.json()) == 100
+
+    resp = await client.get('/api/items?n=1',
+                            headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in resp.headers
+
+    resp = await client.get('/api/items?n=100',
+                            headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in resp.headers
+    assert len(await resp.json()) == 100
+
+
+async def test_compress_stream(aiohttp_client):
+    client = await aiohttp_client(create_app)
+
+    resp = await client.get('/api/export?n=1000',
+                            headers={"Accept-Encoding": "gzip"})
+    assert resp.status == 200
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in resp.headers["Vary"]
+    assert len(await resp.json()) == 1000
+
+    resp = await client.get('/api/export?n=10',
+                            headers={"Accept-Encoding": "br"})
+    assert "Content-Encoding" not in resp.headers
+    assert len(await resp.json()) == 10
+
+
+async def test_compress_in_executor(aiohttp_client):
+    def create_app(loop):
+        app = web.Application()
+        app.add_routes(services)
+        setup_compression(app, min_size=256, encodings=["gzip"],
+                          executor_size=1024)
+        return app
+
+    client = await aiohttp_client(create_app)
+    resp = await client.get('/api/items?n=1000',
+                            headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert len(await resp.json()) == 1000
+
+
+async def test_cached_compressed_variant(aiohttp_client):
+    calls.clear()
+    cached_items.response_cache.invalidate()
+    client = await aiohttp_client(create_app)
+
+    resp = await client.get('/api/cached/100',
+                            headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["Content-Encoding"] == "gzip"
+    gzip_etag = resp.headers["ETag"]
+
+    resp = await client.get('/api/cached/100',
+                            headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in resp.headers
+    assert resp.headers["ETag"] != gzip_etag
+
+    entry = next(iter(cached_items.response_cache._entries.values()))
+    body, _ = entry.variants["gzip"]
+    assert gzip.decompress(body) == entry.body
+
+    resp = await client.get('/api/cached/100',
+                            headers={"Accept-Encoding": "gzip",
+                                     "If-None-Match": gzip_etag})
+    assert resp.status == 304
+    assert calls == [100]
+
+
+def test_negotiate_encoding():
+    assert parse_accept_encoding("gzip;q=0.5, br") == {"gzip": 0.5, "br": 1.0}
+
+    policy = CompressionPolicy(encodings=["gzip"])
+
+    class _Request:
+        def __init__(self, accept_encoding):
+            self.headers = {"Accept-Encoding": accept_encoding}
+
+    assert policy.negotiate(_Request("br, gzip")) == "gzip"
+    assert policy.negotiate(_Request("gzip;q=0")) is None
+    assert policy.negotiate(_Request("*")) == "gzip"
+    assert policy.negotiate(_Request("")) is None
@@ -0,0 +1,42 @@
+import os
+import pytest
+
+from redbean.config import ConfigRegistry
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    stat = path.stat()
+    # 保证修改时间变化，不依赖文件系统的时间精度
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_config_registry(tmp_path):
+    write(tmp_path / "db.toml", 'host = "localhost"\n[pool]\nsize = 4\n')
+    write(tmp_path / "db.development.toml", '[pool]\nsize = 8\n')
+    write(tmp_path / "secrets" / "db.toml", 'password = "s"\nhosts = ["a"]\n')
+
+    registry = ConfigRegistry(tmp_path)
+    conf = registry.get("db")
+    assert conf == {"host": "localhost", "pool": {"size": 8},
+                    "password": "s", "hosts": ("a",)}
+    assert registry.get("db") is conf  # 文件未变化时不重新解析
+
+    with pytest.raises(TypeError):
+        conf["host"] = "x"
+    with pytest.raises(TypeError):
+        conf["pool"]["size"] = 1
+
+    notified = []
+    registry.subscribe("db", lambda name, view: notified.append(view))
+    assert registry.reload() == []
+
+    write(tmp_path / "db.development.toml", '[pool]\nsize = 16\n')
+    assert registry.reload() == ["db"]
+    assert notified[0]["pool"]["size"] == 16
+    assert registry.get("db") is notified[0]
+
+    assert ConfigRegistry(tmp_path, production=True).get("db")["pool"] == {
+        "size": 4}
+    assert registry.get("missing") == {}
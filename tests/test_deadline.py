@@ -0,0 +1,52 @@
+import asyncio
+from aiohttp import web
+
+from redbean.web.routedef import RestServiceDef
+
+services = RestServiceDef(prefix="/api")
+
+cancelled = []
+
+
+@services.get("/slow/{ms}", timeout=0.1,
+              deadline_header="X-Request-Timeout")
+async def slow(ms: int, deadline):
+    budget = deadline.remaining()
+    try:
+        await asyncio.sleep(ms / 1000)
+    except asyncio.CancelledError:
+        cancelled.append(ms)
+        raise
+    return {"budget": budget}
+
+
+def create_app(loop):
+    app = web.Application()
+    app.add_routes(services)
+    return app
+
+
+async def test_within_deadline(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    resp = await client.get('/api/slow/0')
+    assert resp.status == 200
+    assert 0 < (await resp.json())["budget"] <= 0.1
+
+
+async def test_deadline_exceeded(aiohttp_client):
+    cancelled.clear()
+    client = await aiohttp_client(create_app)
+    resp = await client.get('/api/slow/1000')
+    assert resp.status == 504
+    assert cancelled == [1000]
+
+
+async def test_deadline_from_header(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    resp = await client.get('/api/slow/50',
+                            headers={"X-Request-Timeout": "0.01"})
+    assert resp.status == 504
+
+    resp = await client.get('/api/slow/0',
+                            headers={"X-Request-Timeout": "10"})
+    assert (await resp.json())["budget"] <= 0.1
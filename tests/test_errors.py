@@ -0,0 +1,68 @@
+import json
+import logging
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+from redbean.exception import NotFoundError
+from redbean.web.rest import make_json_error_response
+from redbean.web.errors import ErrorReporter, setup_error_reporter
+
+
+def _raise(exc):
+    try:
+        raise exc
+    except Exception as e:
+        return e
+
+
+def test_development_error_response():
+    app = web.Application()
+    setup_error_reporter(app, production=False)
+    request = make_mocked_request("GET", "/", app=app)
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError as exc:
+        resp = make_json_error_response(exc, request)
+
+    assert resp.status == 500
+    data = json.loads(resp.text)
+    assert "Traceback" in data["details"]
+
+
+def test_production_error_response(caplog):
+    app = web.Application()
+    setup_error_reporter(app, production=True)
+    request = make_mocked_request("GET", "/", app=app)
+
+    with caplog.at_level(logging.DEBUG, logger="redbean"):
+        resp = make_json_error_response(_raise(NotFoundError("no item")),
+                                        request)
+    assert resp.status == 404
+    assert json.loads(resp.body) == {
+        "status": 404, "error": "NotFound", "message": "no item"}
+    assert all(r.exc_info is None for r in caplog.records)
+
+    resp = make_json_error_response(_raise(RuntimeError("secret")), request)
+    assert resp.status == 500
+    data = json.loads(resp.body)
+    assert "details" not in data
+    assert "secret" not in data["message"]
+
+    # 其他应用仍是开发模式
+    other = make_mocked_request("GET", "/", app=web.Application())
+    resp = make_json_error_response(_raise(RuntimeError("boom")), other)
+    assert "details" in json.loads(resp.body)
+
+
+def test_server_errors_rate_limited(caplog):
+    reporter = ErrorReporter(rate_limit=2, sample_rate=0.0)
+
+    with caplog.at_level(logging.ERROR, logger="redbean"):
+        for _ in range(10):
+            try:
+                raise RuntimeError("boom")
+            except RuntimeError as exc:
+                reporter.report(exc, 500, "ServerError", str(exc))
+
+    assert len(caplog.records) == 2
+    assert caplog.records[0].exc_info is not None
@@ -0,0 +1,130 @@
+import os
+import time
+import asyncio
+import functools
+import threading
+import pytest
+from aiohttp import web
+
+from redbean.exception import OverloadedError
+from redbean.web.routedef import RestServiceDef
+from redbean.web.metrics import setup_metrics
+from redbean.web.executors import ManagedExecutor, setup_executors
+
+services = RestServiceDef(prefix="/api")
+
+
+@services.get("/sync/{n}")
+def sync_handler(n: int):
+    return {"n": n, "thread": threading.current_thread().name}
+
+
+@services.get("/fib/{n}", executor="process")
+async def fib_handler(n: int):
+    a, b = 0, 1
+    for _ in range(n):
+        a, b = b, a + b
+    return {"fib": a, "pid": os.getpid()}
+
+
+def traced(func):
+    @functools.wraps(func)
+    def _traced(*args, **kwargs):
+        return func(*args, **kwargs)
+    return _traced
+
+
+@services.get("/wrapped")
+@traced
+async def wrapped_handler():
+    return {"thread": threading.current_thread().name}
+
+
+def create_app(loop):
+    app = web.Application()
+    app.add_routes(services)
+    setup_executors(app, thread_workers=2, process_workers=1)
+    setup_metrics(app)
+    return app
+
+
+async def test_sync_handler_in_thread_pool(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    resp = await client.get('/api/sync/3')
+    data = await resp.json()
+    assert data["n"] == 3
+    assert data["thread"].startswith("redbean")
+
+
+async def test_wrapped_async_handler_on_loop(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    resp = await client.get('/api/wrapped')
+    data = await resp.json()
+    assert data["thread"] == threading.current_thread().name
+
+
+async def test_handler_in_process_pool(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    resp = await client.get('/api/fib/10')
+    data = await resp.json()
+    assert data["fib"] == 55
+    assert data["pid"] != os.getpid()
+
+    resp = await client.get('/metrics')
+    text = await resp.text()
+    assert 'redbean_executor_submitted_total{executor="process"} 1' in text
+
+
+def test_process_pool_rejects_unpicklable_arguments():
+    with pytest.raises(ValueError):
+        @services.get("/bad", executor="process")
+        def bad_handler(request):
+            return {}
+
+
+async def test_executor_max_pending():
+    managed = ManagedExecutor("thread", max_workers=1, max_pending=0)
+    with pytest.raises(OverloadedError):
+        await managed.run(sync_handler, {"n": 1})
+    assert managed.rejected == 1
+
+
+def square(n):
+    if n < 0:
+        raise ValueError("negative")
+    return n * n
+
+
+async def test_executor_counts_failures():
+    managed = ManagedExecutor("thread", max_workers=1)
+    assert await managed.run(square, {"n": 3}) == 9
+    with pytest.raises(ValueError):
+        await managed.run(square, {"n": -1})
+
+    stats = managed.stats()
+    assert stats["submitted"] == 2
+    assert stats["succeeded"] == 1
+    assert stats["failed"] == 1
+    managed.shutdown()
+
+
+def sleep(seconds):
+    time.sleep(seconds)
+
+
+async def test_executor_pending_until_finished():
+    managed = ManagedExecutor("thread", max_workers=1, max_pending=1)
+    call = asyncio.ensure_future(managed.run(sleep, {"seconds": 0.1}))
+    await asyncio.sleep(0.01)
+    call.cancel()
+    await asyncio.sleep(0)
+
+    # 工作线程仍在执行，不能接受新的调用
+    assert managed.pending == 1
+    with pytest.raises(OverloadedError):
+        await managed.run(square, {"n": 1})
+
+    await asyncio.sleep(0.15)
+    assert managed.pending == 0
+    assert await managed.run(square, {"n": 2}) == 4
+    managed.shutdown()
@@ -0,0 +1,81 @@
+import asyncio
+from dataclasses import dataclass
+from aiohttp import web
+
+from redbean.reactive import Topic
+from redbean.web.routedef import RestServiceDef
+from redbean.web.fanout import TopicBroadcast
+
+services = RestServiceDef(prefix="/api")
+
+
+@dataclass
+class Quote:
+    symbol: str
+    price: float
+
+
+topic = Topic("market")
+quotes = TopicBroadcast(topic, "quotes", Quote, queue_size=4)
+
+services.add_sse_route("/quotes/events", quotes)
+services.add_websocket_route("/quotes/ws", quotes)
+
+
+def create_app(loop):
+    app = web.Application()
+    app.add_routes(services)
+    return app
+
+
+async def wait_clients(broadcast, count):
+    while len(broadcast) < count:
+        await asyncio.sleep(0.01)
+
+
+def test_one_listener_per_broadcast():
+    assert len(topic._listeners) == 1
+    listener = topic._listeners[0]
+    assert listener.topic_expr == "quotes"
+    assert listener.group_id == "redbean.web.fanout.market.quotes"
+    assert not listener.durable
+
+
+async def test_sse_and_websocket(aiohttp_client):
+    client = await aiohttp_client(create_app)
+
+    resp = await client.get('/api/quotes/events')
+    assert resp.headers["Content-Type"] == "text/event-stream"
+    ws = await client.ws_connect('/api/quotes/ws')
+    await wait_clients(quotes, 2)
+
+    quotes.publish(Quote("ABC", 1.5))
+
+    line = await resp.content.readline()
+    assert line == b'data: {"symbol": "ABC", "price": 1.5}\n'
+
+    msg = await ws.receive_json()
+    assert msg == {"symbol": "ABC", "price": 1.5}
+
+    await ws.close()
+    resp.close()
+
+
+async def test_slow_client_overflow():
+    broadcast = TopicBroadcast(queue_size=2)
+    slow = broadcast.subscribe()
+    for i in range(3):
+        broadcast.publish({"i": i})
+
+    assert slow.closed
+    assert broadcast.dropped == 1
+    assert len(broadcast) == 0
+
+    conflating = TopicBroadcast(queue_size=2, overflow="conflate")
+    client = conflating.subscribe()
+    for i in range(3):
+        conflating.publish({"i": i})
+
+    messages = await client.get_all()
+    assert [m.payload for m in messages] == [b'{"i": 1}', b'{"i": 2}']
+    assert conflating.conflated == 1
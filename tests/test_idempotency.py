@@ -0,0 +1,87 @@
+import asyncio
+from aiohttp import web
+
+from redbean.web.routedef import RestServiceDef
+from redbean.web.idempotency import setup_idempotency_store
+
+services = RestServiceDef(prefix="/api")
+
+orders = []
+
+
+@services.post("/orders", idempotent=True)
+async def create_order(json_request):
+    await asyncio.sleep(0.05)
+    orders.append(json_request)
+    return {"sn": len(orders)}
+
+
+@services.post("/carts", idempotent=True)
+async def create_cart(json_request):
+    orders.append(json_request)
+    response = web.json_response({"sn": len(orders)}, status=201,
+                                 headers={"Location": f"/carts/{len(orders)}"})
+    response.set_cookie("cart", str(len(orders)))
+    return response
+
+
+def create_app(loop):
+    app = web.Application()
+    app.add_routes(services)
+    setup_idempotency_store(app, ttl=60)
+    return app
+
+
+async def test_replay_stored_response(aiohttp_client):
+    orders.clear()
+    client = await aiohttp_client(create_app)
+
+    headers = {"Idempotency-Key": "k1"}
+    resp = await client.post('/api/orders', json={"n": 1}, headers=headers)
+    assert await resp.json() == {"sn": 1}
+    assert "Idempotent-Replayed" not in resp.headers
+
+    resp = await client.post('/api/orders', json={"n": 1}, headers=headers)
+    assert await resp.json() == {"sn": 1}
+    assert resp.headers["Idempotent-Replayed"] == "true"
+    assert len(orders) == 1
+
+    resp = await client.post('/api/orders', json={"n": 2}, headers=headers)
+    assert resp.status == 400
+
+    resp = await client.post('/api/orders', json={"n": 1})
+    assert await resp.json() == {"sn": 2}
+
+
+async def test_concurrent_duplicates(aiohttp_client):
+    orders.clear()
+    client = await aiohttp_client(create_app)
+
+    executions = create_order.idempotency.executions
+    headers = {"Idempotency-Key": "k2"}
+    responses = await asyncio.gather(*[
+        client.post('/api/orders', json={"n": 1}, headers=headers)
+        for _ in range(3)])
+
+    assert [await resp.json() for resp in responses] == [{"sn": 1}] * 3
+    assert len(orders) == 1
+    assert create_order.idempotency.executions == executions + 1
+
+
+async def test_replay_headers_and_scope(aiohttp_client):
+    orders.clear()
+    client = await aiohttp_client(create_app)
+
+    headers = {"Idempotency-Key": "k3", "Authorization": "Bearer alice"}
+    for _ in range(2):
+        resp = await client.post('/api/carts', json={}, headers=headers)
+        assert resp.status == 201
+        assert resp.headers["Location"] == "/carts/1"
+        assert resp.cookies["cart"].value == "1"
+    assert resp.headers["Idempotent-Replayed"] == "true"
+
+    # 其他用户使用相同的键不能取得别人的响应
+    headers = {"Idempotency-Key": "k3", "Authorization": "Bearer bob"}
+    resp = await client.post('/api/carts', json={}, headers=headers)
+    assert resp.headers["Location"] == "/carts/2"
+    assert "Idempotent-Replayed" not in resp.headers
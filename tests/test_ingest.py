@@ -0,0 +1,153 @@
+import json
+import pytest
+from typing import AsyncIterator
+from dataclasses import dataclass
+from aiohttp import web
+
+from redbean.web.routedef import RestServiceDef
+from redbean.web.ingest import JSONArraySplitter
+
+services = RestServiceDef(prefix="/api")
+
+
+@dataclass
+class Row:
+    sn: int
+    name: str
+
+
+@services.post("/rows", max_body_size=64 * 1024)
+async def import_rows(body_stream: AsyncIterator[Row]):
+    count = 0
+    async for row in body_stream:
+        assert isinstance(row, Row)
+        count += 1
+    return {"count": count}
+
+
+@services.post("/files")
+async def upload_file(body_stream):
+    spooled = await body_stream.spool(max_memory_size=16)
+    with spooled:
+        return {"size": len(spooled.read()),
+                "received": body_stream.received}
+
+
+@services.post("/notes", max_body_size=16)
+async def post_note(json_request: dict):
+    return json_request
+
+
+services.add_batch_route()
+
+
+def create_app(loop):
+    app = web.Application()
+    app.add_routes(services)
+    return app
+
+
+def make_rows(n):
+    return [{"sn": i, "name": f"row {i}, \"[{i}]\""} for i in range(n)]
+
+
+def test_split_json_array():
+    data = json.dumps([{"a": [1, {"b": "x,]\\\""}]}, 2, "s"]).encode()
+
+    splitter = JSONArraySplitter()
+    items = []
+    for i in range(len(data)):
+        items.extend(splitter.feed(data[i:i + 1]))
+    splitter.finish()
+
+    assert [json.loads(item) for item in items] == [
+        {"a": [1, {"b": "x,]\\\""}]}, 2, "s"]
+
+
+async def test_stream_json_array(aiohttp_client):
+    client = await aiohttp_client(create_app)
+
+    async def _body():
+        data = json.dumps(make_rows(500)).encode()
+        for i in range(0, len(data), 1000):
+            yield data[i:i + 1000]
+
+    resp = await client.post('/api/rows', data=_body(),
+                             headers={"Content-Type": "application/json"})
+    assert resp.status == 200
+    assert await resp.json() == {"count": 500}
+
+
+async def test_stream_ndjson(aiohttp_client):
+    client = await aiohttp_client(create_app)
+
+    data = "\n".join(json.dumps(row) for row in make_rows(10))
+    resp = await client.post('/api/rows', data=data, headers={
+        "Content-Type": "application/x-ndjson"})
+    assert await resp.json() == {"count": 10}
+
+
+async def test_reject_malformed_stream(aiohttp_client):
+    client = await aiohttp_client(create_app)
+
+    resp = await client.post('/api/rows', data='[{"sn": 1, "name": "a"}',
+                             headers={"Content-Type": "application/json"})
+    assert resp.status == 400
+
+    resp = await client.post('/api/rows', data='{"sn": 1}',
+                             headers={"Content-Type": "application/json"})
+    assert resp.status == 400
+
+
+async def test_body_size_limit(aiohttp_client):
+    client = await aiohttp_client(create_app)
+
+    resp = await client.post('/api/rows', json=make_rows(2000))
+    assert resp.status == 413
+
+    async def _body():
+        data = json.dumps(make_rows(2000)).encode()
+        for i in range(0, len(data), 4096):
+            yield data[i:i + 4096]
+
+    # 分块传输的请求体没有 Content-Length，读取时才能发现超限
+    resp = await client.post('/api/rows', data=_body(),
+                             headers={"Content-Type": "application/json"})
+    assert resp.status == 413
+
+
+async def test_spool_body(aiohttp_client):
+    client = await aiohttp_client(create_app)
+
+    resp = await client.post('/api/files', data=b"x" * 1000)
+    assert await resp.json() == {"size": 1000, "received": 1000}
+
+
+def test_reject_idempotent_body_stream():
+    with pytest.raises(ValueError):
+        @services.post("/uploads", idempotent=True)
+        async def upload(body_stream):
+            pass
+
+
+async def test_buffered_body_size_chunked(aiohttp_client):
+    client = await aiohttp_client(create_app)
+
+    async def _body():
+        yield b'{"text": "'
+        yield b"x" * 1024
+        yield b'"}'
+
+    resp = await client.post('/api/notes', data=_body(),
+                             headers={"Content-Type": "application/json"})
+    assert resp.status == 413
+
+    resp = await client.post('/api/notes', json={"a": 1})
+    assert await resp.json() == {"a": 1}
+
+
+async def test_body_stream_not_batchable(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    resp = await client.post('/api/batch', json=[
+        {"method": "POST", "path": "/api/rows", "body": make_rows(2)}])
+    assert await resp.json() == [{"status": 404, "body": None}]
@@ -0,0 +1,52 @@
+from aiohttp import web
+
+from redbean.exception import NotFoundError
+from redbean.web.routedef import RestServiceDef
+from redbean.web.metrics import RouteMetrics, setup_metrics
+
+services = RestServiceDef(prefix="/api")
+
+
+@services.get("/users/{uid}")
+async def get_user(uid: int):
+    if uid == 0:
+        raise NotFoundError("no user")
+    return {"uid": uid}
+
+
+def create_app(loop):
+    app = web.Application()
+    app.add_routes(services)
+    setup_metrics(app)
+    return app
+
+
+def test_route_metrics_histogram():
+    metrics = RouteMetrics("GET", "/x", buckets=(0.1, 1.0))
+    metrics.observe(0.05, 200)
+    metrics.observe(0.1, 200)
+    metrics.observe(5.0, 503)
+    assert metrics.bucket_counts == [2, 0, 1]
+    assert metrics.status_counts[2] == 2
+    assert metrics.status_counts[5] == 1
+    assert metrics.count == 3
+
+
+async def test_metrics_endpoint(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    await client.get('/api/users/1')
+    await client.get('/api/users/1')
+    await client.get('/api/users/0')
+
+    resp = await client.get('/metrics')
+    assert resp.status == 200
+    assert resp.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    text = await resp.text()
+
+    labels = 'method="GET",route="/api/users/{uid}"'
+    assert f'redbean_http_requests_total{{{labels},status="2xx"}} 2' in text
+    assert f'redbean_http_requests_total{{{labels},status="4xx"}} 1' in text
+    assert f'redbean_http_requests_in_flight{{{labels}}} 0' in text
+    assert (f'redbean_http_request_duration_seconds_bucket'
+            f'{{{labels},le="+Inf"}} 3') in text
+    assert f'redbean_http_request_duration_seconds_count{{{labels}}} 3' in text
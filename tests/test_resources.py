@@ -0,0 +1,206 @@
+import os
+import gzip
+from aiohttp import web
+
+from redbean.web.resources import webapp_static_reources
+from redbean.web.resources import StaticFileCache, StaticManifest
+from redbean.web.resources import bytes_hash
+
+
+def make_site(directory):
+    (directory / "index.html").write_text("<html>index</html>")
+    (directory / "app.js").write_text("console.log('hello');" * 100)
+    (directory / "app.js.gz").write_bytes(
+        gzip.compress((directory / "app.js").read_bytes()))
+    (directory / "assets").mkdir()
+
+
+def create_app(directory):
+    app = web.Application()
+    webapp_static_reources(app, "/", directory)
+    return app
+
+
+async def test_static_precompressed(aiohttp_client, tmp_path):
+    make_site(tmp_path)
+    client = await aiohttp_client(create_app(tmp_path))
+
+    resp = await client.get('/app.js', headers={"Accept-Encoding": "gzip"})
+    assert resp.status == 200
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert resp.headers["Vary"] == "Accept-Encoding"
+    assert resp.headers["Content-Type"].startswith(
+        ("application/javascript", "text/javascript"))
+    assert await resp.text() == "console.log('hello');" * 100
+
+    resp = await client.get('/app.js',
+                            headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in resp.headers
+    assert await resp.text() == "console.log('hello');" * 100
+
+
+async def test_static_conditional(aiohttp_client, tmp_path):
+    make_site(tmp_path)
+    client = await aiohttp_client(create_app(tmp_path))
+
+    resp = await client.get('/index.html')
+    assert await resp.text() == "<html>index</html>"
+    etag = resp.headers["ETag"]
+    last_modified = resp.headers["Last-Modified"]
+
+    resp = await client.get('/index.html', headers={"If-None-Match": etag})
+    assert resp.status == 304
+
+    resp = await client.get('/index.html',
+                            headers={"If-Modified-Since": last_modified})
+    assert resp.status == 304
+
+    # 修改后的文件不再使用缓存
+    (tmp_path / "index.html").write_text("<html>changed</html>")
+    resp = await client.get('/index.html', headers={"If-None-Match": etag})
+    assert resp.status == 200
+    assert await resp.text() == "<html>changed</html>"
+
+
+async def test_static_sidecar_modified(aiohttp_client, tmp_path):
+    make_site(tmp_path)
+    client = await aiohttp_client(create_app(tmp_path))
+
+    resp = await client.get('/app.js', headers={"Accept-Encoding": "gzip"})
+    assert await resp.text() == "console.log('hello');" * 100
+
+    # 只更新了旁路文件，也不再使用缓存
+    sidecar = tmp_path / "app.js.gz"
+    sidecar.write_bytes(gzip.compress(b"console.log('changed');"))
+    stat = sidecar.stat()
+    os.utime(sidecar, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    resp = await client.get('/app.js', headers={"Accept-Encoding": "gzip"})
+    assert await resp.text() == "console.log('changed');"
+
+
+async def test_static_cache_byte_budget(tmp_path):
+    for name in ("a.txt", "b.txt", "c.txt"):
+        (tmp_path / name).write_bytes(b"x" * 1000)
+
+    cache = StaticFileCache(max_bytes=2500)
+    for name in ("a.txt", "b.txt", "c.txt"):
+        await cache.load(name, tmp_path / name)
+
+    assert len(cache) == 2
+    assert cache.nbytes == 2000
+    assert cache.get("a.txt") is None
+    assert cache.get("c.txt") is not None
+
+
+async def test_static_fallback(aiohttp_client, tmp_path):
+    make_site(tmp_path)
+    client = await aiohttp_client(create_app(tmp_path))
+
+    resp = await client.get('/orders/123')
+    assert resp.status == 200
+    assert await resp.text() == "<html>index</html>"
+
+    resp = await client.get('/assets')
+    assert resp.status == 403
+
+
+async def test_static_manifest(aiohttp_client, tmp_path):
+    make_site(tmp_path)
+    (tmp_path / "assets" / "app.js").write_text("let a = 1;")
+    (tmp_path / "report-20210310.pdf").write_bytes(b"%PDF")
+
+    app = web.Application()
+    manifest = webapp_static_reources(app, "/", tmp_path, manifest=True)
+    client = await aiohttp_client(app)
+
+    url = manifest.url_for("assets/app.js")
+    assert url.startswith("/assets/app.") and url.endswith(".js")
+    resp = await client.get(url)
+    assert resp.status == 200
+    assert await resp.text() == "let a = 1;"
+    assert "immutable" in resp.headers["Cache-Control"]
+
+    resp = await client.get('/assets/app.js')
+    assert await resp.text() == "let a = 1;"
+    assert "Cache-Control" not in resp.headers
+
+    # 日期等不是内容哈希的数字，不能永久缓存
+    resp = await client.get('/report-20210310.pdf')
+    assert resp.status == 200
+    assert "Cache-Control" not in resp.headers
+
+    resp = await client.get('/index.html')
+    assert "Cache-Control" not in resp.headers
+    etag = resp.headers["ETag"]
+
+    # 清单建立后不再访问文件系统
+    (tmp_path / "index.html").write_text("<html>changed</html>")
+    resp = await client.get('/index.html', headers={"If-None-Match": etag})
+    assert resp.status == 304
+
+    resp = await client.get('/app.js.gz')
+    assert await resp.text() == "<html>index</html>"
+
+    resp = await client.get('/orders/123')
+    assert await resp.text() == "<html>index</html>"
+
+
+async def test_static_manifest_large_files(aiohttp_client, tmp_path):
+    make_site(tmp_path)
+    (tmp_path / "big.txt").write_text("0123456789" * 100)
+
+    app = web.Application()
+    webapp_static_reources(app, "/", tmp_path, manifest=True,
+                           max_cached_file_size=500, max_manifest_bytes=2000)
+    client = await aiohttp_client(app)
+
+    resp = await client.get('/big.txt')
+    assert await resp.text() == "0123456789" * 100
+    etag = resp.headers["ETag"]
+    assert etag.count("-") == 0  # 内容哈希，而不是mtime和大小
+
+    resp = await client.get('/big.txt', headers={"If-None-Match": etag})
+    assert resp.status == 304
+
+    resp = await client.get('/big.txt', headers={"Range": "bytes=0-9",
+                                                 "If-Range": etag})
+    assert resp.status == 206
+    assert await resp.text() == "0123456789"
+    assert resp.headers["ETag"] == etag
+
+    resp = await client.get('/big.txt', headers={"Range": "bytes=0-9",
+                                                 "If-Range": '"stale"'})
+    assert resp.status == 200
+
+    resp = await client.get('/big.txt', headers={"If-Match": '"stale"'})
+    assert resp.status == 412
+
+
+async def test_static_manifest_byte_budget(tmp_path):
+    for name in ("a.txt", "b.txt", "c.txt"):
+        (tmp_path / name).write_bytes(b"x" * 1000)
+
+    manifest = StaticManifest(tmp_path, StaticFileCache(), max_bytes=2500)
+    manifest.build()
+    assert len(manifest) == 3
+    assert manifest.nbytes == 2000
+
+    bodies = [manifest.get(name).variants[None][2]
+              for name in ("a.txt", "b.txt", "c.txt")]
+    assert sum(body is None for body in bodies) == 1
+
+    # 未修改的文件重建时沿用
+    static_file = manifest.get("a.txt")
+    assert manifest.build().get("a.txt") is static_file
+
+
+def test_fingerprint_matches_content_hash(tmp_path):
+    content = b"let b = 2;"
+    name = "app." + bytes_hash(content)[:8] + ".js"
+    (tmp_path / name).write_bytes(content)
+    (tmp_path / "app.3f2a9b1c.js").write_bytes(content)
+
+    manifest = StaticManifest(tmp_path, StaticFileCache()).build()
+    assert manifest.get(name).immutable
+    assert not manifest.get("app.3f2a9b1c.js").immutable
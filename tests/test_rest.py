@@ -0,0 +1,261 @@
+import json
+from enum import Enum
+from decimal import Decimal
+from datetime import date
+from typing import Any, Dict, List, Optional
+from dataclasses import dataclass, field
+from aiohttp import web
+
+from redbean.web.routedef import RestServiceDef
+from redbean.web.session import SESSION_FATORY
+from redbean.exception import NotFoundError
+
+services = RestServiceDef(prefix="/api")
+
+
+@services.get("/items/{item_id}")
+async def get_item(item_id: int, q: str, request):
+    return {"item_id": item_id, "q": q, "path": request.path}
+
+
+@services.post("/items")
+async def post_item(json_request, http_request):
+    return {"echo": json_request, "method": http_request.method}
+
+
+@services.get("/whoami")
+async def whoami(session):
+    return {"user": session}
+
+
+async def _session_factory(request):
+    return request.headers.get("X-User")
+
+
+def create_app(loop):
+    app = web.Application()
+    app[SESSION_FATORY] = _session_factory
+    app.add_routes(services)
+    return app
+
+
+async def test_bind_match_info_query_and_request(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    resp = await client.get('/api/items/12?q=abc')
+    assert resp.status == 200
+    assert await resp.json() == {"item_id": 12, "q": "abc",
+                                 "path": "/api/items/12"}
+
+    resp = await client.get('/api/items/12')
+    assert (await resp.json())["q"] is None
+
+
+async def test_bind_json_request(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    resp = await client.post('/api/items', json={"a": 1})
+    assert resp.status == 200
+    assert await resp.json() == {"echo": {"a": 1}, "method": "POST"}
+
+
+async def test_bind_session(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    resp = await client.get('/api/whoami', headers={"X-User": "tom"})
+    assert await resp.json() == {"user": "tom"}
+
+    resp = await client.get('/api/whoami')
+    assert resp.status == 401
+
+
+@dataclass
+class Tag:
+    name: str
+
+
+@dataclass
+class Item:
+    name: str
+    price: Decimal
+    created: date
+    tags: List[Tag] = field(default_factory=list)
+
+
+@services.post("/typed-items")
+async def post_typed_item(item: Item):
+    assert isinstance(item.price, Decimal)
+    assert all(isinstance(t, Tag) for t in item.tags)
+    return {"name": item.name, "created": item.created.isoformat(),
+            "tags": [t.name for t in item.tags]}
+
+
+@services.post("/typed-items/batch")
+async def post_typed_items(json_request: List[Item]):
+    return [item.name for item in json_request]
+
+
+async def test_bind_typed_body(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    resp = await client.post('/api/typed-items', json={
+        "name": "pen", "price": "1.20", "created": "2021-03-10",
+        "tags": [{"name": "office"}]})
+    assert resp.status == 200
+    assert await resp.json() == {"name": "pen", "created": "2021-03-10",
+                                 "tags": ["office"]}
+
+    resp = await client.post('/api/typed-items/batch', json=[
+        {"name": "a", "price": 1, "created": "2021-03-10"},
+        {"name": "b", "price": 2, "created": "2021-03-11"}])
+    assert await resp.json() == ["a", "b"]
+
+
+async def test_reject_malformed_body(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    resp = await client.post('/api/typed-items', json=[1, 2])
+    assert resp.status == 400
+
+    resp = await client.post('/api/typed-items', data="{not json")
+    assert resp.status == 400
+
+    resp = await client.post('/api/typed-items', json={
+        "name": "pen", "price": "1.20", "created": "not a date"})
+    assert resp.status == 400
+
+    # 缺少必需字段、空值或嵌套对象都不能转换为标量字段
+    for body in ({"price": "1.20", "created": "2021-03-10"},
+                 {"name": None, "price": "1.20", "created": "2021-03-10"},
+                 {"name": {"a": 1}, "price": "1.20", "created": "2021-03-10"}):
+        resp = await client.post('/api/typed-items', json=body)
+        assert resp.status == 400
+
+
+@dataclass
+class Labels:
+    names: List[str]
+    counts: Dict[str, int]
+
+
+@services.post("/labels")
+async def post_labels(labels: Labels):
+    return {"names": labels.names, "counts": labels.counts}
+
+
+@services.post("/optional-items")
+async def post_optional_item(item: Optional[Item]):
+    return {"item": item is not None}
+
+
+@services.post("/any")
+async def post_any(json_request: Any):
+    return {"echo": json_request}
+
+
+@services.post("/any-dict")
+async def post_any_dict(json_request: Dict[str, Any]):
+    return {"echo": json_request}
+
+
+async def test_reject_incompliant_containers(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    resp = await client.post('/api/labels', json={
+        "names": ["a"], "counts": {"a": 1}})
+    assert await resp.json() == {"names": ["a"], "counts": {"a": 1}}
+
+    for body in ({"names": "abc", "counts": {}},
+                 {"names": {"x": 1}, "counts": {}},
+                 {"names": [], "counts": [1]}):
+        resp = await client.post('/api/labels', json=body)
+        assert resp.status == 400
+
+
+async def test_empty_body(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    resp = await client.post('/api/typed-items')
+    assert resp.status == 400
+
+    resp = await client.post('/api/optional-items')
+    assert await resp.json() == {"item": False}
+
+
+async def test_bind_any_body(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    resp = await client.post('/api/any', json=[1, {"a": None}])
+    assert await resp.json() == {"echo": [1, {"a": None}]}
+
+    resp = await client.post('/api/any-dict', json={"a": [1, None]})
+    assert await resp.json() == {"echo": {"a": [1, None]}}
+
+
+class Color(Enum):
+    RED = "red"
+    BLUE = "blue"
+
+
+@services.get("/orders/{day}/{color}")
+async def get_orders(day: date, color: Color, price: float, paid: bool,
+                     ids: List[int], limit: Optional[int] = 10):
+    return {"day": day.isoformat(), "color": color.value, "price": price,
+            "paid": paid, "ids": ids, "limit": limit}
+
+
+async def test_bind_typed_query_and_path(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    resp = await client.get('/api/orders/2021-03-10/red'
+                            '?price=1.5&paid=true&ids=1&ids=2')
+    assert resp.status == 200
+    assert await resp.json() == {"day": "2021-03-10", "color": "red",
+                                 "price": 1.5, "paid": True, "ids": [1, 2],
+                                 "limit": 10}
+
+    resp = await client.get('/api/orders/2021-03-10/red?paid=maybe')
+    assert resp.status == 400
+
+    resp = await client.get('/api/orders/2021-03-10/red?ids=x')
+    assert resp.status == 400
+
+    # 格式错误的路径参数由路由直接拒绝
+    resp = await client.get('/api/orders/yesterday/red')
+    assert resp.status == 404
+
+    resp = await client.get('/api/orders/2021-03-10/green')
+    assert resp.status == 404
+
+    resp = await client.get('/api/items/abc')
+    assert resp.status == 404
+
+
+@services.get("/rows")
+async def get_rows(n: int):
+    for i in range(n):
+        yield {"i": i}
+
+
+@services.get("/rows/failed")
+async def get_failed_rows():
+    raise NotFoundError("no rows")
+    yield
+
+
+async def test_stream_json_array(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    resp = await client.get('/api/rows?n=3')
+    assert resp.status == 200
+    assert resp.content_type == "application/json"
+    assert await resp.json() == [{"i": 0}, {"i": 1}, {"i": 2}]
+
+    resp = await client.get('/api/rows?n=0')
+    assert await resp.json() == []
+
+
+async def test_stream_ndjson(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    resp = await client.get('/api/rows?n=3',
+                            headers={"Accept": "application/x-ndjson"})
+    assert resp.content_type == "application/x-ndjson"
+    lines = (await resp.text()).splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"i": 0}, {"i": 1}, {"i": 2}]
+
+
+async def test_stream_error_before_first_row(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    resp = await client.get('/api/rows/failed')
+    assert resp.status == 404
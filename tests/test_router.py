@@ -0,0 +1,95 @@
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+from redbean.web.routedef import RestServiceDef
+from redbean.web.router import RouteTrie, named_groups, setup_compiled_router
+
+services = RestServiceDef(prefix="/api")
+
+
+@services.get("/items/latest")
+async def get_latest_item():
+    return {"item_id": 0}
+
+
+@services.get("/items/{item_id}")
+async def get_item(item_id: int):
+    return {"item_id": item_id}
+
+
+@services.put("/items/{item_id:\\d+}")
+async def put_item(item_id: int):
+    return {"item_id": item_id}
+
+
+@services.get("/files/{name}.json")
+async def get_file(name: str):
+    return {"name": name}
+
+
+async def _handler(request):
+    return web.Response(text="ok")
+
+
+def create_app(loop):
+    app = web.Application()
+    app.add_routes(services)
+    app.router.add_get("/", _handler)
+    app.router.add_get("/docs/{path:.*}", _handler)
+    setup_compiled_router(app)
+    return app
+
+
+def make_router():
+    app = web.Application()
+    app.add_routes(services)
+    app.router.add_get("/", _handler)
+    app.router.add_get("/docs/{path:.*}", _handler)
+    return app.router
+
+
+def test_named_groups():
+    assert named_groups(r"\/a\/(?P<id>\d+)\/(?P<name>[^{}/]+)") == {
+        "id": r"\d+", "name": "[^{}/]+"}
+
+
+async def test_trie_same_as_url_dispatcher():
+    router = make_router()
+    route_trie = RouteTrie(router.resources())
+    assert len(route_trie.fallbacks) == 2
+
+    for method, path in [("GET", "/api/items/12"),
+                         ("GET", "/api/items/latest"),
+                         ("PUT", "/api/items/12"),
+                         ("PUT", "/api/items/latest"),
+                         ("DELETE", "/api/items/12"),
+                         ("GET", "/api/files/a.json"),
+                         ("GET", "/docs/a/b/c"),
+                         ("GET", "/"),
+                         ("GET", "/api/none")]:
+        request = make_mocked_request(method, path)
+        expected = await router.resolve(request)
+        compiled = await route_trie.resolve(request)
+
+        if expected.http_exception is None:
+            assert compiled.route is expected.route, path
+            assert dict(compiled) == dict(expected), path
+        else:
+            assert compiled.http_exception.status == \
+                expected.http_exception.status, path
+
+
+async def test_compiled_router(aiohttp_client):
+    client = await aiohttp_client(create_app)
+
+    resp = await client.get('/api/items/12')
+    assert await resp.json() == {"item_id": 12}
+
+    resp = await client.get('/api/items/latest')
+    assert await resp.json() == {"item_id": 0}
+
+    resp = await client.delete('/api/items/12')
+    assert resp.status == 405
+
+    resp = await client.get('/docs/a/b')
+    assert await resp.text() == "ok"
@@ -0,0 +1,150 @@
+import json
+import pytest
+from enum import Enum
+from decimal import Decimal
+from datetime import datetime, date, timezone
+from dataclasses import dataclass
+from typing import List
+
+from aiohttp import web
+
+from redbean.web.routedef import RestServiceDef
+from redbean.web.serializers import JSONSerializer, get_json_serializer
+from redbean.web.serializers import setup_json_serializer
+
+
+class Color(Enum):
+    RED = "red"
+
+
+@dataclass
+class Row:
+    sn: int
+    color: Color
+    price: Decimal
+    day: date
+    created: datetime
+    tags: List[str]
+
+
+ROW = Row(sn=1, color=Color.RED, price=Decimal("1.20"), day=date(2021, 3, 10),
+          created=datetime(2021, 3, 10, 6, 32, 49, tzinfo=timezone.utc),
+          tags=["a"])
+
+EXPECTED = {"sn": 1, "color": "red", "price": "1.20", "day": "2021-03-10",
+            "created": "2021-03-10T06:32:49+00:00", "tags": ["a"]}
+
+
+def test_json_serializer_native_types():
+    data = JSONSerializer().dumps({"rows": [ROW]})
+    assert isinstance(data, bytes)
+    assert json.loads(data) == {"rows": [EXPECTED]}
+
+
+def test_orjson_serializer_matches_json():
+    pytest.importorskip("orjson")
+    serializer = get_json_serializer("orjson")
+    assert json.loads(serializer.dumps([ROW])) == [EXPECTED]
+
+    naive = datetime(2021, 3, 10, 14, 32, 49)
+    assert json.loads(serializer.dumps(naive)) == "2021-03-10T14:32:49"
+    assert (json.loads(serializer.dumps(naive)) ==
+            json.loads(JSONSerializer().dumps(naive)))
+
+    local = get_json_serializer("orjson", local_timezone=True)
+    assert (json.loads(local.dumps(naive)) ==
+            json.loads(JSONSerializer(local_timezone=True).dumps(naive)))
+
+
+def test_naive_datetime_local_timezone():
+    naive = datetime(2021, 3, 10, 14, 32, 49)
+    assert json.loads(JSONSerializer().dumps(naive)) == "2021-03-10T14:32:49"
+
+    data = json.loads(JSONSerializer(local_timezone=True).dumps(naive))
+    assert data == naive.astimezone().isoformat()
+
+
+def test_unknown_serializer():
+    with pytest.raises(ValueError):
+        get_json_serializer("nonexistent")
+
+
+services = RestServiceDef(prefix="/api")
+
+
+@services.get("/row")
+async def get_row():
+    return ROW
+
+
+@services.post("/echo")
+async def echo(json_request):
+    return json_request
+
+
+@pytest.mark.parametrize("backend", ["json", "orjson"])
+async def test_app_serializer(aiohttp_client, backend):
+    if backend == "orjson":
+        pytest.importorskip("orjson")
+
+    def create_app(loop):
+        app = web.Application()
+        setup_json_serializer(app, backend)
+        app.add_routes(services)
+        return app
+
+    client = await aiohttp_client(create_app)
+    resp = await client.get('/api/row')
+    assert resp.content_type == "application/json"
+    assert await resp.json() == EXPECTED
+
+    resp = await client.post('/api/echo', json={"名称": "中文"})
+    assert await resp.json() == {"名称": "中文"}
+
+
+@dataclass
+class Stamp:
+    name: str
+    day: date
+    created: datetime
+    payload: bytes
+
+
+@services.post("/stamps")
+async def post_stamp(stamp: Stamp):
+    assert isinstance(stamp.created, datetime)
+    return stamp
+
+
+async def test_cbor_negotiation(aiohttp_client):
+    cbor2 = pytest.importorskip("cbor2")
+
+    def create_app(loop):
+        app = web.Application()
+        app.add_routes(services)
+        return app
+
+    client = await aiohttp_client(create_app)
+
+    created = datetime(2021, 3, 10, 6, 32, 49, tzinfo=timezone.utc)
+    body = cbor2.dumps({"name": "a", "day": "2021-03-10",
+                        "created": created, "payload": b"\x00\x01"})
+    resp = await client.post('/api/stamps', data=body, headers={
+        "Content-Type": "application/cbor", "Accept": "application/cbor"})
+    assert resp.status == 200
+    assert resp.content_type == "application/cbor"
+
+    data = cbor2.loads(await resp.read())
+    assert data["name"] == "a"
+    assert data["created"] == created
+    assert data["payload"] == b"\x00\x01"
+
+    resp = await client.post('/api/stamps', data=body, headers={
+        "Content-Type": "application/cbor"})
+    assert resp.content_type == "application/json"
+    assert (await resp.json())["payload"] == "AAE="
+
+    resp = await client.post('/api/stamps', data=body, headers={
+        "Content-Type": "application/cbor",
+        "Accept": "application/cbor;q=0, application/json"})
+    assert resp.content_type == "application/json"
@@ -0,0 +1,130 @@
+import time
+import pytest
+from aiohttp import web
+from cryptography import fernet
+from cryptography.fernet import InvalidToken
+
+from redbean.web.routedef import RestServiceDef
+from redbean.web.session import (setup_session, get_http_session,
+                                 get_secure_cookie, set_secure_cookie,
+                                 get_cookie_cache, DecryptedCookieCache,
+                                 SignedTokenCodec,
+                                 SESSION_COOKIE, SESSION_FERNET)
+
+services = RestServiceDef(prefix="/api")
+
+factory_calls = []
+
+
+async def session_factory(request):
+    factory_calls.append(request)
+    principal = get_secure_cookie(request, SESSION_COOKIE)
+    if principal is None:
+        return None
+    return {"principal": principal}
+
+
+@services.get("/me")
+async def get_me(request, session):
+    assert await get_http_session(request) is session
+    return session
+
+
+@services.post("/login")
+async def login(request, name: str):
+    response = web.json_response({"name": name})
+    set_secure_cookie(request, response, SESSION_COOKIE, name)
+    return response
+
+
+services.add_batch_route()
+
+
+def create_app(loop):
+    app = web.Application()
+    app.add_routes(services)
+    setup_session(app, session_factory, fernet.Fernet.generate_key().decode())
+    return app
+
+
+async def test_session_resolved_once(aiohttp_client):
+    client = await aiohttp_client(create_app)
+
+    resp = await client.get('/api/me')
+    assert resp.status == 401
+
+    resp = await client.post('/api/login', params={"name": "alice"})
+    assert resp.status == 200
+
+    factory_calls.clear()
+    resp = await client.get('/api/me')
+    assert await resp.json() == {"principal": "alice"}
+    assert len(factory_calls) == 1
+
+    factory_calls.clear()
+    resp = await client.post('/api/batch', json=[
+        {"path": "/api/me"}, {"path": "/api/me"}, {"path": "/api/me"}])
+    results = await resp.json()
+    assert [r["status"] for r in results] == [200, 200, 200]
+    assert len(factory_calls) == 1
+
+
+async def test_decrypted_cookie_cached(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    cache = get_cookie_cache(client.server.app[SESSION_FERNET])
+
+    await client.post('/api/login', params={"name": "bob"})
+    for _ in range(3):
+        resp = await client.get('/api/me')
+        assert await resp.json() == {"principal": "bob"}
+
+    assert cache.misses == 1
+    assert cache.hits == 2
+    assert len(cache) == 1
+
+    client.session.cookie_jar.update_cookies({SESSION_COOKIE: "forged"})
+    resp = await client.get('/api/me')
+    assert resp.status == 401
+    assert len(cache) == 1  # 无效的令牌不缓存
+
+
+def test_signed_token():
+    codec = SignedTokenCodec({1: "k" * 32})
+    token = codec.dumps({"uid": 42, "roles": ["admin"]})
+    assert codec.loads(token) == {"uid": 42, "roles": ["admin"]}
+
+    # 篡改任一字节都不能通过校验
+    data = bytearray(token.encode())
+    data[10] = ord("A") if data[10] != ord("A") else ord("B")
+    assert codec.loads(data.decode()) is None
+    assert codec.loads("garbage") is None
+
+    assert codec.loads(codec.dumps("sid", max_age=-1)) is None
+
+
+def test_signed_token_key_rotation():
+    old_codec = SignedTokenCodec({1: "a" * 32}, algorithm="sha256")
+    token = old_codec.dumps("sid-1")
+
+    codec = SignedTokenCodec({1: "a" * 32, 2: "b" * 32}, algorithm="sha256")
+    assert codec.active == 2
+    assert codec.loads(token) == "sid-1"
+    assert old_codec.loads(codec.dumps("sid-2")) is None
+
+    retired = SignedTokenCodec({2: "b" * 32}, algorithm="sha256")
+    assert retired.loads(token) is None
+
+
+def test_cached_cookie_respects_ttl():
+    key = fernet.Fernet(fernet.Fernet.generate_key())
+    token = key.encrypt_at_time(b"alice", int(time.time()) - 120)
+
+    cache = DecryptedCookieCache()
+    assert cache.decrypt(key, token) == b"alice"
+
+    # 缓存命中时也要按本次的 ttl 检查令牌是否过期
+    with pytest.raises(InvalidToken):
+        key.decrypt(token, ttl=60)
+    with pytest.raises(InvalidToken):
+        cache.decrypt(key, token, ttl=60)
+    assert cache.decrypt(key, token, ttl=600) == b"alice"
@@ -0,0 +1,147 @@
+import asyncio
+from aiohttp import web, ClientSession
+
+from redbean.web.routedef import RestServiceDef
+from redbean.web.session import SESSION_COOKIE
+from redbean.web.session_store import (setup_session_store, SESSION_STORE,
+                                       MemorySessionBackend)
+
+services = RestServiceDef(prefix="/api")
+
+
+@services.post("/login")
+async def login(session, name: str):
+    session["name"] = name
+    return {"sid": session.sid}
+
+
+@services.post("/signin")
+async def signin(session, name: str):
+    session.regenerate()
+    session["name"] = name
+    return {"sid": session.sid}
+
+
+@services.get("/me")
+async def get_me(session):
+    return {"name": session.get("name")}
+
+
+@services.post("/logout")
+async def logout(session):
+    session.invalidate()
+    return {}
+
+
+@services.get("/ping")
+async def ping():
+    return {}
+
+
+class CountingBackend(MemorySessionBackend):
+    __slots__ = ("batches",)
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    async def save_many(self, items):
+        self.batches.append(sorted(items))
+        await super().save_many(items)
+
+
+def create_app(loop):
+    app = web.Application()
+    app.add_routes(services)
+    setup_session_store(app, backend=CountingBackend(), flush_interval=0.01)
+    return app
+
+
+async def test_session_store(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    store = client.server.app[SESSION_STORE]
+
+    resp = await client.get('/api/ping')
+    assert resp.status == 200
+    assert SESSION_COOKIE not in resp.cookies
+
+    # 没有写入的新会话不保存，也不设置cookie
+    resp = await client.get('/api/me')
+    assert await resp.json() == {"name": None}
+    assert SESSION_COOKIE not in resp.cookies
+    assert store.writes == 0
+
+    resp = await client.post('/api/login', params={"name": "alice"})
+    sid = (await resp.json())["sid"]
+    assert resp.cookies[SESSION_COOKIE].value == sid
+
+    # 写入后台存储前也能读到
+    resp = await client.get('/api/me')
+    assert await resp.json() == {"name": "alice"}
+
+    await asyncio.sleep(0.05)
+    assert store.backend.batches == [[sid]]
+    assert store.writes == 1
+
+    loads = store.loads
+    resp = await client.get('/api/me')
+    assert await resp.json() == {"name": "alice"}
+    assert store.loads == loads + 1
+    assert store.writes == 1  # 只读的会话不写回
+
+    await client.post('/api/logout')
+    await asyncio.sleep(0.05)
+    assert await store.backend.load(sid) is None
+
+    resp = await client.get('/api/me')
+    assert await resp.json() == {"name": None}
+
+
+async def test_write_behind_batches(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    store = client.server.app[SESSION_STORE]
+
+    async def _login(i):
+        async with ClientSession() as session:
+            resp = await session.post(client.make_url('/api/login'),
+                                      params={"name": f"user{i}"})
+            return (await resp.json())["sid"]
+
+    sids = await asyncio.gather(*[_login(i) for i in range(10)])
+    await asyncio.sleep(0.05)
+
+    batched = [sid for batch in store.backend.batches for sid in batch]
+    assert sorted(batched) == sorted(sids)
+    assert len(store.backend.batches) < len(sids)
+
+
+async def test_regenerate_sid(aiohttp_client):
+    client = await aiohttp_client(create_app)
+    store = client.server.app[SESSION_STORE]
+
+    resp = await client.post('/api/login', params={"name": "guest"})
+    old_sid = (await resp.json())["sid"]
+    await asyncio.sleep(0.05)
+
+    resp = await client.post('/api/signin', params={"name": "alice"})
+    sid = (await resp.json())["sid"]
+    assert sid != old_sid
+    assert resp.cookies[SESSION_COOKIE].value == sid
+
+    resp = await client.get('/api/me')
+    assert await resp.json() == {"name": "alice"}
+
+    await asyncio.sleep(0.05)
+    assert await store.backend.load(old_sid) is None
+    assert (await store.backend.load(sid))["name"] == "alice"
+
+
+async def test_memory_backend_sliding_ttl():
+    backend = MemorySessionBackend(ttl=0.05)
+    await backend.save_many({"s1": {"a": 1}})
+    for _ in range(3):
+        await asyncio.sleep(0.03)
+        assert await backend.load("s1") == {"a": 1}  # 读取也会延长有效期
+
+    await asyncio.sleep(0.06)
+    assert await backend.load("s1") is None